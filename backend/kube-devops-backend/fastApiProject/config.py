@@ -51,6 +51,61 @@ class Settings(BaseSettings):
     AUTO_POD_CPU_HIGH_THRESHOLD_RATIO: float = 0.90
     AUTO_POD_CPU_SUSTAIN_MINUTES: int = 10
 
+    # ===== AI / Forecast =====
+    AI_SERIES_CACHE_ENABLED: bool = True  # 历史序列增量段缓存（只拉缺失的尾部）
+    AI_FORECAST_WORKERS: int = 0  # Prophet 拟合进程数；0=min(4, CPU 核数)
+    AI_FORECAST_BACKEND: str = "process"  # process=进程池拟合；inline=在请求线程里拟合
+    AI_FORECAST_FIT_TIMEOUT_SEC: int = 120  # 单次拟合超时，超时回收 worker 并退化为 baseline
+    AI_FORECAST_MAX_TASKS_PER_CHILD: int = 200  # 每个 worker 拟合多少次后换新进程（Python 3.11+）
+    AI_FORECAST_MODELS: str = "ewma,holt,holt_winters,prophet"  # holdout 自动选模型的候选集合
+    AI_FORECAST_MAPE_TOLERANCE: float = 0.1  # MAPE 在最优的 (1+容忍度) 以内时选更便宜的模型
+    AI_FORECAST_SEASON_PERIOD_SEC: int = 3600  # Holt-Winters 季节周期（秒）
+    AI_BACKTEST_INTERVAL_SEC: int = 900  # 同一序列 + 模型配置的回测结果复用时长；0=每次都回测
+    AI_MODEL_STORE_ENABLED: bool = True  # 拟合参数落盘，下次热启动
+    AI_MODEL_STORE_DIR: str = ""  # 空=data/models
+    AI_MODEL_STORE_MAX_MB: int = 256  # 模型目录总大小上限，超出按最久未用淘汰
+    AI_CACHE_MAX_ENTRIES: int = 5000  # ai_cache 条数上限（LRU）
+    AI_CACHE_MAX_MB: int = 128  # ai_cache 估算字节上限
+    AI_CACHE_SWEEP_SEC: int = 30  # 过期条目后台清理间隔
+    AI_CACHE_PREFIX_QUOTAS: str = ""  # 按 key 前缀限条数，如 "ai_task=2000,suggestion_snapshot=500"
+
+    # ===== Tasks / 异步任务 worker 池 =====
+    TASK_WORKERS: int = 4  # worker 线程数
+    TASK_CLAIM_BATCH: int = 4  # 一次事务最多认领几个任务
+    TASK_POLL_FALLBACK_SEC: float = 5.0  # 兜底轮询间隔（同进程 create_task 会立即唤醒）
+    TASK_TYPE_LIMITS: str = ""  # 按类型限并发，如 "ai_forecast=2,ai_forecast_batch=1"；未配置的类型默认 workers-1
+    TASK_AGING_SEC: int = 300  # 排队每满这么久有效优先级 +1（防低优先级饿死）；0=不老化
+    TASK_TYPE_WEIGHTS: str = "ai_execute=4,ai_suggestions=2,ai_forecast=1,ai_forecast_batch=1"  # 同优先级内按类型加权公平
+    TASK_DEDUP_ENABLED: bool = True  # 同参数异步 AI 任务去重（挂到进行中的任务 / 复用近期结果）
+    TASK_DEDUP_RESULT_TTL_SEC: int = 120  # 成功结果复用时长；请求带 cache_ttl 时取较小值
+    TASK_EVENTS_HEARTBEAT_SEC: int = 15  # SSE 心跳间隔
+    TASK_EVENTS_BUFFER: int = 4096  # 事件环形缓冲（Last-Event-ID 续传范围）
+    TASK_EVENTS_SUB_QUEUE: int = 256  # 每个 SSE 订阅者的队列上限，溢出后读 DB 快照重新对齐
+
+    # ===== Notify / 飞书通知分发 =====
+    NOTIFY_WORKERS: int = 2  # 发送线程数（共享一个连接池）
+    NOTIFY_RATE_PER_MIN: int = 100  # 令牌桶速率（飞书自定义机器人 100 次/分钟）
+    NOTIFY_BURST: int = 5  # 令牌桶容量（飞书 5 次/秒）
+    NOTIFY_QUEUE_MAX: int = 10000  # 待发送上限，超出后新告警记为 dropped（同 fingerprint 仍合并）
+    NOTIFY_MAX_RETRIES: int = 5  # 失败重试次数，用尽后标记 dead
+    NOTIFY_RETRY_BASE_SEC: int = 2  # 指数退避基数
+    NOTIFY_RETRY_MAX_SEC: int = 300  # 退避上限
+    NOTIFY_STORM_THRESHOLD: int = 3  # 一次认领到这么多条视为告警风暴，合并成卡片
+    NOTIFY_MERGE_MAX: int = 20  # 一张合并卡片最多几条告警
+    NOTIFY_COALESCE_MS: int = 200  # 新告警唤醒后等待合并的时间
+
+    # ===== Alerts / 告警分组 =====
+    ALERT_GROUPING_ENABLED: bool = True  # 按组发通知（关闭则一条告警一条通知）
+    ALERT_GROUP_BY: str = "node;namespace,alertname"  # 分组标签集合，按顺序取第一组标签齐全的；";" 分隔规则
+    ALERT_GROUP_WAIT_SEC: int = 30  # 新组等待多久再发第一条（合并同批告警）
+    ALERT_GROUP_INTERVAL_SEC: int = 300  # 组有变化时两次通知的最小间隔
+    ALERT_GROUP_REPEAT_SEC: int = 14400  # 仍在 firing 且无变化时的重复提醒间隔；0=不重复
+    ALERT_GROUP_SAMPLE: int = 10  # 组通知里列出的成员数
+
+    # ===== Logs / Loki 游标分页 =====
+    LOKI_PAGE_LIMIT: int = 1000  # 单次 /query_range 最多取多少行（不超过 Loki max_entries_limit_per_query）
+    LOKI_STREAM_CHUNK_SEC: int = 600  # 流式读取的初始时间窗（秒），按命中密度自动调整
+
     # ===== AI / Execute Safety =====
     AI_EXECUTE_COOLDOWN_MINUTES: int = 10
     AI_EXECUTE_DAILY_LIMIT: int = 20
@@ -63,6 +118,22 @@ class Settings(BaseSettings):
     # ===== Inspect / 巡检 =====
     INSPECT_ENABLE_PROM: bool = True  # Prometheus 不可用时也不要让巡检整体失败：关闭即可
 
+    # ===== K8s informer（watch 内存快照，关闭则直接 LIST）=====
+    INFORMER_PODS_ENABLED: bool = False
+    INFORMER_NODES_ENABLED: bool = False
+    INFORMER_DEPLOYMENTS_ENABLED: bool = False
+    INFORMER_EVENTS_ENABLED: bool = False
+
+
+    # ===== Prometheus client（连接池 / 重试）=====
+    PROM_POOL_MAXSIZE: int = 20
+    PROM_RETRY_TOTAL: int = 2
+    PROM_FANOUT_WORKERS: int = 8  # 总览接口并发查询线程数
+    # 查询结果短 TTL 缓存（instant 按 PROM_CACHE_INSTANT_STEP_SEC 分桶，TTL=step/2）
+    PROM_CACHE_ENABLED: bool = True
+    PROM_CACHE_INSTANT_STEP_SEC: int = 10
+    PROM_CACHE_MAX_ENTRIES: int = 1024
+    PROM_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
 
     # ===== PromQL guard =====
     PROMQL_FREE_ENABLED: bool = False
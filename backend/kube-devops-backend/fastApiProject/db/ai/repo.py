@@ -2,9 +2,10 @@
 from __future__ import annotations
 
 import time
-from typing import Any
+from typing import Any, Dict, Optional
 
 from db.utils.sqlite import get_conn, q, write_with_retry
+from db.utils.write_queue import submit_write
 
 
 def insert_feedback(
@@ -79,3 +80,60 @@ def delete_evolution(*, target: str, key: str) -> bool:
             conn.close()
 
     return bool(write_with_retry(_op))
+
+
+def upsert_backtest(*, series_key: str, config_hash: str, record: Dict[str, Any]) -> None:
+    """
+    回测结果落库：走单写队列，不阻塞预测请求
+    """
+
+    def _apply(conn) -> None:
+        q(
+            conn,
+            """
+            INSERT INTO ai_backtest_metrics(
+                series_key, config_hash, model, mae, rmse, mape, baseline_mape, scores, computed_at
+            )
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(series_key, config_hash) DO UPDATE SET
+                model=excluded.model,
+                mae=excluded.mae,
+                rmse=excluded.rmse,
+                mape=excluded.mape,
+                baseline_mape=excluded.baseline_mape,
+                scores=excluded.scores,
+                computed_at=excluded.computed_at
+            """,
+            (
+                series_key,
+                config_hash,
+                str(record.get("model") or ""),
+                float(record.get("mae") or 0.0),
+                float(record.get("rmse") or 0.0),
+                float(record.get("mape") or 0.0),
+                float(record.get("baseline_mape") or 0.0),
+                str(record.get("scores") or ""),
+                int(record.get("computed_at") or time.time()),
+            ),
+        )
+
+    submit_write(_apply)
+
+
+def get_backtest(*, series_key: str, config_hash: str) -> Optional[Dict[str, Any]]:
+    conn = get_conn()
+    try:
+        cur = q(
+            conn,
+            """
+            SELECT model, mae, rmse, mape, baseline_mape, scores, computed_at
+            FROM ai_backtest_metrics
+            WHERE series_key=? AND config_hash=?
+            """,
+            (series_key, config_hash),
+        )
+        row = cur.fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from db.utils.sqlite import get_conn, q, qmany
+from db.utils.write_queue import submit_write
+
+
+def _row_to_group(r) -> Dict[str, Any]:
+    return {
+        "id": int(r["id"]),
+        "group_key": str(r["group_key"]),
+        "labels": json.loads(r["labels_json"] or "{}"),
+        "status": str(r["status"]),
+        "firing_count": int(r["firing_count"]),
+        "total_count": int(r["total_count"]),
+        "first_seen": int(r["first_seen"]),
+        "last_seen": int(r["last_seen"]),
+        "last_notified_at": int(r["last_notified_at"]),
+        "last_push_status": str(r["last_push_status"]),
+        "last_push_error": str(r["last_push_error"]),
+    }
+
+
+def list_alert_groups(
+    *,
+    status: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """告警中心按组浏览：一行一个组（带 firing / total 成员数），按最近活跃倒序"""
+    limit = max(1, min(int(limit), 200))
+    offset = max(0, int(offset))
+
+    where_sql = ""
+    params: List[Any] = []
+    if status:
+        where_sql = "WHERE status=?"
+        params.append(str(status))
+
+    conn = get_conn()
+    try:
+        cur = q(
+            conn,
+            f"""
+            SELECT *
+            FROM alert_groups
+            {where_sql}
+            ORDER BY last_seen DESC
+            LIMIT ? OFFSET ?
+            """,
+            [*params, limit, offset],
+        )
+        items = [_row_to_group(r) for r in cur.fetchall()]
+        return {"items": items, "limit": limit, "offset": offset, "grouped": True}
+    finally:
+        conn.close()
+
+
+def due_alert_groups(*, now: int, limit: int) -> List[Dict[str, Any]]:
+    """到期待通知的组：成员有变化且过了 group_wait / group_interval，或仍在 firing 且到了 repeat 时间"""
+    conn = get_conn()
+    try:
+        cur = q(
+            conn,
+            """
+            SELECT * FROM alert_groups WHERE dirty=1 AND next_notify_at<=?
+            UNION
+            SELECT * FROM alert_groups WHERE repeat_at>0 AND repeat_at<=?
+            ORDER BY next_notify_at ASC
+            LIMIT ?
+            """,
+            (int(now), int(now), max(1, int(limit))),
+        )
+        out = []
+        for r in cur.fetchall():
+            g = _row_to_group(r)
+            g["version"] = int(r["version"])
+            out.append(g)
+        return out
+    finally:
+        conn.close()
+
+
+def next_group_due_at() -> int:
+    """最早一个组的到期时间；没有则 0"""
+    conn = get_conn()
+    try:
+        r1 = q(conn, "SELECT MIN(next_notify_at) AS t FROM alert_groups WHERE dirty=1").fetchone()
+        r2 = q(conn, "SELECT MIN(repeat_at) AS t FROM alert_groups WHERE repeat_at>0").fetchone()
+        ts = [int(r["t"]) for r in (r1, r2) if r is not None and r["t"] is not None]
+        return min(ts) if ts else 0
+    finally:
+        conn.close()
+
+
+def group_members_sample(group_key: str, *, limit: int) -> List[Dict[str, Any]]:
+    """组内成员预览（firing 在前、最近的在前），通知卡片用"""
+    conn = get_conn()
+    try:
+        cur = q(
+            conn,
+            """
+            SELECT fingerprint, status, labels_json, last_seen
+            FROM alerts
+            WHERE group_key=?
+            ORDER BY status ASC, last_seen DESC
+            LIMIT ?
+            """,
+            (str(group_key), max(1, int(limit))),
+        )
+        return [
+            {
+                "fingerprint": str(r["fingerprint"]),
+                "status": str(r["status"]),
+                "labels": json.loads(r["labels_json"] or "{}"),
+                "last_seen": int(r["last_seen"]),
+            }
+            for r in cur.fetchall()
+        ]
+    finally:
+        conn.close()
+
+
+def mark_groups_notified(
+    groups: List[Tuple[str, int, bool, bool]],
+    *,
+    now: int,
+    interval_sec: int,
+    repeat_sec: int,
+) -> None:
+    """
+    groups：(group_key, 读取时的 version, 是否仍 firing, 是否真的发了通知)
+    - 发了的：记 last_notified_at，排下一次 group_interval / repeat
+    - 没发的（从未通知过就已恢复）：只清 dirty，不记通知时间
+    读取之后又有成员变化（version 变了）的组保持 dirty，下个 group_interval 再发
+    """
+    if not groups:
+        return
+    pushed_rows = [
+        (
+            int(version),
+            int(now),
+            int(now) + max(0, int(interval_sec)),
+            int(now) + max(1, int(repeat_sec)) if firing and repeat_sec > 0 else 0,
+            str(key),
+        )
+        for key, version, firing, pushed in groups
+        if pushed
+    ]
+    skipped_rows = [(int(version), str(key)) for key, version, _firing, pushed in groups if not pushed]
+
+    def _apply(conn) -> None:
+        if pushed_rows:
+            qmany(
+                conn,
+                """
+                UPDATE alert_groups SET
+                    dirty=CASE WHEN version=? THEN 0 ELSE 1 END,
+                    last_notified_at=?, next_notify_at=?, repeat_at=?
+                WHERE group_key=?
+                """,
+                pushed_rows,
+            )
+        if skipped_rows:
+            qmany(
+                conn,
+                "UPDATE alert_groups SET dirty=CASE WHEN version=? THEN 0 ELSE 1 END, repeat_at=0 WHERE group_key=?",
+                skipped_rows,
+            )
+
+    submit_write(_apply, wait=True)
+
+
+def alert_group_counts() -> Dict[str, int]:
+    conn = get_conn()
+    try:
+        cur = q(conn, "SELECT status, COUNT(*) AS n FROM alert_groups GROUP BY status")
+        out = {"firing": 0, "resolved": 0}
+        for r in cur.fetchall():
+            out[str(r["status"])] = int(r["n"] or 0)
+        r = q(conn, "SELECT COUNT(*) AS n FROM alert_groups WHERE dirty=1").fetchone()
+        out["dirty"] = int(r["n"] or 0)
+        return out
+    finally:
+        conn.close()
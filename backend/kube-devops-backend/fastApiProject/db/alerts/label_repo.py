@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db.utils.sqlite import get_conn, q, qmany
+
+# 标签匹配器：(key, op, value)，op ∈ = != =~ !~（正则整串匹配）
+Matcher = Tuple[str, str, str]
+
+# 最小的等值匹配命中数低于这个值时从标签索引出发（取 id 再排序），否则沿 last_seen 索引扫描逐行校验
+SELECTIVE_MATCH_ROWS = 20000
+FACET_MAX_VALUES = 50
+
+
+def _label_pairs(labels_json: str) -> List[Tuple[str, str]]:
+    try:
+        labels = json.loads(labels_json or "{}")
+    except Exception:
+        return []
+    if not isinstance(labels, dict):
+        return []
+    return [(str(k), str(v)) for k, v in labels.items() if v is not None and not isinstance(v, (dict, list))]
+
+
+def sync_alert_labels(
+    conn,
+    rows: Iterable[Tuple[int, str, str]],
+    prev: Dict[int, Tuple[str, str]],
+) -> None:
+    """
+    告警 upsert 之后同一事务里维护 alert_labels / alert_label_counts
+    rows：(alert_id, status, labels_json)；prev：alert_id → 写入前的 (status, labels_json)，新告警不在 prev 里
+    只有标签或状态变化的告警才动标签行 / 计数，重复推送的相同告警不产生写入
+    """
+    delta: Counter = Counter()
+    deletes: List[Tuple[int]] = []
+    inserts: List[Tuple[int, str, str]] = []
+    for alert_id, status, labels_json in rows:
+        old = prev.get(alert_id)
+        if old is not None and old == (status, labels_json):
+            continue
+        new_pairs = _label_pairs(labels_json)
+        if old is not None:
+            for k, v in _label_pairs(old[1]):
+                delta[(k, v, old[0])] -= 1
+            if old[1] != labels_json:
+                deletes.append((alert_id,))
+                inserts.extend((alert_id, k, v) for k, v in new_pairs)
+        else:
+            inserts.extend((alert_id, k, v) for k, v in new_pairs)
+        for k, v in new_pairs:
+            delta[(k, v, status)] += 1
+
+    if deletes:
+        qmany(conn, "DELETE FROM alert_labels WHERE alert_id=?", deletes)
+    if inserts:
+        qmany(conn, "INSERT OR REPLACE INTO alert_labels(alert_id, k, v) VALUES(?, ?, ?)", inserts)
+    changes = [(k, v, st, n) for (k, v, st), n in delta.items() if n]
+    if changes:
+        qmany(
+            conn,
+            """
+            INSERT INTO alert_label_counts(k, v, status, n) VALUES(?, ?, ?, ?)
+            ON CONFLICT(k, v, status) DO UPDATE SET n=n+excluded.n
+            """,
+            changes,
+        )
+        qmany(
+            conn,
+            "DELETE FROM alert_label_counts WHERE k=? AND v=? AND status=? AND n<=0",
+            [(k, v, st) for k, v, st, n in changes if n < 0],
+        )
+
+
+# ---------- 查询 ----------
+def _matcher_sql(m: Matcher, *, driving: bool) -> Tuple[str, List[Any]]:
+    k, op, v = m
+    if op == "=":
+        if driving:
+            return "a.id IN (SELECT alert_id FROM alert_labels WHERE k=? AND v=?)", [k, v]
+        return "EXISTS (SELECT 1 FROM alert_labels l WHERE l.alert_id=a.id AND l.k=? AND l.v=?)", [k, v]
+    if op == "!=":
+        return "NOT EXISTS (SELECT 1 FROM alert_labels l WHERE l.alert_id=a.id AND l.k=? AND l.v=?)", [k, v]
+    if op == "=~":
+        return "EXISTS (SELECT 1 FROM alert_labels l WHERE l.alert_id=a.id AND l.k=? AND l.v REGEXP ?)", [k, v]
+    if op == "!~":
+        return "NOT EXISTS (SELECT 1 FROM alert_labels l WHERE l.alert_id=a.id AND l.k=? AND l.v REGEXP ?)", [k, v]
+    raise ValueError(f"unsupported matcher op: {op}")
+
+
+def _driving_matcher(conn, matchers: List[Matcher], *, always: bool = False) -> Optional[Matcher]:
+    """
+    挑命中最少的等值匹配器（计数到 SELECTIVE_MATCH_ROWS 为止）；都很宽泛返回 None
+    always=True（分面计数要遍历整个命中集合）：只要有等值匹配器就用最窄的那个
+    """
+    best: Optional[Tuple[int, Matcher]] = None
+    for m in matchers:
+        if m[1] != "=":
+            continue
+        r = q(
+            conn,
+            "SELECT COUNT(*) AS n FROM (SELECT 1 FROM alert_labels WHERE k=? AND v=? LIMIT ?)",
+            (m[0], m[2], SELECTIVE_MATCH_ROWS),
+        ).fetchone()
+        n = int(r["n"] or 0)
+        if best is None or n < best[0]:
+            best = (n, m)
+    if best is not None and (always or best[0] < SELECTIVE_MATCH_ROWS):
+        return best[1]
+    return None
+
+
+def _where(
+    conn,
+    *,
+    matchers: List[Matcher],
+    status: Optional[str],
+    source: Optional[str],
+    group_key: Optional[str],
+    always_drive: bool = False,
+) -> Tuple[List[str], List[Any], bool]:
+    where: List[str] = []
+    params: List[Any] = []
+    if status:
+        where.append("a.status=?")
+        params.append(str(status))
+    if source:
+        where.append("a.source=?")
+        params.append(str(source))
+    if group_key:
+        where.append("a.group_key=?")
+        params.append(str(group_key))
+    driver = _driving_matcher(conn, matchers, always=always_drive)
+    for m in matchers:
+        sql, p = _matcher_sql(m, driving=m is driver)
+        where.append(sql)
+        params.extend(p)
+    return where, params, driver is not None
+
+
+def _row_to_item(r) -> Dict[str, Any]:
+    return {
+        "id": int(r["id"]),
+        "fingerprint": str(r["fingerprint"]),
+        "status": str(r["status"]),
+        "labels": json.loads(r["labels_json"] or "{}"),
+        "annotations": json.loads(r["annotations_json"] or "{}"),
+        "starts_at": str(r["starts_at"]),
+        "ends_at": str(r["ends_at"]),
+        "last_seen": int(r["last_seen"]),
+        "source": str(r["source"]),
+        "created_at": int(r["created_at"]),
+        "last_push_status": str(r["last_push_status"]),
+        "last_push_error": str(r["last_push_error"]),
+        "last_push_at": int(r["last_push_at"]),
+        "group_key": str(r["group_key"]),
+    }
+
+
+def encode_cursor(last_seen: int, alert_id: int) -> str:
+    return f"{int(last_seen)}_{int(alert_id)}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not cursor:
+        return None
+    try:
+        a, b = str(cursor).split("_", 1)
+        return int(a), int(b)
+    except ValueError:
+        raise ValueError("invalid cursor")
+
+
+def query_alerts(
+    *,
+    matchers: Optional[List[Matcher]] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    group_key: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    告警中心查询：标签匹配器 + status / source / group_key，按 (last_seen, id) 倒序做 keyset 翻页
+    next_cursor 原样带回下一页；为 None 表示没有更多
+    """
+    limit = max(1, min(int(limit), 200))
+    after = decode_cursor(cursor)
+    matchers = list(matchers or [])
+
+    conn = get_conn()
+    try:
+        where, params, driven = _where(conn, matchers=matchers, status=status, source=source, group_key=group_key)
+        if after is not None:
+            where.append("(a.last_seen, a.id) < (?, ?)")
+            params.extend(after)
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        # 只有宽泛的标签条件：固定沿 last_seen 索引倒序扫，逐行校验，凑够 limit 就停
+        # 带 status / source / group_key 时交给规划器选 (列, last_seen) 索引
+        index_sql = "" if driven or status or source or group_key else "INDEXED BY idx_alerts_last_seen"
+        cur = q(
+            conn,
+            f"""
+            SELECT a.*
+            FROM alerts a {index_sql}
+            {where_sql}
+            ORDER BY a.last_seen DESC, a.id DESC
+            LIMIT ?
+            """,
+            [*params, limit],
+        )
+        items = [_row_to_item(r) for r in cur.fetchall()]
+        next_cursor = encode_cursor(items[-1]["last_seen"], items[-1]["id"]) if len(items) == limit else None
+        return {"items": items, "limit": limit, "next_cursor": next_cursor}
+    finally:
+        conn.close()
+
+
+def label_facets(
+    *,
+    keys: List[str],
+    matchers: Optional[List[Matcher]] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    group_key: Optional[str] = None,
+    limit: int = 20,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    按标签分面计数：{key: [{value, count}, ...]}（按 count 倒序，每个 key 最多 limit 个值）
+    只有 status（或不带条件）时读预聚合的 alert_label_counts；带匹配器等其它条件时在命中集合上现算
+    """
+    limit = max(1, min(int(limit), FACET_MAX_VALUES))
+    matchers = list(matchers or [])
+    out: Dict[str, List[Dict[str, Any]]] = {}
+
+    conn = get_conn()
+    try:
+        if not matchers and not source and not group_key:
+            for key in keys:
+                cur = q(
+                    conn,
+                    f"""
+                    SELECT v, SUM(n) AS n FROM alert_label_counts
+                    WHERE k=? {"AND status=?" if status else ""}
+                    GROUP BY v HAVING SUM(n)>0
+                    ORDER BY n DESC, v ASC
+                    LIMIT ?
+                    """,
+                    [key, *([status] if status else []), limit],
+                )
+                out[key] = [{"value": str(r["v"]), "count": int(r["n"])} for r in cur.fetchall()]
+            return out
+
+        # 在命中集合上一次算完所有 key：告警在外层（CROSS JOIN 固定顺序），每条按 (alert_id, k) 主键取标签
+        where, params, _driven = _where(
+            conn, matchers=matchers, status=status, source=source, group_key=group_key, always_drive=True
+        )
+        cur = q(
+            conn,
+            f"""
+            SELECT l.k AS k, l.v AS v, COUNT(*) AS n
+            FROM alerts a CROSS JOIN alert_labels l
+            WHERE l.alert_id=a.id AND l.k IN ({",".join("?" for _ in keys)}) AND {" AND ".join(where)}
+            GROUP BY l.k, l.v
+            """,
+            [*keys, *params],
+        )
+        for key in keys:
+            out[key] = []
+        for r in sorted(cur.fetchall(), key=lambda r: (-int(r["n"]), str(r["v"]))):
+            bucket = out[str(r["k"])]
+            if len(bucket) < limit:
+                bucket.append({"value": str(r["v"]), "count": int(r["n"])})
+        return out
+    finally:
+        conn.close()
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from db.alerts.repo import GROUP_FINGERPRINT_PREFIX
+from db.utils.sqlite import get_conn, q, write_with_retry
+from db.utils.write_queue import submit_write
+
+
+def _set_push_status(conn, id_list: List[int], status: str, error: str, now: int) -> None:
+    """出站记录对应的告警（组通知则是组本身 + 组内全部成员）记 last_push_status"""
+    placeholders = ",".join("?" for _ in id_list)
+    group_keys_sql = f"""
+        SELECT substr(fingerprint, {len(GROUP_FINGERPRINT_PREFIX) + 1}) FROM notify_outbox
+        WHERE id IN ({placeholders}) AND fingerprint LIKE '{GROUP_FINGERPRINT_PREFIX}%'
+    """
+    q(
+        conn,
+        f"""
+        UPDATE alerts SET last_push_status=?, last_push_error=?, last_push_at=?
+        WHERE fingerprint IN (SELECT fingerprint FROM notify_outbox WHERE id IN ({placeholders}))
+        """,
+        [status, error, now, *id_list],
+    )
+    q(
+        conn,
+        f"UPDATE alerts SET last_push_status=?, last_push_error=?, last_push_at=? WHERE group_key IN ({group_keys_sql})",
+        [status, error, now, *id_list],
+    )
+    q(
+        conn,
+        f"UPDATE alert_groups SET last_push_status=?, last_push_error=? WHERE group_key IN ({group_keys_sql})",
+        [status, error, *id_list],
+    )
+
+
+def enqueue_notification(*, fingerprint: str, payload: Dict[str, Any], allow_new: bool = True) -> None:
+    """
+    入出站队列：同一 fingerprint 已有待发送记录时只覆盖 payload（合并），否则插入新行
+    allow_new=False（队列已满）：只允许合并，新 fingerprint 直接记为 dropped
+    """
+    now = int(time.time())
+    payload_json = json.dumps(payload or {}, ensure_ascii=False, default=str)
+    fp = str(fingerprint)
+
+    def _apply(conn) -> None:
+        if allow_new:
+            q(
+                conn,
+                """
+                INSERT INTO notify_outbox(fingerprint, payload_json, status, next_at, created_at, updated_at)
+                VALUES(?, ?, 'pending', ?, ?, ?)
+                ON CONFLICT(fingerprint) WHERE status='pending' DO UPDATE SET
+                    payload_json=excluded.payload_json,
+                    coalesced=coalesced+1,
+                    updated_at=excluded.updated_at
+                """,
+                (fp, payload_json, now, now, now),
+            )
+            return
+        cur = q(
+            conn,
+            """
+            UPDATE notify_outbox SET payload_json=?, coalesced=coalesced+1, updated_at=?
+            WHERE fingerprint=? AND status='pending'
+            """,
+            (payload_json, now, fp),
+        )
+        if int(cur.rowcount or 0) == 0:
+            if fp.startswith(GROUP_FINGERPRINT_PREFIX):
+                gk = fp[len(GROUP_FINGERPRINT_PREFIX):]
+                q(
+                    conn,
+                    """
+                    UPDATE alerts SET last_push_status='dropped', last_push_error='notify queue full', last_push_at=?
+                    WHERE group_key=?
+                    """,
+                    (now, gk),
+                )
+                q(
+                    conn,
+                    "UPDATE alert_groups SET last_push_status='dropped', last_push_error='notify queue full' WHERE group_key=?",
+                    (gk,),
+                )
+                return
+            q(
+                conn,
+                """
+                UPDATE alerts SET last_push_status='dropped', last_push_error='notify queue full', last_push_at=?
+                WHERE fingerprint=?
+                """,
+                (now, fp),
+            )
+
+    submit_write(_apply)
+
+
+def claim_due_notifications(*, limit: int) -> List[Dict[str, Any]]:
+    """认领到期的待发送记录（pending → sending），同一事务"""
+
+    def _op() -> List[Dict[str, Any]]:
+        conn = get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            now = int(time.time())
+            cur = q(
+                conn,
+                """
+                SELECT id, fingerprint, payload_json, attempts, coalesced FROM notify_outbox
+                WHERE status='pending' AND next_at<=?
+                ORDER BY next_at ASC, id ASC
+                LIMIT ?
+                """,
+                (now, max(1, int(limit))),
+            )
+            rows = cur.fetchall()
+            out: List[Dict[str, Any]] = []
+            for r in rows:
+                q(
+                    conn,
+                    "UPDATE notify_outbox SET status='sending', updated_at=? WHERE id=?",
+                    (now, int(r["id"])),
+                )
+                try:
+                    payload = json.loads(r["payload_json"] or "{}")
+                except Exception:
+                    payload = {}
+                out.append(
+                    {
+                        "id": int(r["id"]),
+                        "fingerprint": str(r["fingerprint"]),
+                        "payload": payload,
+                        "attempts": int(r["attempts"] or 0),
+                        "coalesced": int(r["coalesced"] or 0),
+                    }
+                )
+            conn.commit()
+            return out
+        finally:
+            conn.close()
+
+    return write_with_retry(_op)
+
+
+def mark_notifications_sent(ids: List[int]) -> None:
+    """发送成功：出站记录删除，告警上记 last_push_status=ok"""
+    if not ids:
+        return
+    id_list = [int(i) for i in ids]
+    placeholders = ",".join("?" for _ in id_list)
+    now = int(time.time())
+
+    def _apply(conn) -> None:
+        _set_push_status(conn, id_list, "ok", "", now)
+        q(conn, f"DELETE FROM notify_outbox WHERE id IN ({placeholders})", id_list)
+
+    submit_write(_apply)
+
+
+def mark_notifications_failed(ids: List[int], *, error: str, next_at: Optional[int]) -> None:
+    """
+    发送失败：
+    - next_at 不为空：回到 pending 等重试（attempts+1）；若期间同 fingerprint 已有新的待发送记录，旧的直接删掉
+    - next_at 为空：重试次数用尽，标记 dead
+    告警上记 last_push_status=retrying / failed
+    """
+    if not ids:
+        return
+    id_list = [int(i) for i in ids]
+    placeholders = ",".join("?" for _ in id_list)
+    now = int(time.time())
+    err = str(error or "")[:500]
+
+    def _apply(conn) -> None:
+        push_status = "retrying" if next_at is not None else "failed"
+        _set_push_status(conn, id_list, push_status, err, now)
+        if next_at is None:
+            q(
+                conn,
+                f"""
+                UPDATE notify_outbox SET status='dead', attempts=attempts+1, last_error=?, updated_at=?
+                WHERE id IN ({placeholders})
+                """,
+                [err, now, *id_list],
+            )
+            return
+        q(
+            conn,
+            f"""
+            UPDATE notify_outbox SET status='pending', attempts=attempts+1, next_at=?, last_error=?, updated_at=?
+            WHERE id IN ({placeholders})
+              AND NOT EXISTS (
+                  SELECT 1 FROM notify_outbox o
+                  WHERE o.fingerprint=notify_outbox.fingerprint AND o.status='pending'
+              )
+            """,
+            [int(next_at), err, now, *id_list],
+        )
+        q(conn, f"DELETE FROM notify_outbox WHERE id IN ({placeholders}) AND status='sending'", id_list)
+
+    submit_write(_apply)
+
+
+def reset_sending_notifications() -> int:
+    """启动时：上次进程没发完的 sending 放回 pending（同 fingerprint 已有 pending 的直接删）"""
+
+    def _op() -> int:
+        conn = get_conn()
+        try:
+            now = int(time.time())
+            q(
+                conn,
+                """
+                DELETE FROM notify_outbox
+                WHERE status='sending' AND EXISTS (
+                    SELECT 1 FROM notify_outbox o
+                    WHERE o.fingerprint=notify_outbox.fingerprint AND o.status='pending'
+                )
+                """,
+            )
+            cur = q(
+                conn,
+                "UPDATE notify_outbox SET status='pending', next_at=?, updated_at=? WHERE status='sending'",
+                (now, now),
+            )
+            conn.commit()
+            return int(cur.rowcount or 0)
+        finally:
+            conn.close()
+
+    return int(write_with_retry(_op))
+
+
+def outbox_counts() -> Dict[str, Any]:
+    conn = get_conn()
+    try:
+        cur = q(conn, "SELECT status, COUNT(*) AS n, MIN(next_at) AS next_at FROM notify_outbox GROUP BY status")
+        out: Dict[str, Any] = {"pending": 0, "sending": 0, "dead": 0, "next_due_at": 0}
+        for r in cur.fetchall():
+            out[str(r["status"])] = int(r["n"] or 0)
+            if str(r["status"]) == "pending":
+                out["next_due_at"] = int(r["next_at"] or 0)
+        return out
+    finally:
+        conn.close()
+
+
+def prune_dead_notifications(*, older_than_sec: int) -> None:
+    cutoff = int(time.time()) - max(0, int(older_than_sec))
+
+    def _apply(conn) -> None:
+        q(conn, "DELETE FROM notify_outbox WHERE status='dead' AND updated_at<?", (cutoff,))
+
+    submit_write(_apply)
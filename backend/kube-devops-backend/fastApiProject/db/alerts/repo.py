@@ -3,9 +3,27 @@ from __future__ import annotations
 import json
 import time
 import hashlib
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
-from db.utils.sqlite import get_conn, q, write_with_retry
+from db.alerts.label_repo import sync_alert_labels
+from db.utils.sqlite import get_conn, q, qmany
+from db.utils.write_queue import submit_write
+
+ALERT_GROUP_BY = "node;namespace,alertname"
+ALERT_GROUP_WAIT_SEC = 30
+GROUP_FINGERPRINT_PREFIX = "group:"
+_GROUP_KEY_MAX = 256
+
+_rules_cache: Tuple[str, List[List[str]]] = ("", [])
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
 
 
 def _stable_hash(payload: Dict[str, Any]) -> str:
@@ -24,6 +42,174 @@ def normalize_fingerprint(
     return _stable_hash(labels or {})
 
 
+def _group_rules() -> List[List[str]]:
+    """ALERT_GROUP_BY："node;namespace,alertname" → [["node"], ["namespace", "alertname"]]"""
+    global _rules_cache
+    raw = str(_setting("ALERT_GROUP_BY", ALERT_GROUP_BY) or "")
+    if _rules_cache[0] == raw and _rules_cache[1]:
+        return _rules_cache[1]
+    rules: List[List[str]] = []
+    for part in raw.split(";"):
+        keys = [k.strip() for k in part.split(",") if k.strip()]
+        if keys:
+            rules.append(keys)
+    rules = rules or [["alertname"]]
+    _rules_cache = (raw, rules)
+    return rules
+
+
+def alert_group_key(labels: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+    """
+    分组 key：按顺序取第一组标签全部存在的规则（如有 node 标签就按节点聚合），都不满足用最后一组
+    返回 (group_key, 分组标签)，group_key 形如 "namespace=ns,alertname=PodCrash"
+    """
+    labels = labels or {}
+    rules = _group_rules()
+    picked: Dict[str, str] = {}
+    for rule in rules:
+        if all(str(labels.get(k) or "") for k in rule):
+            picked = {k: str(labels[k]) for k in rule}
+            break
+    else:
+        picked = {k: str(labels.get(k) or "") for k in rules[-1]}
+    key = ",".join(f"{k}={v}" for k, v in picked.items())
+    if len(key) > _GROUP_KEY_MAX:
+        key = key[: _GROUP_KEY_MAX - 33] + "#" + _stable_hash(picked)
+    return key, picked
+
+
+_UPSERT_SQL = """
+    INSERT INTO alerts(
+        fingerprint, status, labels_json, annotations_json,
+        starts_at, ends_at, last_seen, source, created_at, group_key,
+        last_push_status, last_push_error, last_push_at
+    )
+    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, '', '', 0)
+    ON CONFLICT(fingerprint) DO UPDATE SET
+        status=excluded.status,
+        labels_json=excluded.labels_json,
+        annotations_json=excluded.annotations_json,
+        starts_at=excluded.starts_at,
+        ends_at=excluded.ends_at,
+        last_seen=excluded.last_seen,
+        source=excluded.source,
+        group_key=excluded.group_key
+"""
+
+_GROUP_TOUCH_SQL = """
+    INSERT INTO alert_groups(group_key, labels_json, status, first_seen, last_seen, next_notify_at, created_at, updated_at)
+    VALUES(?, ?, 'firing', ?, ?, ?, ?, ?)
+    ON CONFLICT(group_key) DO UPDATE SET
+        last_seen=excluded.last_seen,
+        updated_at=excluded.updated_at
+"""
+
+
+def _load_by_fingerprint(conn, fingerprints: List[str]) -> Dict[str, Tuple[int, str, str, str]]:
+    """fingerprint → (id, status, group_key, labels_json)"""
+    out: Dict[str, Tuple[int, str, str, str]] = {}
+    uniq = list(dict.fromkeys(fingerprints))
+    for i in range(0, len(uniq), 500):
+        chunk = uniq[i: i + 500]
+        cur = q(
+            conn,
+            f"""
+            SELECT id, fingerprint, status, group_key, labels_json FROM alerts
+            WHERE fingerprint IN ({','.join('?' for _ in chunk)})
+            """,
+            chunk,
+        )
+        for r in cur.fetchall():
+            out[str(r["fingerprint"])] = (int(r["id"]), str(r["status"]), str(r["group_key"]), str(r["labels_json"]))
+    return out
+
+
+def _touch_groups(conn, groups: Dict[str, Dict[str, str]], changed: Set[str], now: int) -> None:
+    """
+    组维护（和告警 upsert 同一事务）：
+    - 新组插入，next_notify_at = now + group_wait（这段时间内同组告警一起发）
+    - 成员新增 / 状态变化的组：重算 firing / total 计数，dirty=1、version+1 等分组引擎发送
+      （Alertmanager 周期性重发的相同告警不会让组变脏）
+    - 全部恢复过的组重新 firing：重新等 group_wait
+    """
+    if groups:
+        wait = max(0, int(_setting("ALERT_GROUP_WAIT_SEC", ALERT_GROUP_WAIT_SEC)))
+        qmany(
+            conn,
+            _GROUP_TOUCH_SQL,
+            [
+                (k, json.dumps(v, ensure_ascii=True, sort_keys=True), now, now, now + wait, now, now)
+                for k, v in groups.items()
+            ],
+        )
+    else:
+        wait = 0
+    for key in changed:
+        if not key:
+            continue
+        r = q(
+            conn,
+            "SELECT COUNT(*) AS total, COALESCE(SUM(status='firing'), 0) AS firing FROM alerts WHERE group_key=?",
+            (key,),
+        ).fetchone()
+        firing, total = int(r["firing"] or 0), int(r["total"] or 0)
+        q(
+            conn,
+            """
+            UPDATE alert_groups SET
+                next_notify_at=CASE WHEN firing_count=0 AND ?>0 AND last_notified_at>0
+                                    THEN MAX(next_notify_at, ?) ELSE next_notify_at END,
+                firing_count=?, total_count=?, status=?,
+                dirty=1, version=version+1, updated_at=?
+            WHERE group_key=?
+            """,
+            (firing, now + wait, firing, total, "firing" if firing else "resolved", now, key),
+        )
+
+
+def _write_alert_rows(conn, rows: List[Tuple[Any, ...]], groups: Dict[str, Dict[str, str]], now: int) -> None:
+    # 写入前状态：判断哪些组成员 / 标签真的变了（同一批里同一 fingerprint 以最后一条为准）
+    prev = _load_by_fingerprint(conn, [r[0] for r in rows])
+    final = {r[0]: r for r in rows}
+    changed: Set[str] = set()
+    for fp, r in final.items():
+        old = prev.get(fp)
+        if old is None or old[1] != r[1] or old[2] != r[9]:
+            changed.add(r[9])
+            if old is not None and old[2] != r[9]:
+                changed.add(old[2])
+    qmany(conn, _UPSERT_SQL, rows)
+
+    new_fps = [fp for fp in final if fp not in prev]
+    ids = {fp: v[0] for fp, v in prev.items()}
+    if new_fps:
+        ids.update({fp: v[0] for fp, v in _load_by_fingerprint(conn, new_fps).items()})
+    sync_alert_labels(
+        conn,
+        [(ids[fp], r[1], r[2]) for fp, r in final.items() if fp in ids],
+        {v[0]: (v[1], v[3]) for v in prev.values()},
+    )
+    _touch_groups(conn, groups, changed, now)
+
+
+def _alert_row(a: Dict[str, Any], now: int, groups: Dict[str, Dict[str, str]]) -> Tuple[Any, ...]:
+    labels = a.get("labels") or {}
+    group_key, group_labels = alert_group_key(labels)
+    groups[group_key] = group_labels
+    return (
+        str(a.get("fingerprint") or ""),
+        str(a.get("status") or ""),
+        json.dumps(labels, ensure_ascii=True, sort_keys=True, default=str),
+        json.dumps(a.get("annotations") or {}, ensure_ascii=True, sort_keys=True, default=str),
+        str(a.get("starts_at") or ""),
+        str(a.get("ends_at") or ""),
+        now,
+        str(a.get("source") or ""),
+        now,
+        group_key,
+    )
+
+
 def upsert_alert(
     *,
     fingerprint: str,
@@ -33,49 +219,95 @@ def upsert_alert(
     starts_at: str,
     ends_at: str,
     source: str,
+    wait: bool = False,
 ) -> int:
-    def _op() -> int:
+    now = int(time.time())
+    groups: Dict[str, Dict[str, str]] = {}
+    row = _alert_row(
+        {
+            "fingerprint": fingerprint,
+            "status": status,
+            "labels": labels,
+            "annotations": annotations,
+            "starts_at": starts_at,
+            "ends_at": ends_at,
+            "source": source,
+        },
+        now,
+        groups,
+    )
+
+    def _apply(conn) -> int:
+        _write_alert_rows(conn, [row], groups, now)
+        cur = q(conn, "SELECT id FROM alerts WHERE fingerprint=?", (row[0],))
+        r = cur.fetchone()
+        return int(r["id"]) if r else 0
+
+    # ✅ 走单写线程批量提交；wait=False 时返回 0（未知 rowid）
+    return int(submit_write(_apply, wait=wait) or 0)
+
+
+def upsert_alerts_bulk(alerts: Iterable[Dict[str, Any]], *, wait: bool = True) -> int:
+    """
+    一批告警一次 executemany（ON CONFLICT 更新），在单写线程的同一个事务里提交
+    alerts 每项：fingerprint / status / labels / annotations / starts_at / ends_at / source
+    wait=True：返回时已落盘（webhook 据此再应答 Alertmanager）
+    """
+    now = int(time.time())
+    groups: Dict[str, Dict[str, str]] = {}
+    rows = [_alert_row(a, now, groups) for a in alerts]
+    if not rows:
+        return 0
+
+    def _apply(conn) -> int:
+        _write_alert_rows(conn, rows, groups, now)
+        return len(rows)
+
+    return int(submit_write(_apply, wait=wait) or 0)
+
+
+def backfill_alert_group_keys(*, batch: int = 1000) -> int:
+    """
+    旧库升级：group_key 为空的告警补算分组并建组
+    补出来的组视为已通知过（不在升级时补发一轮通知）
+    """
+    total = 0
+    while True:
         conn = get_conn()
         try:
-            now = int(time.time())
-            labels_json = json.dumps(labels or {}, ensure_ascii=True, sort_keys=True, default=str)
-            annotations_json = json.dumps(annotations or {}, ensure_ascii=True, sort_keys=True, default=str)
-            cur = q(
+            cur = q(conn, "SELECT fingerprint, status, labels_json FROM alerts WHERE group_key='' LIMIT ?", (int(batch),))
+            found = cur.fetchall()
+        finally:
+            conn.close()
+        if not found:
+            return total
+
+        now = int(time.time())
+        groups: Dict[str, Dict[str, str]] = {}
+        updates = []
+        for r in found:
+            try:
+                labels = json.loads(r["labels_json"] or "{}")
+            except Exception:
+                labels = {}
+            key, picked = alert_group_key(labels if isinstance(labels, dict) else {})
+            groups[key] = picked
+            updates.append((key, str(r["fingerprint"])))
+
+        def _apply(conn) -> None:
+            qmany(conn, "UPDATE alerts SET group_key=? WHERE fingerprint=?", updates)
+            _touch_groups(conn, groups, set(groups), now)
+            qmany(
                 conn,
                 """
-                INSERT INTO alerts(
-                    fingerprint, status, labels_json, annotations_json,
-                    starts_at, ends_at, last_seen, source, created_at,
-                    last_push_status, last_push_error, last_push_at
-                )
-                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, '', '', 0)
-                ON CONFLICT(fingerprint) DO UPDATE SET
-                    status=excluded.status,
-                    labels_json=excluded.labels_json,
-                    annotations_json=excluded.annotations_json,
-                    starts_at=excluded.starts_at,
-                    ends_at=excluded.ends_at,
-                    last_seen=excluded.last_seen,
-                    source=excluded.source
+                UPDATE alert_groups SET dirty=0, last_notified_at=?, next_notify_at=?
+                WHERE group_key=? AND last_notified_at=0
                 """,
-                (
-                    str(fingerprint),
-                    str(status or ""),
-                    labels_json,
-                    annotations_json,
-                    str(starts_at or ""),
-                    str(ends_at or ""),
-                    now,
-                    str(source or ""),
-                    now,
-                ),
+                [(now, now, k) for k in groups],
             )
-            conn.commit()
-            return int(cur.lastrowid or 0)
-        finally:
-            conn.close()
 
-    return int(write_with_retry(_op))
+        submit_write(_apply, wait=True)
+        total += len(updates)
 
 
 def update_push_status(
@@ -84,31 +316,29 @@ def update_push_status(
     status: str,
     error: str,
     pushed_at: Optional[int] = None,
+    wait: bool = False,
 ) -> None:
-    def _op() -> None:
-        conn = get_conn()
-        try:
-            ts = int(pushed_at or time.time())
-            q(
-                conn,
-                """
-                UPDATE alerts
-                SET last_push_status=?, last_push_error=?, last_push_at=?
-                WHERE fingerprint=?
-                """,
-                (str(status or ""), str(error or ""), ts, str(fingerprint)),
-            )
-            conn.commit()
-        finally:
-            conn.close()
+    params = (str(status or ""), str(error or ""), int(pushed_at or time.time()), str(fingerprint))
+
+    def _apply(conn) -> None:
+        q(
+            conn,
+            """
+            UPDATE alerts
+            SET last_push_status=?, last_push_error=?, last_push_at=?
+            WHERE fingerprint=?
+            """,
+            params,
+        )
 
-    write_with_retry(_op)
+    submit_write(_apply, wait=wait)
 
 
 def list_alerts(
     *,
     status: Optional[str] = None,
     source: Optional[str] = None,
+    group_key: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
 ) -> Dict[str, Any]:
@@ -124,6 +354,9 @@ def list_alerts(
     if source:
         where.append("source=?")
         params.append(str(source))
+    if group_key:
+        where.append("group_key=?")
+        params.append(str(group_key))
 
     where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
@@ -157,6 +390,7 @@ def list_alerts(
                     "last_push_status": str(r["last_push_status"]),
                     "last_push_error": str(r["last_push_error"]),
                     "last_push_at": int(r["last_push_at"]),
+                    "group_key": str(r["group_key"]),
                 }
             )
         return {"items": items, "limit": limit, "offset": offset}
@@ -185,6 +419,7 @@ def get_alert(alert_id: int) -> Optional[Dict[str, Any]]:
             "last_push_status": str(r["last_push_status"]),
             "last_push_error": str(r["last_push_error"]),
             "last_push_at": int(r["last_push_at"]),
+            "group_key": str(r["group_key"]),
         }
     finally:
         conn.close()
@@ -1,110 +1,337 @@
 from __future__ import annotations
 
 import json
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from db.utils.sqlite import get_conn, q, write_with_retry
+from db.utils.write_queue import submit_write
 
+TASK_AGING_SEC = 300  # 每等待这么久，有效优先级 +1
+TASK_SCHED_CANDIDATES = 64
+
+# ✅ create_task 成功后回调（同进程 worker 池用来立即唤醒，不用等轮询）
+_created_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def add_task_created_listener(fn: Callable[[Dict[str, Any]], None]) -> None:
+    if fn not in _created_listeners:
+        _created_listeners.append(fn)
+
+
+# ✅ 任务状态变化回调（SSE 事件总线订阅；事务 COMMIT 之后调用——写队列的 on_commit 在单写线程里执行，回调必须很快）
+_status_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+
+def add_task_status_listener(fn: Callable[[str, Dict[str, Any]], None]) -> None:
+    if fn not in _status_listeners:
+        _status_listeners.append(fn)
+
+
+def _notify_created(task: Dict[str, Any]) -> None:
+    for fn in list(_created_listeners):
+        try:
+            fn(task)
+        except Exception:
+            pass
+    _notify_status(
+        str(task.get("task_id") or ""),
+        {
+            "type": task.get("type"),
+            "status": task.get("status"),
+            "progress": task.get("progress"),
+            "updated_at": task.get("updated_at"),
+        },
+    )
+
+
+def _notify_status(task_id: str, change: Dict[str, Any]) -> None:
+    for fn in list(_status_listeners):
+        try:
+            fn(task_id, change)
+        except Exception:
+            pass
+
+
+def _dump_input(input_json: Any) -> str:
+    if input_json is None:
+        return ""
+    try:
+        # ✅ 处理 Pydantic 模型：转换为字典
+        processed_input = input_json
+        if hasattr(processed_input, 'model_dump'):
+            processed_input = processed_input.model_dump()
+        elif hasattr(processed_input, 'dict'):
+            processed_input = processed_input.dict()
+        return json.dumps(processed_input, ensure_ascii=False, default=str)
+    except Exception:
+        return json.dumps({"_raw": str(input_json)}, ensure_ascii=False)
+
+
+def _insert_task(
+    conn, *, task_id: str, type: str, payload_json: str, priority: int, idem_key: str, now: int
+) -> Dict[str, Any]:
+    q(
+        conn,
+        """
+        INSERT INTO tasks(
+            task_id, type, status, progress, input_json, result_json, error,
+            attempts, started_at, finished_at, worker_id, priority, idem_key, created_at, updated_at
+        )
+        VALUES(?, ?, 'PENDING', 0, ?, '', '', 0, 0, 0, '', ?, ?, ?, ?)
+        """,
+        (str(task_id), str(type), payload_json, int(priority), str(idem_key or ""), now, now),
+    )
+    return {
+        "task_id": str(task_id),
+        "type": str(type),
+        "status": "PENDING",
+        "progress": 0.0,
+        "input_json": payload_json,
+        "result_json": "",
+        "error": "",
+        "attempts": 0,
+        "started_at": 0,
+        "finished_at": 0,
+        "worker_id": "",
+        "priority": int(priority),
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def create_task(*, task_id: str, type: str, input_json: Any = None, priority: int = 0) -> Dict[str, Any]:
+    payload_json = _dump_input(input_json)
 
-def create_task(*, task_id: str, type: str, input_json: Any = None) -> Dict[str, Any]:
     def _op() -> Dict[str, Any]:
         conn = get_conn()
         try:
             now = int(time.time())
-            payload_json = ""
-            if input_json is not None:
-                try:
-                    # ✅ 处理 Pydantic 模型：转换为字典
-                    processed_input = input_json
-                    if hasattr(processed_input, 'model_dump'):
-                        processed_input = processed_input.model_dump()
-                    elif hasattr(processed_input, 'dict'):
-                        processed_input = processed_input.dict()
-                    payload_json = json.dumps(processed_input, ensure_ascii=False, default=str)
-                except Exception:
-                    payload_json = json.dumps({"_raw": str(input_json)}, ensure_ascii=False)
-            q(
-                conn,
-                """
-                INSERT INTO tasks(
-                    task_id, type, status, progress, input_json, result_json, error,
-                    attempts, started_at, finished_at, worker_id, created_at, updated_at
-                )
-                VALUES(?, ?, 'PENDING', 0, ?, '', '', 0, 0, 0, '', ?, ?)
-                """,
-                (str(task_id), str(type), payload_json, now, now),
+            task = _insert_task(
+                conn, task_id=task_id, type=type, payload_json=payload_json, priority=priority, idem_key="", now=now
             )
             conn.commit()
-            return {
-                "task_id": str(task_id),
-                "type": str(type),
-                "status": "PENDING",
-                "progress": 0.0,
-                "input_json": payload_json,
-                "result_json": "",
-                "error": "",
-                "attempts": 0,
-                "started_at": 0,
-                "finished_at": 0,
-                "worker_id": "",
-                "created_at": now,
-                "updated_at": now,
-            }
+            return task
         finally:
             conn.close()
 
-    return write_with_retry(_op)
+    task = write_with_retry(_op)
+    _notify_created(task)
+    return task
 
 
-def update_task_status(
+def create_or_attach_task(
     *,
     task_id: str,
-    status: str,
-    progress: Optional[float] = None,
-    result: Optional[Any] = None,
-    error: Optional[str] = None,
-) -> None:
-    def _op() -> None:
+    type: str,
+    input_json: Any = None,
+    idem_key: str,
+    attach_max_age_sec: int,
+    result_ttl_sec: int,
+    priority: int = 0,
+) -> Tuple[Dict[str, Any], str]:
+    """
+    幂等提交（同一事务里查 + 插，并发重复提交也只会建一行）：
+    - 有相同 idem_key 的 PENDING / RUNNING（attach_max_age_sec 内创建）→ attached，复用该任务
+    - 有 result_ttl_sec 内完成的 SUCCESS → cached，直接带 result
+    - 否则新建 → created
+    返回 (任务 dict（同 get_task）, mode)
+    """
+    payload_json = _dump_input(input_json)
+
+    def _op() -> Tuple[Dict[str, Any], str]:
         conn = get_conn()
         try:
+            conn.execute("BEGIN IMMEDIATE;")
             now = int(time.time())
-            result_json = ""
-            if result is not None:
-                try:
-                    # ✅ 处理 Pydantic 模型：转换为字典
-                    processed_result = result
-                    if hasattr(processed_result, 'model_dump'):
-                        processed_result = processed_result.model_dump()
-                    elif hasattr(processed_result, 'dict'):
-                        processed_result = processed_result.dict()
-                    result_json = json.dumps(processed_result, ensure_ascii=False, default=str)
-                except Exception:
-                    result_json = json.dumps({"_raw": str(result)}, ensure_ascii=False)
-            finished_at = now if str(status) in ("SUCCESS", "FAILED") else None
-            q(
+            row = q(
                 conn,
                 """
-                UPDATE tasks
-                SET status=?, progress=COALESCE(?, progress), result_json=?, error=?,
-                    updated_at=?, finished_at=COALESCE(?, finished_at)
-                WHERE task_id=?
+                SELECT * FROM tasks
+                WHERE idem_key=? AND status IN ('PENDING', 'RUNNING') AND created_at>=? AND is_cancelled=0
+                ORDER BY created_at DESC
+                LIMIT 1
                 """,
-                (
-                    str(status),
-                    float(progress) if progress is not None else None,
-                    result_json,
-                    str(error or ""),
-                    now,
-                    finished_at,
-                    str(task_id),
-                ),
+                (str(idem_key), now - max(0, int(attach_max_age_sec))),
+            ).fetchone()
+            if row:
+                conn.commit()
+                return _row_to_task(row), "attached"
+            if int(result_ttl_sec) > 0:
+                row = q(
+                    conn,
+                    """
+                    SELECT * FROM tasks
+                    WHERE idem_key=? AND status='SUCCESS' AND finished_at>=?
+                    ORDER BY finished_at DESC
+                    LIMIT 1
+                    """,
+                    (str(idem_key), now - int(result_ttl_sec)),
+                ).fetchone()
+                if row:
+                    conn.commit()
+                    return _row_to_task(row), "cached"
+            _insert_task(
+                conn,
+                task_id=task_id,
+                type=type,
+                payload_json=payload_json,
+                priority=priority,
+                idem_key=idem_key,
+                now=now,
             )
             conn.commit()
+            row = q(conn, "SELECT * FROM tasks WHERE task_id=?", (str(task_id),)).fetchone()
+            return _row_to_task(row), "created"
         finally:
             conn.close()
 
-    write_with_retry(_op)
+    task, mode = write_with_retry(_op)
+    if mode == "created":
+        _notify_created(task)
+    return task, mode
+
+
+def update_task_status(
+    *,
+    task_id: str,
+    status: str,
+    progress: Optional[float] = None,
+    result: Optional[Any] = None,
+    error: Optional[str] = None,
+    wait: bool = False,
+) -> None:
+    now = int(time.time())
+    result_json = ""
+    if result is not None:
+        try:
+            # ✅ 处理 Pydantic 模型：转换为字典
+            processed_result = result
+            if hasattr(processed_result, 'model_dump'):
+                processed_result = processed_result.model_dump()
+            elif hasattr(processed_result, 'dict'):
+                processed_result = processed_result.dict()
+            result_json = json.dumps(processed_result, ensure_ascii=False, default=str)
+        except Exception:
+            result_json = json.dumps({"_raw": str(result)}, ensure_ascii=False)
+    finished_at = now if str(status) in ("SUCCESS", "FAILED") else None
+    change = {
+        "status": str(status),
+        "progress": float(progress) if progress is not None else None,
+        "error": str(error or ""),
+        "updated_at": now,
+    }
+    if result is not None:
+        change["result"] = json.loads(result_json) if result_json else None
+    params = (
+        str(status),
+        float(progress) if progress is not None else None,
+        result_json,
+        str(error or ""),
+        now,
+        finished_at,
+        str(task_id),
+    )
+
+    def _apply(conn) -> bool:
+        cur = q(
+            conn,
+            """
+            UPDATE tasks
+            SET status=?, progress=COALESCE(?, progress), result_json=?, error=?,
+                updated_at=?, finished_at=COALESCE(?, finished_at)
+            WHERE task_id=? AND (is_cancelled=0 OR ?='CANCELLED')
+            """,
+            (*params, str(status)),
+        )
+        return int(cur.rowcount or 0) == 1
+
+    def _published(updated: bool) -> None:
+        if updated:
+            _notify_status(str(task_id), change)
+
+    # ✅ 走单写线程批量提交；需要“写完立刻读”的调用方传 wait=True
+    # 已取消的任务不会被 worker 的完成状态覆盖回 SUCCESS / FAILED
+    # 事件在 COMMIT 之后发布：SSE 快照读到的一定不比已发布的事件旧
+    submit_write(_apply, wait=wait, on_commit=_published)
+
+
+def set_task_control(
+    *,
+    task_id: str,
+    status: str,
+    is_paused: Optional[bool] = None,
+    is_cancelled: Optional[bool] = None,
+    error: Optional[str] = None,
+) -> None:
+    """取消 / 暂停 / 恢复：状态和调度标记一起改，认领时按 is_paused / is_cancelled 跳过"""
+    now = int(time.time())
+    params = (
+        str(status),
+        None if is_paused is None else int(bool(is_paused)),
+        None if is_cancelled is None else int(bool(is_cancelled)),
+        error,
+        now,
+        now if str(status) == "CANCELLED" else None,
+        str(task_id),
+    )
+
+    change: Dict[str, Any] = {"status": str(status), "updated_at": now}
+    if error is not None:
+        change["error"] = str(error)
+
+    def _apply(conn) -> bool:
+        cur = q(
+            conn,
+            """
+            UPDATE tasks
+            SET status=?, is_paused=COALESCE(?, is_paused), is_cancelled=COALESCE(?, is_cancelled),
+                error=COALESCE(?, error), updated_at=?, finished_at=COALESCE(?, finished_at)
+            WHERE task_id=?
+            """,
+            params,
+        )
+        return int(cur.rowcount or 0) == 1
+
+    def _published(updated: bool) -> None:
+        if updated:
+            _notify_status(str(task_id), change)
+
+    submit_write(_apply, wait=True, on_commit=_published)
+
+
+def _row_to_task(row) -> Dict[str, Any]:
+    result = None
+    if row["result_json"]:
+        try:
+            result = json.loads(row["result_json"])
+        except Exception:
+            result = None
+    input_obj = None
+    input_json = str(row["input_json"] or "")
+    if input_json:
+        try:
+            input_obj = json.loads(input_json)
+        except Exception:
+            input_obj = None
+    return {
+        "task_id": str(row["task_id"]),
+        "type": str(row["type"]),
+        "status": str(row["status"]),
+        "progress": float(row["progress"] or 0.0),
+        "input": input_obj,
+        "input_json": input_json,
+        "result_json": str(row["result_json"] or ""),
+        "result": result,
+        "error": str(row["error"] or ""),
+        "attempts": int(row["attempts"] or 0),
+        "started_at": int(row["started_at"] or 0),
+        "finished_at": int(row["finished_at"] or 0),
+        "worker_id": str(row["worker_id"] or ""),
+        "created_at": int(row["created_at"]),
+        "updated_at": int(row["updated_at"]),
+    }
 
 
 def get_task(task_id: str) -> Optional[Dict[str, Any]]:
@@ -114,36 +341,7 @@ def get_task(task_id: str) -> Optional[Dict[str, Any]]:
         row = cur.fetchone()
         if not row:
             return None
-        result = None
-        if row["result_json"]:
-            try:
-                result = json.loads(row["result_json"])
-            except Exception:
-                result = None
-        input_obj = None
-        input_json = str(row["input_json"] or "")
-        if input_json:
-            try:
-                input_obj = json.loads(input_json)
-            except Exception:
-                input_obj = None
-        return {
-            "task_id": str(row["task_id"]),
-            "type": str(row["type"]),
-            "status": str(row["status"]),
-            "progress": float(row["progress"] or 0.0),
-            "input": input_obj,
-            "input_json": input_json,
-            "result_json": str(row["result_json"] or ""),
-            "result": result,
-            "error": str(row["error"] or ""),
-            "attempts": int(row["attempts"] or 0),
-            "started_at": int(row["started_at"] or 0),
-            "finished_at": int(row["finished_at"] or 0),
-            "worker_id": str(row["worker_id"] or ""),
-            "created_at": int(row["created_at"]),
-            "updated_at": int(row["updated_at"]),
-        }
+        return _row_to_task(row)
     finally:
         conn.close()
 
@@ -243,47 +441,197 @@ def reset_running_tasks() -> int:
     return int(write_with_retry(_op))
 
 
-def claim_next_task(worker_id: str) -> Optional[Dict[str, Any]]:
+class _FairShare:
+    """
+    按任务类型的加权公平份额（stride 调度）：
+    同一优先级层里选 pass 最小的类型，认领后该类型 pass += 1/weight；
+    刚变成有积压的类型 pass 抬到当前最小值，避免闲了很久的类型回来后独占
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pass: Dict[str, float] = {}
+        self._claimed: Dict[str, int] = {}
+
+    def pick(self, types: List[str]) -> str:
+        with self._lock:
+            known = [self._pass[t] for t in types if t in self._pass]
+            vt = min(known) if known else 0.0
+            for t in types:
+                self._pass[t] = max(self._pass.get(t, vt), vt)
+            return min(types, key=lambda t: (self._pass[t], t))
+
+    def charge(self, task_type: str, weights: Dict[str, float]) -> None:
+        with self._lock:
+            w = max(0.01, float(weights.get(task_type, 1.0)))
+            self._pass[task_type] = self._pass.get(task_type, 0.0) + 1.0 / w
+            self._claimed[task_type] = self._claimed.get(task_type, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pass": {k: round(v, 3) for k, v in self._pass.items()},
+                "claimed": dict(self._claimed),
+            }
+
+
+_fair = _FairShare()
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _aging_sec() -> int:
+    return max(0, int(_setting("TASK_AGING_SEC", TASK_AGING_SEC)))
+
+
+def _type_weights() -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in str(_setting("TASK_TYPE_WEIGHTS", "") or "").split(","):
+        k, sep, v = part.partition("=")
+        if not sep or not k.strip():
+            continue
+        try:
+            out[k.strip()] = max(0.01, float(v.strip()))
+        except ValueError:
+            continue
+    return out
+
+
+def task_scheduler_stats() -> Dict[str, Any]:
+    out = _fair.stats()
+    out["aging_sec"] = _aging_sec()
+    out["weights"] = _type_weights()
+    return out
+
+
+def claim_tasks(
+    worker_id: str,
+    *,
+    limit: int = 1,
+    type_slots: Optional[Dict[str, int]] = None,
+    default_slots: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    一次事务里认领最多 limit 个可调度的 PENDING 任务（跳过 is_paused / is_cancelled）
+
+    调度顺序：
+    1) 有效优先级高的先：priority + 等待时长 // TASK_AGING_SEC（老化，低优先级不会永远等）
+    2) 同一有效优先级里按 TASK_TYPE_WEIGHTS 做类型间加权公平
+    3) 同一类型里按 (priority DESC, created_at)
+
+    候选集 = 按 (priority DESC, created_at) 的前 N 条 ∪ 最早创建的 N 条，两条都走部分覆盖索引
+
+    - type_slots：每种任务类型本次最多还能认领几个（0 = 该类型已满，直接排除）
+    - default_slots：type_slots 里没列出的类型的名额；None = 不限
+    """
+    limit = max(1, int(limit))
+    slots = {str(k): max(0, int(v)) for k, v in (type_slots or {}).items()}
+    full = [k for k, v in slots.items() if v <= 0]
+    if default_slots is not None and int(default_slots) <= 0 and len(full) == len(slots):
+        return []
+
+    where = "status='PENDING' AND is_paused=0 AND is_cancelled=0"
+    params: List[Any] = []
+    if full:
+        where += f" AND type NOT IN ({','.join('?' for _ in full)})"
+        params.extend(full)
+    n = max(limit * 4, TASK_SCHED_CANDIDATES)
+    aging = _aging_sec()
+    weights = _type_weights()
+
+    def _has_slot(task_type: str) -> bool:
+        left = slots.get(task_type, default_slots)
+        return left is None or left > 0
+
     conn = get_conn()
     try:
         conn.execute("BEGIN IMMEDIATE;")
-        cur = q(
-            conn,
-            """
-            SELECT * FROM tasks
-            WHERE status='PENDING'
-            ORDER BY created_at ASC
-            LIMIT 1
-            """,
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.commit()
-            return None
         now = int(time.time())
-        cur = q(
-            conn,
-            """
-            UPDATE tasks
-            SET status='RUNNING', started_at=?, updated_at=?, worker_id=?, attempts=attempts+1
-            WHERE task_id=? AND status='PENDING'
-            """,
-            (now, now, str(worker_id), str(row["task_id"])),
-        )
+        cand: Dict[str, Dict[str, Any]] = {}
+        # 指定部分索引：idx_tasks_is_cancelled 之类的单列索引没有统计信息时会被优先选中
+        for index, order in (
+            ("idx_tasks_pending_sched", "priority DESC, created_at ASC"),
+            ("idx_tasks_pending_age", "created_at ASC"),
+        ):
+            cur = q(
+                conn,
+                f"""
+                SELECT task_id, type, priority, created_at FROM tasks INDEXED BY {index}
+                WHERE {where}
+                ORDER BY {order}
+                LIMIT ?
+                """,
+                [*params, n],
+            )
+            for row in cur.fetchall():
+                prio = int(row["priority"] or 0)
+                created = int(row["created_at"] or 0)
+                cand[str(row["task_id"])] = {
+                    "task_id": str(row["task_id"]),
+                    "type": str(row["type"]),
+                    "priority": prio,
+                    "created_at": created,
+                    "tier": prio + ((now - created) // aging if aging > 0 else 0),
+                }
+
+        pool = list(cand.values())
+        out: List[Dict[str, Any]] = []
+        while pool and len(out) < limit:
+            eligible = [c for c in pool if _has_slot(c["type"])]
+            if not eligible:
+                break
+            top = max(c["tier"] for c in eligible)
+            tier = [c for c in eligible if c["tier"] == top]
+            t = _fair.pick(sorted({c["type"] for c in tier}))
+            c = min((c for c in tier if c["type"] == t), key=lambda c: (-c["priority"], c["created_at"]))
+            pool.remove(c)
+            left = slots.get(t, default_slots)
+            if left is not None:
+                slots[t] = left - 1
+
+            cur = q(
+                conn,
+                """
+                UPDATE tasks
+                SET status='RUNNING', started_at=?, updated_at=?, worker_id=?, attempts=attempts+1
+                WHERE task_id=? AND status='PENDING' AND is_paused=0 AND is_cancelled=0
+                """,
+                (now, now, str(worker_id), c["task_id"]),
+            )
+            if int(cur.rowcount or 0) != 1:
+                continue
+            row = q(conn, "SELECT input_json, attempts FROM tasks WHERE task_id=?", (c["task_id"],)).fetchone()
+            _fair.charge(t, weights)
+            out.append(
+                {
+                    "task_id": c["task_id"],
+                    "type": t,
+                    "status": "RUNNING",
+                    "priority": c["priority"],
+                    "input_json": str(row["input_json"] or "") if row else "",
+                    "attempts": int(row["attempts"] or 0) if row else 1,
+                }
+            )
         conn.commit()
-        if int(cur.rowcount or 0) != 1:
-            return None
-        return {
-            "task_id": str(row["task_id"]),
-            "type": str(row["type"]),
-            "status": "RUNNING",
-            "input_json": str(row["input_json"] or ""),
-            "attempts": int(row["attempts"] or 0) + 1,
-        }
+        for t in out:
+            _notify_status(t["task_id"], {"status": "RUNNING", "updated_at": now})
+        return out
     finally:
         conn.close()
 
 
+def claim_next_task(worker_id: str) -> Optional[Dict[str, Any]]:
+    tasks = claim_tasks(worker_id, limit=1)
+    return tasks[0] if tasks else None
+
+
 def delete_tasks_by_ids(task_ids: List[str]) -> int:
     if not task_ids:
         return 0
@@ -0,0 +1,89 @@
+# db/utils/bench_sqlite.py
+"""
+连接池微基准：对比“每次新建连接”（旧 get_conn 行为）与线程内复用连接池
+
+用法（在 fastApiProject 目录下）：
+    python -m db.utils.bench_sqlite [--n 2000]
+
+使用临时库文件，不会动 data/app.db
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import db.utils.sqlite as sq
+
+
+def _legacy_conn() -> sqlite3.Connection:
+    # 与连接池之前的 get_conn() 完全一致
+    conn = sqlite3.connect(sq.DB_FILE.as_posix(), check_same_thread=False, timeout=5.0)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA busy_timeout=5000;")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _bench_connect(get: Callable[[], sqlite3.Connection], n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        conn = get()
+        conn.close()
+    return n / max(time.perf_counter() - t0, 1e-9)
+
+
+def _bench_query(get: Callable[[], sqlite3.Connection], n: int) -> Dict[str, float]:
+    """模拟 repo 调用：get_conn -> 单条 SELECT -> close"""
+    lat: List[float] = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        conn = get()
+        try:
+            sq.q(conn, "SELECT ts FROM ops_cooldown WHERE k=?", (f"heal:cooldown:default:{i % 100}",)).fetchone()
+        finally:
+            conn.close()
+        lat.append((time.perf_counter() - t0) * 1e6)
+    lat.sort()
+    return {
+        "p50_us": statistics.median(lat),
+        "p99_us": lat[min(len(lat) - 1, int(len(lat) * 0.99))],
+        "mean_us": statistics.fmean(lat),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        sq.DB_FILE = Path(d) / "bench.db"
+        sq.init_db()
+        with sq.transaction() as conn:
+            sq.qmany(
+                conn,
+                "INSERT INTO ops_cooldown(k, ts) VALUES(?, ?)",
+                [(f"heal:cooldown:default:{i}", i) for i in range(100)],
+            )
+
+        rows = [
+            ("legacy (new conn)", _legacy_conn),
+            ("pooled (thread-local)", sq.get_conn),
+        ]
+        print(f"{'mode':<24}{'conn/s':>12}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}")
+        for name, get in rows:
+            cps = _bench_connect(get, args.n)
+            st = _bench_query(get, args.n)
+            print(f"{name:<24}{cps:>12.0f}{st['p50_us']:>10.1f}{st['p99_us']:>10.1f}{st['mean_us']:>10.1f}")
+
+        print("pool_stats:", sq.pool_stats())
+        sq.close_thread_connections()
+
+
+if __name__ == "__main__":
+    main()
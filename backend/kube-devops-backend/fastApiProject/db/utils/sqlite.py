@@ -1,25 +1,207 @@
 # db/sqlite.py
 from __future__ import annotations
 
+import functools
+import os
+import re
 import sqlite3
+import threading
 import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Iterable, Callable
+from typing import Any, Iterable, Callable, Dict, Iterator, List
 
 DB_PATH = Path(__file__).parent.parent.parent / "data"
 DB_PATH.mkdir(exist_ok=True)
 DB_FILE = DB_PATH / "app.db"
 
+# ✅ 连接级 PRAGMA：只在建连时执行一次（连接会被线程内复用）
+# - synchronous=NORMAL：WAL 模式下安全且比 FULL 少一次 fsync
+# - cache_size 负数表示 KiB
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA cache_size=-16000;",
+    "PRAGMA mmap_size=67108864;",
+    "PRAGMA temp_store=MEMORY;",
+)
 
-def get_conn() -> sqlite3.Connection:
-    """获取数据库连接"""
+# 每个线程最多缓存多少个空闲连接（嵌套 get_conn 时会同时持有多个）
+POOL_MAX_IDLE_PER_THREAD = 4
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_regexp(pattern: str) -> "re.Pattern[str]":
+    return re.compile(pattern)
+
+
+def _regexp(pattern: str, value: Any) -> bool:
+    """SQL 的 `v REGEXP ?`：整串匹配（同 Prometheus 标签匹配器的锚定语义）"""
+    if value is None:
+        return False
+    return _compile_regexp(str(pattern)).fullmatch(str(value)) is not None
+
+
+def _open_conn() -> sqlite3.Connection:
+    """新建一条连接并应用 PRAGMA（不走连接池）"""
     conn = sqlite3.connect(DB_FILE.as_posix(), check_same_thread=False, timeout=5.0)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA busy_timeout=5000;")
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    conn.create_function("regexp", 2, _regexp, deterministic=True)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+class _ThreadPool(threading.local):
+    def __init__(self) -> None:
+        self.idle: List[sqlite3.Connection] = []
+        self.db_file = ""
+        self.pid = 0
+
+
+_pool = _ThreadPool()
+_pool_stats_lock = threading.Lock()
+_pool_stats: Dict[str, int] = {"opened": 0, "reused": 0, "released": 0, "discarded": 0}
+
+
+def _stat_inc(k: str) -> None:
+    with _pool_stats_lock:
+        _pool_stats[k] += 1
+
+
+def _drop_idle() -> None:
+    for raw in _pool.idle:
+        try:
+            raw.close()
+        except Exception:
+            pass
+    _pool.idle = []
+
+
+def _acquire() -> sqlite3.Connection:
+    db_file = DB_FILE.as_posix()
+    pid = os.getpid()
+    # DB_FILE 被替换 / fork 之后：旧连接一律丢弃
+    if _pool.db_file != db_file or _pool.pid != pid:
+        _drop_idle()
+        _pool.db_file = db_file
+        _pool.pid = pid
+
+    if _pool.idle:
+        _stat_inc("reused")
+        return _pool.idle.pop()
+
+    _stat_inc("opened")
+    return _open_conn()
+
+
+def _release(raw: sqlite3.Connection) -> None:
+    try:
+        # 调用方没 commit 的写入：与原来 close() 的语义一致 -> 丢弃
+        if raw.in_transaction:
+            raw.rollback()
+        raw.row_factory = sqlite3.Row
+    except Exception:
+        _stat_inc("discarded")
+        try:
+            raw.close()
+        except Exception:
+            pass
+        return
+
+    if len(_pool.idle) >= POOL_MAX_IDLE_PER_THREAD or _pool.pid != os.getpid():
+        _stat_inc("discarded")
+        raw.close()
+        return
+
+    _stat_inc("released")
+    _pool.idle.append(raw)
+
+
+class PooledConnection:
+    """
+    sqlite3.Connection 代理：
+    - 其他属性/方法全部透传
+    - close() 不真正关闭，而是归还到当前线程的空闲连接池
+    """
+
+    __slots__ = ("_raw",)
+
+    def __init__(self, raw: sqlite3.Connection) -> None:
+        object.__setattr__(self, "_raw", raw)
+
+    def _live(self) -> sqlite3.Connection:
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return raw
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._live(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._live(), name, value)
+
+    def close(self) -> None:
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None:
+            return
+        object.__setattr__(self, "_raw", None)
+        _release(raw)
+
+
+def get_conn() -> PooledConnection:
+    """获取数据库连接（线程内复用；close() 即归还）"""
+    return PooledConnection(_acquire())
+
+
+@contextmanager
+def connection() -> Iterator[PooledConnection]:
+    """
+    with connection() as conn:
+        ...
+    退出时自动归还（未 commit 的事务会被回滚）
+    """
+    conn = get_conn()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def transaction() -> Iterator[PooledConnection]:
+    """
+    with transaction() as conn:
+        ...
+    正常退出 commit，异常 rollback
+    """
+    conn = get_conn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def pool_stats() -> Dict[str, Any]:
+    with _pool_stats_lock:
+        out: Dict[str, Any] = dict(_pool_stats)
+    total = out["opened"] + out["reused"]
+    out["reuse_ratio"] = (float(out["reused"]) / total) if total else 0.0
+    out["idle_this_thread"] = len(_pool.idle)
+    return out
+
+
+def close_thread_connections() -> None:
+    """关闭当前线程缓存的空闲连接（线程退出前/测试用）"""
+    _drop_idle()
+
+
 def q(conn: sqlite3.Connection, sql: str, params: Iterable[Any] = ()):
     """执行单条 SQL"""
     cur = conn.cursor()
@@ -306,7 +488,8 @@ def init_db() -> None:
                     created_at INTEGER NOT NULL,
                     last_push_status TEXT NOT NULL DEFAULT '',
                     last_push_error TEXT NOT NULL DEFAULT '',
-                    last_push_at INTEGER NOT NULL DEFAULT 0
+                    last_push_at INTEGER NOT NULL DEFAULT 0,
+                    group_key TEXT NOT NULL DEFAULT ''
                 );
                 """,
             )
@@ -318,9 +501,61 @@ def init_db() -> None:
                 q(conn, "ALTER TABLE alerts ADD COLUMN last_push_error TEXT NOT NULL DEFAULT '';", ())
             if "last_push_at" not in c:
                 q(conn, "ALTER TABLE alerts ADD COLUMN last_push_at INTEGER NOT NULL DEFAULT 0;", ())
+            if "group_key" not in c:
+                q(conn, "ALTER TABLE alerts ADD COLUMN group_key TEXT NOT NULL DEFAULT '';", ())
         q(conn, "CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_fp ON alerts(fingerprint);", ())
         q(conn, "CREATE INDEX IF NOT EXISTS idx_alerts_last_seen ON alerts(last_seen);", ())
         q(conn, "CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status);", ())
+        # 组成员计数 / 组内列表
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_alerts_group ON alerts(group_key, status, last_seen);", ())
+        # 告警中心按 (last_seen, id) 翻页时的过滤列
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_alerts_status_seen ON alerts(status, last_seen);", ())
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_alerts_source_seen ON alerts(source, last_seen);", ())
+
+        # 11b) alert_labels（告警标签拆成行：按标签过滤走 (k, v) 索引）+ alert_label_counts（标签分面计数）
+        if not _has_table(conn, "alert_labels"):
+            q(
+                conn,
+                """
+                CREATE TABLE IF NOT EXISTS alert_labels(
+                    alert_id INTEGER NOT NULL,
+                    k TEXT NOT NULL,
+                    v TEXT NOT NULL,
+                    PRIMARY KEY(alert_id, k)
+                ) WITHOUT ROWID;
+                """,
+            )
+            # 旧库升级：从 labels_json 回填
+            q(
+                conn,
+                """
+                INSERT OR IGNORE INTO alert_labels(alert_id, k, v)
+                SELECT a.id, j.key, CAST(j.value AS TEXT) FROM alerts a, json_each(a.labels_json) j
+                WHERE j.type NOT IN ('object', 'array', 'null')
+                """,
+            )
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_alert_labels_kv ON alert_labels(k, v, alert_id);", ())
+        if not _has_table(conn, "alert_label_counts"):
+            q(
+                conn,
+                """
+                CREATE TABLE IF NOT EXISTS alert_label_counts(
+                    k TEXT NOT NULL,
+                    v TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    n INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY(k, v, status)
+                ) WITHOUT ROWID;
+                """,
+            )
+            q(
+                conn,
+                """
+                INSERT INTO alert_label_counts(k, v, status, n)
+                SELECT l.k, l.v, a.status, COUNT(*) FROM alert_labels l JOIN alerts a ON a.id=l.alert_id
+                GROUP BY l.k, l.v, a.status
+                """,
+            )
 
         # 12) tasks
         q(
@@ -355,12 +590,40 @@ def init_db() -> None:
         _ensure_column(conn, "tasks", "started_at", "started_at INTEGER NOT NULL DEFAULT 0")
         _ensure_column(conn, "tasks", "finished_at", "finished_at INTEGER NOT NULL DEFAULT 0")
         _ensure_column(conn, "tasks", "worker_id", "worker_id TEXT NOT NULL DEFAULT ''")
+        _ensure_column(conn, "tasks", "idem_key", "idem_key TEXT NOT NULL DEFAULT ''")
 
         q(conn, "CREATE INDEX IF NOT EXISTS idx_tasks_updated ON tasks(updated_at);", ())
         q(conn, "CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);", ())
         q(conn, "CREATE INDEX IF NOT EXISTS idx_tasks_type ON tasks(type);", ())
         q(conn, "CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority DESC);", ())
         q(conn, "CREATE INDEX IF NOT EXISTS idx_tasks_is_cancelled ON tasks(is_cancelled);", ())
+        # ✅ 认领用的覆盖型部分索引：只含可调度的 PENDING 行，选候选不回表
+        # （条件列也放进索引：老版本 SQLite 否则仍会回表校验 WHERE）
+        q(
+            conn,
+            """
+            CREATE INDEX IF NOT EXISTS idx_tasks_pending_sched
+            ON tasks(priority DESC, created_at, type, task_id, status, is_paused, is_cancelled)
+            WHERE status='PENDING' AND is_paused=0 AND is_cancelled=0;
+            """,
+            (),
+        )
+        # 老化候选：最早创建的 PENDING（低优先级等久了也要能被选中）
+        q(
+            conn,
+            """
+            CREATE INDEX IF NOT EXISTS idx_tasks_pending_age
+            ON tasks(created_at, priority, type, task_id, status, is_paused, is_cancelled)
+            WHERE status='PENDING' AND is_paused=0 AND is_cancelled=0;
+            """,
+            (),
+        )
+        # 幂等去重：相同规范化输入的任务（只索引有 idem_key 的行）
+        q(
+            conn,
+            "CREATE INDEX IF NOT EXISTS idx_tasks_idem ON tasks(idem_key, status, created_at) WHERE idem_key<>'';",
+            (),
+        )
 
         # 13) maintenance logs
         if not _has_table(conn, "maintenance_logs"):
@@ -376,6 +639,82 @@ def init_db() -> None:
                 """,
             )
 
+        # 14) ai_backtest_metrics（预测 holdout 回测结果，按 series + 模型配置缓存）
+        q(
+            conn,
+            """
+            CREATE TABLE IF NOT EXISTS ai_backtest_metrics(
+                series_key TEXT NOT NULL,
+                config_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                mae REAL NOT NULL DEFAULT 0,
+                rmse REAL NOT NULL DEFAULT 0,
+                mape REAL NOT NULL DEFAULT 0,
+                baseline_mape REAL NOT NULL DEFAULT 0,
+                scores TEXT NOT NULL DEFAULT '',
+                computed_at INTEGER NOT NULL,
+                PRIMARY KEY(series_key, config_hash)
+            );
+            """,
+        )
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_ai_backtest_computed ON ai_backtest_metrics(computed_at);", ())
+
+        # 15) notify_outbox（飞书通知出站队列：持久化、按 fingerprint 合并、失败退避重试）
+        q(
+            conn,
+            """
+            CREATE TABLE IF NOT EXISTS notify_outbox(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fingerprint TEXT NOT NULL,
+                payload_json TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                coalesced INTEGER NOT NULL DEFAULT 0,
+                next_at INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT NOT NULL DEFAULT '',
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            );
+            """,
+        )
+        # 同一 fingerprint 只保留一条待发送（新告警覆盖旧 payload = 合并）
+        q(
+            conn,
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_notify_outbox_pending_fp ON notify_outbox(fingerprint) WHERE status='pending';",
+            (),
+        )
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_notify_outbox_due ON notify_outbox(status, next_at, id);", ())
+
+        # 16) alert_groups（告警分组：按标签集合聚合，组级通知 group_wait / group_interval / repeat）
+        q(
+            conn,
+            """
+            CREATE TABLE IF NOT EXISTS alert_groups(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                group_key TEXT NOT NULL,
+                labels_json TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'firing',
+                firing_count INTEGER NOT NULL DEFAULT 0,
+                total_count INTEGER NOT NULL DEFAULT 0,
+                first_seen INTEGER NOT NULL,
+                last_seen INTEGER NOT NULL,
+                dirty INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0,
+                next_notify_at INTEGER NOT NULL DEFAULT 0,
+                repeat_at INTEGER NOT NULL DEFAULT 0,
+                last_notified_at INTEGER NOT NULL DEFAULT 0,
+                last_push_status TEXT NOT NULL DEFAULT '',
+                last_push_error TEXT NOT NULL DEFAULT '',
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            );
+            """,
+        )
+        q(conn, "CREATE UNIQUE INDEX IF NOT EXISTS idx_alert_groups_key ON alert_groups(group_key);", ())
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_alert_groups_last_seen ON alert_groups(status, last_seen);", ())
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_alert_groups_due ON alert_groups(dirty, next_notify_at);", ())
+        q(conn, "CREATE INDEX IF NOT EXISTS idx_alert_groups_repeat ON alert_groups(repeat_at) WHERE repeat_at>0;", ())
+
         conn.commit()
     finally:
         conn.close()
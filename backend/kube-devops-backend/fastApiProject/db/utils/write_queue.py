@@ -0,0 +1,281 @@
+# db/utils/write_queue.py
+"""
+单写线程 + 有界队列：把高频小写入（审计/告警/任务状态）合并成一次事务提交
+
+- submit_write(op)：op(conn) 只执行 SQL，不 commit；由写线程统一 BEGIN IMMEDIATE ... COMMIT
+- 每批最多 WRITE_BATCH_MAX 条，或攒够 WRITE_FLUSH_INTERVAL_MS 就提交
+- 每个 op 包一层 SAVEPOINT：单条失败只回滚自己，不拖累同批其他写入
+- wait=True / flush_writes()：读己之写（等到已提交再返回）
+- on_commit(result)：op 所在事务提交成功后由写线程回调（重试 / 回滚的批次不会回调），用于发布变更事件
+- 队列满 / 写线程未启动：退化为调用线程同步写（不丢审计）
+"""
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from db.utils.sqlite import get_conn, write_with_retry
+
+WRITE_QUEUE_MAX = 10000
+WRITE_BATCH_MAX = 256
+WRITE_FLUSH_INTERVAL_MS = 50
+WRITE_ENQUEUE_TIMEOUT_SEC = 0.2
+
+WriteOp = Callable[[sqlite3.Connection], Any]
+
+
+class _WriteItem:
+    __slots__ = ("op", "on_commit", "done", "result", "error", "enqueued_at")
+
+    def __init__(self, op: Optional[WriteOp], wait: bool, on_commit: Optional[Callable[[Any], None]] = None) -> None:
+        self.op = op
+        self.on_commit = on_commit
+        self.done: Optional[threading.Event] = threading.Event() if wait else None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.enqueued_at = time.monotonic()
+
+
+_queue: "queue.Queue[_WriteItem]" = queue.Queue(maxsize=WRITE_QUEUE_MAX)
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+_stop = threading.Event()
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "enqueued": 0,
+    "committed": 0,
+    "failed": 0,
+    "batches": 0,
+    "sync_fallback": 0,
+    "max_depth": 0,
+}
+_commit_ms: Deque[float] = deque(maxlen=512)
+_wait_ms: Deque[float] = deque(maxlen=512)
+
+
+def _stat_add(k: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[k] += n
+
+
+def _fire_on_commit(fn: Optional[Callable[[Any], None]], result: Any) -> None:
+    if fn is None:
+        return
+    try:
+        fn(result)
+    except Exception as e:
+        print(f"write_queue on_commit error: {e}")
+
+
+def _run_sync(op: WriteOp, on_commit: Optional[Callable[[Any], None]] = None) -> Any:
+    def _op() -> Any:
+        conn = get_conn()
+        try:
+            out = op(conn)
+            conn.commit()
+            return out
+        finally:
+            conn.close()
+
+    out = write_with_retry(_op)
+    _fire_on_commit(on_commit, out)
+    return out
+
+
+def _commit_batch(batch: List[_WriteItem]) -> None:
+    def _op() -> None:
+        conn = get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            for it in batch:
+                if it.op is None:
+                    continue
+                it.error = None
+                conn.execute("SAVEPOINT wq;")
+                try:
+                    it.result = it.op(conn)
+                    conn.execute("RELEASE wq;")
+                except sqlite3.OperationalError as e:
+                    msg = str(e).lower()
+                    if "locked" in msg or "busy" in msg:
+                        raise  # 整批交给 write_with_retry 重试
+                    it.error = e
+                    conn.execute("ROLLBACK TO wq;")
+                    conn.execute("RELEASE wq;")
+                except Exception as e:
+                    it.error = e
+                    conn.execute("ROLLBACK TO wq;")
+                    conn.execute("RELEASE wq;")
+            conn.commit()
+        finally:
+            conn.close()
+
+    t0 = time.perf_counter()
+    committed = False
+    try:
+        write_with_retry(_op)
+        committed = True
+    except Exception as e:
+        for it in batch:
+            if it.op is not None and it.error is None:
+                it.error = e
+    # ✅ 只在 COMMIT 成功之后回调（重试过的批次只回调最终那次的结果）
+    if committed:
+        for it in batch:
+            if it.op is not None and it.error is None:
+                _fire_on_commit(it.on_commit, it.result)
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+
+    now = time.monotonic()
+    failed = sum(1 for it in batch if it.op is not None and it.error is not None)
+    ops = sum(1 for it in batch if it.op is not None)
+    with _stats_lock:
+        _stats["batches"] += 1
+        _stats["committed"] += ops - failed
+        _stats["failed"] += failed
+        _commit_ms.append(elapsed_ms)
+        for it in batch:
+            _wait_ms.append((now - it.enqueued_at) * 1000.0)
+
+    for it in batch:
+        if it.error is not None and it.op is not None and it.done is None:
+            print(f"write_queue op failed: {it.error}")
+        if it.done is not None:
+            it.done.set()
+
+
+def _writer_loop() -> None:
+    interval = max(WRITE_FLUSH_INTERVAL_MS, 1) / 1000.0
+    while True:
+        try:
+            first = _queue.get(timeout=0.5)
+        except queue.Empty:
+            if _stop.is_set():
+                return
+            continue
+
+        batch = [first]
+        deadline = time.monotonic() + interval
+        while len(batch) < WRITE_BATCH_MAX:
+            # flush 屏障：不再等凑批，立即提交
+            if batch[-1].op is None:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            _commit_batch(batch)
+        except Exception as e:
+            print(f"write_queue batch error: {e}")
+            for it in batch:
+                if it.done is not None:
+                    it.done.set()
+
+
+def start_write_queue() -> None:
+    global _thread
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_writer_loop, name="sqlite-writer", daemon=True)
+        _thread.start()
+
+
+def _writer_alive() -> bool:
+    return _thread is not None and _thread.is_alive() and not _stop.is_set()
+
+
+def submit_write(
+    op: WriteOp,
+    *,
+    wait: bool = False,
+    timeout: float = 10.0,
+    on_commit: Optional[Callable[[Any], None]] = None,
+) -> Any:
+    """
+    提交一个写操作
+    - wait=False：入队即返回 None
+    - wait=True：等待提交完成，返回 op 的返回值（失败则抛出原异常）
+    - on_commit：提交成功后以 op 的返回值回调（wait=True 时在返回之前已回调完）
+    """
+    if not _writer_alive():
+        _stat_add("sync_fallback")
+        return _run_sync(op, on_commit)
+
+    item = _WriteItem(op, wait, on_commit)
+    try:
+        _queue.put(item, timeout=WRITE_ENQUEUE_TIMEOUT_SEC)
+    except queue.Full:
+        _stat_add("sync_fallback")
+        return _run_sync(op, on_commit)
+
+    with _stats_lock:
+        _stats["enqueued"] += 1
+        depth = _queue.qsize()
+        if depth > _stats["max_depth"]:
+            _stats["max_depth"] = depth
+
+    if not wait:
+        return None
+    if not item.done.wait(timeout):
+        raise TimeoutError("write_queue: commit wait timeout")
+    if item.error is not None:
+        raise item.error
+    return item.result
+
+
+def flush_writes(timeout: float = 10.0) -> bool:
+    """
+    屏障：等到调用前已入队的写入全部提交
+    """
+    if not _writer_alive():
+        return True
+    barrier = _WriteItem(None, True)
+    try:
+        _queue.put(barrier, timeout=timeout)
+    except queue.Full:
+        return False
+    return barrier.done.wait(timeout)
+
+
+def stop_write_queue(timeout: float = 5.0) -> None:
+    global _thread
+    flush_writes(timeout=timeout)
+    _stop.set()
+    with _thread_lock:
+        t = _thread
+        _thread = None
+    if t is not None:
+        t.join(timeout=timeout)
+
+
+def _pct(vals: List[float], p: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(len(vals) * p))]
+
+
+def write_queue_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out: Dict[str, Any] = dict(_stats)
+        commit_ms = list(_commit_ms)
+        wait_ms = list(_wait_ms)
+    out["depth"] = _queue.qsize()
+    out["capacity"] = WRITE_QUEUE_MAX
+    out["running"] = _writer_alive()
+    out["avg_batch"] = (float(out["committed"] + out["failed"]) / out["batches"]) if out["batches"] else 0.0
+    out["commit_ms"] = {"p50": _pct(commit_ms, 0.5), "p95": _pct(commit_ms, 0.95), "p99": _pct(commit_ms, 0.99)}
+    out["enqueue_to_commit_ms"] = {"p50": _pct(wait_ms, 0.5), "p95": _pct(wait_ms, 0.95), "p99": _pct(wait_ms, 0.99)}
+    return out
@@ -11,7 +11,12 @@ import uuid
 from config import settings
 
 from db.utils.sqlite import init_db
-from services.tasks.worker import start_task_worker
+from db.utils.write_queue import start_write_queue, stop_write_queue
+from services.tasks.worker import start_task_worker, stop_task_worker
+from services.notification.feishu_dispatcher import start_notify_dispatcher, stop_notify_dispatcher
+from services.alerts.grouping import start_alert_grouper, stop_alert_grouper
+from services.k8s.informer import start_informers, stop_informers
+from services.ai.forecast_pool import shutdown_forecast_pool, warm_forecast_pool
 from routers import (
     logs,
     prom,
@@ -42,12 +47,23 @@ from services.ops.scheduler import start_healer, stop_healer
 async def lifespan(app: FastAPI):
     # === startup ===
     init_db()
+    start_write_queue()
     auth.seed_admin()
+    start_notify_dispatcher()
+    start_alert_grouper()
     start_healer()
     start_task_worker()
+    start_informers()
+    warm_forecast_pool()
     yield
     # === shutdown ===
+    stop_informers()
+    shutdown_forecast_pool()
+    stop_task_worker()
     stop_healer()
+    stop_alert_grouper()
+    stop_notify_dispatcher()
+    stop_write_queue()
 
 
 app = FastAPI(
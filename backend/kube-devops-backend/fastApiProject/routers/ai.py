@@ -13,11 +13,20 @@ from concurrent.futures import ThreadPoolExecutor
 
 from services.ai.forecast_cpu import get_cpu_history, get_cpu_forecast
 from services.ai.forecast_mem import get_mem_history, get_mem_forecast
-from services.ai.forecast_pod_cpu import get_pod_cpu_history, get_pod_cpu_forecast
-
-from services.ai.forecast_core import compute_effective_step, get_max_points
+from services.ai.forecast_pod_cpu import get_pod_cpu_history, get_pod_cpu_forecast, get_pod_cpu_forecast_batch
+
+from services.ai.forecast_core import (
+    backtest_cache_stats,
+    compute_effective_step,
+    get_max_points,
+    model_store_stats,
+    series_cache_stats,
+)
+from services.ai.forecast_pool import forecast_pool_stats
+from services.ai.cache import ai_cache
 
 from db.tasks.repo import create_task, update_task_status, get_task as get_task_row
+from services.tasks.dedup import submit_task
 from db.alerts.repo import normalize_fingerprint, upsert_alert
 from services.notification.feishu_client import push_alert_async
 
@@ -47,6 +56,7 @@ from services.ai.schemas import (
     MemForecastResp,
     PodCpuHistoryResp,
     PodCpuForecastResp,
+    PodCpuBatchForecastResp,
     SuggestionsResp,
     AnomalyResp,
     AssistantChatReq,
@@ -78,6 +88,7 @@ class TaskStatusResp(BaseModel):
     error: Optional[TaskError] = None
     created_ts: Optional[int] = None
     deadline_ts: Optional[int] = None
+    dedup: Optional[str] = None  # created / attached（复用进行中的同参任务）/ cached（复用近期结果）
 
 
 def _ai_to_task_status(status: str) -> str:
@@ -298,6 +309,38 @@ def run_forecast_task(payload: Dict[str, Any]) -> Any:
     return _apply_step_meta(resp, hm, step)
 
 
+def run_forecast_batch_task(payload: Dict[str, Any]) -> Any:
+    namespace = str(payload.get("namespace") or "").strip()
+    deployment = str(payload.get("deployment") or "").strip() or None
+    pods = payload.get("pods") or []
+    if isinstance(pods, str):
+        pods = [p.strip() for p in pods.split(",") if p.strip()]
+    hm = _pick_history_minutes(payload.get("history_minutes"), payload.get("minutes"), default=240)
+    hz = _pick_horizon_minutes(payload.get("horizon_minutes"), payload.get("horizon"), default=120)
+    step = int(payload.get("step") or 60)
+    cache_ttl = payload.get("cache_ttl")
+    max_series = int(payload.get("max_series") or 500)
+
+    if not namespace:
+        raise ValueError("namespace is required for ai_forecast_batch")
+    if hm < 10:
+        raise ValueError("history_minutes must be >= 10 for target=pod_cpu")
+    if hz < 1:
+        raise ValueError("horizon_minutes must be >= 1 for target=pod_cpu")
+
+    resp = get_pod_cpu_forecast_batch(
+        namespace=namespace,
+        deployment=deployment,
+        pods=list(pods),
+        minutes=hm,
+        horizon=hz,
+        step=step,
+        cache_ttl=cache_ttl if cache_ttl is not None else 300,
+        max_series=max_series,
+    )
+    return _apply_step_meta(resp, hm, step)
+
+
 def run_suggestions_task(payload: Dict[str, Any]) -> Any:
     target = str(payload.get("target") or "")
     node = payload.get("node")
@@ -586,13 +629,16 @@ def run_execute_task(payload: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def _init_task_state(task_id: str, task_type: str = "ai", input_json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    now = int(time.time())
-    create_task(task_id=task_id, type=task_type, input_json=input_json or {})
+    # ✅ 同参数的异步请求去重：挂到进行中的任务上，或直接复用近期的成功结果
+    task, mode = submit_task(task_type, input_json or {}, task_id=task_id, attach_max_age_sec=int(TASK_TTL_SEC))
+    created_ts = int(task.get("created_at") or time.time())
     return {
-        "task_id": task_id,
-        "status": "PENDING",
-        "created_ts": now,
-        "deadline_ts": now + int(TASK_TTL_SEC),
+        "task_id": str(task.get("task_id") or task_id),
+        "status": _task_to_ai_status(str(task.get("status") or "")),
+        "result": task.get("result") if mode == "cached" else None,
+        "created_ts": created_ts,
+        "deadline_ts": created_ts + int(TASK_TTL_SEC),
+        "dedup": mode,
     }
 
 
@@ -608,6 +654,7 @@ def _update_task_state(task_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
             progress=progress if isinstance(progress, (int, float)) else None,
             result=result,
             error=(error.get("detail") if isinstance(error, dict) else error),
+            wait=True,  # ✅ 下面紧接着读回
         )
     row = get_task_row(task_id)
     if not row:
@@ -855,6 +902,43 @@ def pod_cpu_forecast(
         raise HTTPException(status_code=500, detail=f"pod_cpu_forecast failed: {e}")
 
 
+@router.get("/pod/cpu/forecast/batch", response_model=Union[PodCpuBatchForecastResp, TaskStatusResp])
+def pod_cpu_forecast_batch(
+    namespace: str = Query(...),
+    deployment: Optional[str] = Query(None, description="只预测该 Deployment 下的 Pod"),
+    pods: Optional[str] = Query(None, description="逗号分隔的 Pod 名（优先于 deployment）"),
+    history_minutes: Optional[int] = Query(None, ge=10, le=7 * 24 * 60),
+    horizon_minutes: Optional[int] = Query(None, ge=1, le=24 * 60),
+    step: int = Query(60, ge=1, le=3600),
+    cache_ttl: int = Query(300, ge=0, le=3600),
+    max_series: int = Query(500, ge=1, le=2000),
+    async_mode: bool = Query(False, description="run batch forecast asynchronously"),
+):
+    payload = {
+        "namespace": namespace,
+        "deployment": deployment,
+        "pods": pods,
+        "history_minutes": history_minutes,
+        "horizon_minutes": horizon_minutes,
+        "step": step,
+        "cache_ttl": cache_ttl,
+        "max_series": max_series,
+    }
+    if async_mode:
+        task_id = uuid.uuid4().hex
+        state = _init_task_state(task_id, task_type="ai_forecast_batch", input_json=payload)
+        return JSONResponse(content=state)
+
+    try:
+        return run_forecast_batch_task(payload)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid parameters: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"pod_cpu_forecast_batch failed: {e}")
+
+
 # ========================= Unified Forecast =========================
 @router.get("/forecast", response_model=Union[CpuForecastResp, MemForecastResp, PodCpuForecastResp, TaskStatusResp])
 def unified_forecast(
@@ -1315,3 +1399,19 @@ def ai_selfcheck():
         "confirm_text": str(confirm_text),
         "dev_mode_hint": "?dev=1 or localStorage devMode=true",
     }
+
+
+@router.get("/engine/stats")
+def ai_engine_stats():
+    """
+    预测引擎运行指标：
+    - 历史序列段缓存命中 / 拉取点数比；拟合进程池排队深度 / 耗时分位
+    - 回测缓存命中；模型存储与冷 / 热拟合耗时；ai_cache 命中 / 淘汰
+    """
+    return {
+        "series_cache": series_cache_stats(),
+        "forecast_pool": forecast_pool_stats(),
+        "backtest_cache": backtest_cache_stats(),
+        "model_store": model_store_stats(),
+        "ai_cache": ai_cache.stats(),
+    }
@@ -1,11 +1,17 @@
 # /routers/alerts.py
 from __future__ import annotations
 
+import re
 from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Request, HTTPException, Query, Depends
 
-from db.alerts.repo import normalize_fingerprint, upsert_alert, list_alerts as list_platform_alerts, get_alert
-from services.notification.feishu_client import push_alert_async
+from db.alerts.group_repo import list_alert_groups
+from db.alerts.label_repo import Matcher, label_facets, query_alerts
+from db.alerts.repo import list_alerts as list_platform_alerts, get_alert
+from db.utils.write_queue import write_queue_stats
+from services.alerts.grouping import alert_grouping_stats
+from services.alerts.ingest import ingest_stats, ingest_webhook
+from services.notification.feishu_dispatcher import notify_dispatcher_stats
 from routers.authz import require_user
 
 
@@ -26,39 +32,22 @@ async def webhook(request: Request):
     if not isinstance(alerts, list):
         raise HTTPException(status_code=400, detail="invalid alerts payload")
 
-    upserted = 0
-    for a in alerts:
-        if not isinstance(a, dict):
-            continue
-        labels = a.get("labels") or {}
-        annotations = a.get("annotations") or {}
-        status = str(a.get("status") or "")
-        starts_at = str(a.get("startsAt") or "")
-        ends_at = str(a.get("endsAt") or "")
-        fp = normalize_fingerprint(fingerprint=a.get("fingerprint"), labels=labels)
-        upsert_alert(
-            fingerprint=fp,
-            status=status or "firing",
-            labels=labels if isinstance(labels, dict) else {},
-            annotations=annotations if isinstance(annotations, dict) else {},
-            starts_at=starts_at,
-            ends_at=ends_at,
-            source="alertmanager",
-        )
-        push_alert_async(
-            {
-                "fingerprint": fp,
-                "status": status or "firing",
-                "labels": labels if isinstance(labels, dict) else {},
-                "annotations": annotations if isinstance(annotations, dict) else {},
-                "starts_at": starts_at,
-                "ends_at": ends_at,
-                "source": "alertmanager",
-            }
-        )
-        upserted += 1
+    # ✅ 整个 payload 一次批量 upsert（线程里执行，不阻塞事件循环）；落盘后再应答，失败让 Alertmanager 重发
+    try:
+        result = await ingest_webhook(alerts)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"alert ingest failed: {e}")
+    return {"ok": True, **result}
 
-    return {"ok": True, "upserted": upserted}
+
+@router.get("/ingest/stats", dependencies=[Depends(require_user)])
+def ingest_stats_endpoint():
+    return {
+        "ingest": ingest_stats(),
+        "grouping": alert_grouping_stats(),
+        "notify": notify_dispatcher_stats(),
+        "write_queue": write_queue_stats(),
+    }
 
 
 def _center_list_impl(
@@ -66,8 +55,13 @@ def _center_list_impl(
     source: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
+    grouped: bool = False,
+    group_key: Optional[str] = None,
 ):
-    return list_platform_alerts(status=status, source=source, limit=limit, offset=offset)
+    # ✅ grouped=true：一行一个组（带成员数），风暴时列表大小跟组数走而不是告警数；source 过滤不适用于组
+    if grouped:
+        return list_alert_groups(status=status, limit=limit, offset=offset)
+    return list_platform_alerts(status=status, source=source, group_key=group_key, limit=limit, offset=offset)
 
 
 @router.get("/center/list", dependencies=[Depends(require_user)])
@@ -77,8 +71,12 @@ def center_list(
     source: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    grouped: bool = Query(False, description="return alert groups with member counts"),
+    group_key: Optional[str] = Query(None, description="list members of one group"),
 ):
-    return _center_list_impl(status=status, source=source, limit=limit, offset=offset)
+    return _center_list_impl(
+        status=status, source=source, limit=limit, offset=offset, grouped=grouped, group_key=group_key
+    )
 
 
 @router.get("/list", dependencies=[Depends(require_user)])
@@ -110,6 +108,73 @@ def list_compat(
     return payload
 
 
+_MATCHER_RE = re.compile(r'^\s*([A-Za-z_][A-Za-z0-9_.\-/]*)\s*(=~|!~|!=|=)\s*(.*?)\s*$')
+
+
+def _parse_matchers(raw: Optional[List[str]]) -> List[Matcher]:
+    """match=namespace="prod" / severity!=info / alertname=~"Kube.*"（值可不加引号）"""
+    out: List[Matcher] = []
+    for item in raw or []:
+        m = _MATCHER_RE.match(str(item or ""))
+        if not m:
+            raise HTTPException(status_code=400, detail=f"invalid matcher: {item}")
+        k, op, v = m.group(1), m.group(2), m.group(3)
+        if len(v) >= 2 and v[0] == v[-1] and v[0] in ("'", '"'):
+            v = v[1:-1]
+        if op in ("=~", "!~"):
+            try:
+                re.compile(v)
+            except re.error as e:
+                raise HTTPException(status_code=400, detail=f"invalid regex in matcher {item}: {e}")
+        out.append((k, op, v))
+    return out
+
+
+@router.get("/center/query", dependencies=[Depends(require_user)])
+def center_query(
+    match: Optional[List[str]] = Query(None, description='label matchers, e.g. namespace="prod", severity!=info'),
+    status: Optional[str] = Query(None),
+    source: Optional[str] = Query(None),
+    group_key: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    # ✅ keyset 翻页（last_seen, id）：深翻页也不会像 OFFSET 一样越翻越慢
+    try:
+        return query_alerts(
+            matchers=_parse_matchers(match),
+            status=status,
+            source=source,
+            group_key=group_key,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/center/facets", dependencies=[Depends(require_user)])
+def center_facets(
+    keys: str = Query("namespace,severity,alertname", description="comma-separated label keys"),
+    match: Optional[List[str]] = Query(None),
+    status: Optional[str] = Query(None),
+    source: Optional[str] = Query(None),
+    group_key: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=50),
+):
+    key_list = [k.strip() for k in str(keys or "").split(",") if k.strip()][:20]
+    return {
+        "facets": label_facets(
+            keys=key_list,
+            matchers=_parse_matchers(match),
+            status=status,
+            source=source,
+            group_key=group_key,
+            limit=limit,
+        )
+    }
+
+
 @router.get("/center/{alert_id}", dependencies=[Depends(require_user)])
 @alias_router.get("/center/{alert_id}", dependencies=[Depends(require_user)])  # compat: legacy path
 def center_detail(alert_id: int):
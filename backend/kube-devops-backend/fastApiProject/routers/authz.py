@@ -1,7 +1,7 @@
 # routers/authz.py
 from __future__ import annotations
 
-from fastapi import Header, HTTPException
+from fastapi import Header, HTTPException, Query
 
 from routers.auth import get_current_username
 
@@ -18,3 +18,10 @@ def require_admin(authorization: str = Header(default="")) -> str:
     if username != "admin":
         raise HTTPException(status_code=403, detail="权限不足")
     return username
+
+
+def require_user_sse(authorization: str = Header(default=""), token: str = Query(default="")) -> str:
+    # 浏览器 EventSource 不能带自定义请求头：SSE 端点额外接受 ?token=
+    if not authorization and token:
+        authorization = f"Bearer {token}"
+    return require_user(authorization)
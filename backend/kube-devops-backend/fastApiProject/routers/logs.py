@@ -1,10 +1,20 @@
 # /routers/logs.py
+import itertools
+import json
+from typing import Any, Dict, Iterator, Optional
+
 from fastapi import APIRouter, Query, Depends
-from services.monitoring.loki_client import query_logs_range, query_logs_instant
+from fastapi.responses import StreamingResponse
+from services.monitoring.loki_client import range_bounds_ns, query_logs_range, query_logs_instant, stream_logs_range
 from routers.authz import require_user
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
+# /range 超过这个 limit 改为 NDJSON 流式返回（小请求保持原来的 JSON 结构）
+LOGS_RANGE_INLINE_MAX = 1000
+LOGS_STREAM_MAX_LINES = 1_000_000
+NDJSON_FLUSH_BYTES = 64 * 1024
+
 
 @router.get("/instant", dependencies=[Depends(require_user)])
 def logs_instant(
@@ -15,11 +25,78 @@ def logs_instant(
 ):
     return {"status": "success", "data": query_logs_instant(query, limit, time, direction)}
 
+
+def _ndjson(records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    # ✅ 攒到 64KB 再写一次，避免每行一个 chunk
+    buf = []
+    size = 0
+    for rec in records:
+        b = (json.dumps(rec, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        buf.append(b)
+        size += len(b)
+        if size >= NDJSON_FLUSH_BYTES:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+def _ndjson_response(records: Iterator[Dict[str, Any]]) -> StreamingResponse:
+    # ✅ 先同步取第一条：Loki 报错（400/502）还能作为正常的 HTTP 错误返回；之后的错误写成 {"type": "error"}
+    first = next(records)
+
+    def _guarded() -> Iterator[Dict[str, Any]]:
+        try:
+            yield from records
+        except Exception as e:
+            yield {"type": "error", "detail": getattr(e, "detail", None) or str(e)}
+
+    return StreamingResponse(
+        _ndjson(itertools.chain([first], _guarded())),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/range", dependencies=[Depends(require_user)])
 def logs_range(
     query: str = Query('{job=~".+"}'),
     minutes: int = Query(60),
     limit: int = Query(200),
-    direction: str = Query("backward")
+    direction: str = Query("backward"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    if limit > LOGS_RANGE_INLINE_MAX:
+        start_ns, end_ns = range_bounds_ns(minutes)
+        return _ndjson_response(
+            stream_logs_range(
+                query, start_ns=start_ns, end_ns=end_ns, direction=direction, max_lines=limit, cursor=cursor
+            )
+        )
+    return {"status": "success", "data": query_logs_range(query, minutes, limit, direction, cursor=cursor)}
+
+
+@router.get("/stream", dependencies=[Depends(require_user)])
+def logs_stream(
+    query: str = Query('{job=~".+"}'),
+    minutes: int = Query(60, ge=1),
+    start: Optional[int] = Query(None, description="start, unix ns (overrides minutes)"),
+    end: Optional[int] = Query(None, description="end, unix ns"),
+    direction: str = Query("backward"),
+    max_lines: int = Query(100000, ge=1, le=LOGS_STREAM_MAX_LINES),
+    cursor: Optional[str] = Query(None, description="next_cursor from the end record of a previous stream"),
 ):
-    return {"status": "success", "data": query_logs_range(query, minutes, limit, direction)}
+    """
+    NDJSON：每行一条 {"type": "log", id, ts, ts_ns, stream, line, labels}，
+    最后一行 {"type": "end", count, pages, truncated, next_cursor}
+    """
+    start_ns, end_ns = range_bounds_ns(minutes)
+    if end is not None:
+        end_ns = int(end)
+    if start is not None:
+        start_ns = int(start)
+    return _ndjson_response(
+        stream_logs_range(
+            query, start_ns=start_ns, end_ns=end_ns, direction=direction, max_lines=max_lines, cursor=cursor
+        )
+    )
@@ -6,7 +6,7 @@ from typing import Any, Dict, List, Tuple, Optional
 
 from fastapi import APIRouter, Query
 
-from services.monitoring.prometheus_client import prom_query, range_by_minutes, instant_value
+from services.monitoring.query_plan import PromQ, run_query_plan
 
 router = APIRouter(prefix="/api/monitor", tags=["Monitor"])
 
@@ -135,12 +135,6 @@ def monitor_overview(
     q_alert_firing = 'sum(ALERTS{alertstate="firing"})'
     q_alert_pending = 'sum(ALERTS{alertstate="pending"})'
 
-    prom_ok = instant_value(q_prom_up, 0.0) > 0
-    nodes_total = _to_int(instant_value(q_nodes_total, 0.0))
-    nodes_ready = _to_int(instant_value(q_nodes_ready, 0.0))
-    alert_firing = _to_int(instant_value(q_alert_firing, 0.0))
-    alert_pending = _to_int(instant_value(q_alert_pending, 0.0))
-
     # ========= 资源（集群级 %）=========
     q_cpu = '100 * (1 - avg(rate(node_cpu_seconds_total{mode="idle"}[5m])))'
     q_mem = '100 * (1 - (sum(node_memory_MemAvailable_bytes) / sum(node_memory_MemTotal_bytes)))'
@@ -153,15 +147,6 @@ def monitor_overview(
     )
     """
 
-    cpu_used = _to_float(instant_value(q_cpu, 0.0))
-    mem_used = _to_float(instant_value(q_mem, 0.0))
-    fs_used = _to_float(instant_value(q_fs, 0.0))
-
-    # ========= 趋势（%）=========
-    cpu_trend = _parse_matrix_series(range_by_minutes(q_cpu, minutes=minutes, step=max(15, minutes // 30)), 180)
-    mem_trend = _parse_matrix_series(range_by_minutes(q_mem, minutes=minutes, step=max(15, minutes // 30)), 180)
-    fs_trend = _parse_matrix_series(range_by_minutes(q_fs, minutes=minutes, step=max(30, minutes // 20)), 180)
-
     # ========= Pod TopN =========
     q_pod_top_cpu = """
     topk(10,
@@ -186,9 +171,44 @@ def monitor_overview(
     )
     """
 
-    pod_cpu = _parse_vector_top(prom_query(q_pod_top_cpu), value_text_fn=human_cpu_cores)
-    pod_mem = _parse_vector_top(prom_query(q_pod_top_mem), value_text_fn=lambda v: human_bytes(v, 1))
-    pod_net = _parse_vector_top(prom_query(q_pod_top_net), value_text_fn=lambda v: human_bytes_rate(v, 1))
+    # ✅ 全部查询并发执行：耗时 ≈ 最慢的一条；单条失败只影响对应字段
+    res = run_query_plan(
+        {
+            "promUp": PromQ(q_prom_up),
+            "nodesTotal": PromQ(q_nodes_total),
+            "nodesReady": PromQ(q_nodes_ready),
+            "alertFiring": PromQ(q_alert_firing),
+            "alertPending": PromQ(q_alert_pending),
+            "cpuUsed": PromQ(q_cpu),
+            "memUsed": PromQ(q_mem),
+            "fsUsed": PromQ(q_fs),
+            "cpuTrend": PromQ(q_cpu, kind="range", minutes=minutes, step=max(15, minutes // 30)),
+            "memTrend": PromQ(q_mem, kind="range", minutes=minutes, step=max(15, minutes // 30)),
+            "fsTrend": PromQ(q_fs, kind="range", minutes=minutes, step=max(30, minutes // 20)),
+            "podTopCpu": PromQ(q_pod_top_cpu, kind="query"),
+            "podTopMem": PromQ(q_pod_top_mem, kind="query"),
+            "podTopNet": PromQ(q_pod_top_net, kind="query"),
+        }
+    )
+
+    prom_ok = _to_float(res.get("promUp", 0.0)) > 0
+    nodes_total = _to_int(res.get("nodesTotal", 0.0))
+    nodes_ready = _to_int(res.get("nodesReady", 0.0))
+    alert_firing = _to_int(res.get("alertFiring", 0.0))
+    alert_pending = _to_int(res.get("alertPending", 0.0))
+
+    cpu_used = _to_float(res.get("cpuUsed", 0.0))
+    mem_used = _to_float(res.get("memUsed", 0.0))
+    fs_used = _to_float(res.get("fsUsed", 0.0))
+
+    # ========= 趋势（%）=========
+    cpu_trend = _parse_matrix_series(res.get("cpuTrend", {}), 180)
+    mem_trend = _parse_matrix_series(res.get("memTrend", {}), 180)
+    fs_trend = _parse_matrix_series(res.get("fsTrend", {}), 180)
+
+    pod_cpu = _parse_vector_top(res.get("podTopCpu", {}), value_text_fn=human_cpu_cores)
+    pod_mem = _parse_vector_top(res.get("podTopMem", {}), value_text_fn=lambda v: human_bytes(v, 1))
+    pod_net = _parse_vector_top(res.get("podTopNet", {}), value_text_fn=lambda v: human_bytes_rate(v, 1))
 
     return {
         "status": "success",
@@ -216,5 +236,7 @@ def monitor_overview(
                 "podMem": pod_mem,
                 "podNet": pod_net,
             },
+            # 部分查询失败/超时：partial=true，errors 按查询名标注原因
+            "query": res.meta(),
         },
     }
@@ -14,6 +14,9 @@ from services.ops.scheduler import get_status
 from services.ops.heal_view import list_heal_deployments, get_heal_deployment_detail
 from services.alerts.client import list_alerts
 from services.ops.runtime_config import get_heal_decay_config, set_heal_decay_config
+from db.utils.sqlite import pool_stats
+from db.utils.write_queue import write_queue_stats
+from services.k8s.informer import informer_stats
 
 router = APIRouter(prefix="/api/ops", tags=["Ops"])
 
@@ -138,3 +141,22 @@ def heal_deployment_detail(namespace: str, deployment_uid: str):
 @router.get("/alerts")
 def alerts():
     return {"items": list_alerts()}
+
+
+# -------------------- ✅ SQLite 连接池 / 单写线程队列 --------------------
+@router.get("/db/stats")
+def db_stats():
+    """
+    - pool：线程内连接复用情况（当前请求线程）
+    - write_queue：队列深度、批大小、提交耗时分位
+    """
+    return {"pool": pool_stats(), "write_queue": write_queue_stats()}
+
+
+# -------------------- ✅ K8s informer 快照 --------------------
+@router.get("/informers/stats")
+def informers_stats():
+    """
+    每种资源：是否启用/已同步、对象数、staleness、events/sec、relist 次数
+    """
+    return informer_stats()
@@ -9,6 +9,7 @@ from services.ops.runtime_config import (
     get_public_items,
     set_overrides,
     delete_override,
+    get_cache_stats,
 )
 
 router = APIRouter(prefix="/api/ops/config", tags=["OpsConfig"])
@@ -25,6 +26,14 @@ def get_config_items():
     return {"items": get_public_items()}
 
 
+@router.get("/cache-stats")
+def get_config_cache_stats():
+    """
+    runtime_config 进程内快照命中情况（hits/misses/reloads/probes）
+    """
+    return get_cache_stats()
+
+
 @router.put("")
 def put_config_items(payload: Dict[str, Any] = Body(...)):
     """
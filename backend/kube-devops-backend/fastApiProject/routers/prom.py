@@ -4,9 +4,10 @@ from __future__ import annotations
 from fastapi import APIRouter, Query, Depends
 from typing import Any, Dict
 
-from services.monitoring.prometheus_client import prom_query, prom_query_range, instant_value
+from services.monitoring.prometheus_client import prom_query, prom_query_range, prom_client_stats, prom_cache_stats
 from routers.authz import require_user
 from services.monitoring.promql_guard import validate_promql, validate_range
+from services.monitoring.query_plan import PromQ, run_query_plan
 
 router = APIRouter(prefix="/api/prom", tags=["Prometheus"])
 
@@ -28,6 +29,22 @@ def query_range(
     return prom_query_range(query=query, start=start, end=end, step=step)
 
 
+@router.get("/client/stats", dependencies=[Depends(require_user)])
+def client_stats() -> Dict[str, Any]:
+    """
+    Prometheus 客户端：连接复用率、重试/错误数、按接口的耗时直方图（累计 le 桶，ms）
+    """
+    return prom_client_stats()
+
+
+@router.get("/cache/stats", dependencies=[Depends(require_user)])
+def cache_stats() -> Dict[str, Any]:
+    """
+    查询结果缓存：按接口的命中率（含 single-flight 合并）、上游 QPS 与节省的 QPS
+    """
+    return prom_cache_stats()
+
+
 @router.get("/overview", dependencies=[Depends(require_user)])
 def overview(range: str = Query("15m")) -> Dict[str, Any]:
     """
@@ -94,21 +111,38 @@ def overview(range: str = Query("15m")) -> Dict[str, Any]:
         except Exception:
             return 0
 
-    prom_ok = instant_value(q_prom_up, 0.0) > 0
+    # ✅ 并发执行：耗时 ≈ 最慢的一条；单条失败只影响对应字段
+    res = run_query_plan(
+        {
+            "promUp": PromQ(q_prom_up),
+            "nodesTotal": PromQ(q_nodes_total),
+            "nodesReady": PromQ(q_nodes_ready),
+            "alertFiring": PromQ(q_alert_firing),
+            "alertPending": PromQ(q_alert_pending),
+            "cpuUsed": PromQ(q_cpu),
+            "memUsed": PromQ(q_mem),
+            "fsUsed": PromQ(q_fs),
+            "podTopCpu": PromQ(q_pod_top_cpu, kind="query"),
+            "podTopMem": PromQ(q_pod_top_mem, kind="query"),
+            "podTopNet": PromQ(q_pod_top_net, kind="query"),
+        }
+    )
+
+    prom_ok = res.get("promUp", 0.0) > 0
 
-    nodes_total = to_int(instant_value(q_nodes_total, 0.0))
-    nodes_ready = to_int(instant_value(q_nodes_ready, 0.0))
-    alert_firing = to_int(instant_value(q_alert_firing, 0.0))
-    alert_pending = to_int(instant_value(q_alert_pending, 0.0))
+    nodes_total = to_int(res.get("nodesTotal", 0.0))
+    nodes_ready = to_int(res.get("nodesReady", 0.0))
+    alert_firing = to_int(res.get("alertFiring", 0.0))
+    alert_pending = to_int(res.get("alertPending", 0.0))
 
-    cpu_used = instant_value(q_cpu, 0.0)
-    mem_used = instant_value(q_mem, 0.0)
-    fs_used = instant_value(q_fs, 0.0)
+    cpu_used = res.get("cpuUsed", 0.0)
+    mem_used = res.get("memUsed", 0.0)
+    fs_used = res.get("fsUsed", 0.0)
 
     # ========= Pod TopN =========
-    pod_top_cpu = prom_query(q_pod_top_cpu)
-    pod_top_mem = prom_query(q_pod_top_mem)
-    pod_top_net = prom_query(q_pod_top_net)
+    pod_top_cpu = res.get("podTopCpu")
+    pod_top_mem = res.get("podTopMem")
+    pod_top_net = res.get("podTopNet")
 
     return {
         "status": "success",
@@ -131,5 +165,6 @@ def overview(range: str = Query("15m")) -> Dict[str, Any]:
                 "net": pod_top_net,
             },
             "range": {"minutes": minutes},
+            "query": res.meta(),
         },
     }
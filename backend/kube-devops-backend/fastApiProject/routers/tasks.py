@@ -1,11 +1,13 @@
 from __future__ import annotations
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException, Query, Depends, Body
+from fastapi import APIRouter, HTTPException, Query, Depends, Body, Header, Request
+from fastapi.responses import StreamingResponse
 import uuid
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from db.tasks.repo import list_tasks, get_task, create_task, delete_tasks_by_ids, delete_all_tasks
-from routers.authz import require_user
+from routers.authz import require_user, require_user_sse
+from services.tasks.events import TASK_EVENTS_MAX_IDS, parse_last_event_id, task_event_stream
 
 router = APIRouter(prefix="/api/tasks", tags=["Tasks"])
 
@@ -49,11 +51,53 @@ def task_submit(req: Dict[str, Any] = Body(...)):
         payload = {}
     if not isinstance(payload, dict):
         raise HTTPException(status_code=400, detail="payload must be object")
+    try:
+        priority = int(req.get("priority") or 0)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="priority must be int")
     task_id = uuid.uuid4().hex
-    create_task(task_id=task_id, type=task_type, input_json=payload)
+    create_task(task_id=task_id, type=task_type, input_json=payload, priority=priority)
     return {"ok": True, "task_id": task_id, "status": "PENDING"}
 
 
+def _event_response(request: Request, task_ids: List[str], last_event_id: Optional[str]) -> StreamingResponse:
+    return StreamingResponse(
+        task_event_stream(
+            task_ids,
+            last_event_id=parse_last_event_id(last_event_id),
+            is_disconnected=request.is_disconnected,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ✅ SSE：任务状态变化推送（替代轮询 /get、/{task_id}）；须定义在 /{task_id} 之前
+@router.get("/events", dependencies=[Depends(require_user_sse)])
+async def tasks_events(
+    request: Request,
+    ids: str = Query(..., description="逗号分隔的 task_id"),
+    last_event_id_q: str | None = Query(None, alias="last_event_id"),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+):
+    task_ids = list(dict.fromkeys(t.strip() for t in ids.split(",") if t.strip()))
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="ids required")
+    if len(task_ids) > TASK_EVENTS_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"too many ids (max {TASK_EVENTS_MAX_IDS})")
+    return _event_response(request, task_ids, last_event_id or last_event_id_q)
+
+
+@router.get("/{task_id}/events", dependencies=[Depends(require_user_sse)])
+async def task_events(
+    task_id: str,
+    request: Request,
+    last_event_id_q: str | None = Query(None, alias="last_event_id"),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+):
+    return _event_response(request, [task_id], last_event_id or last_event_id_q)
+
+
 @router.get("/{task_id}", dependencies=[Depends(require_user)])
 def task_detail(task_id: str):
     if not task_id:
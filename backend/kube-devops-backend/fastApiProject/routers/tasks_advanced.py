@@ -7,8 +7,12 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 import json
 from db.tasks.repo import (
-    get_task, list_tasks, update_task_status, delete_tasks_by_ids, delete_all_tasks
+    get_task, list_tasks, delete_tasks_by_ids, delete_all_tasks,
+    set_task_control, task_scheduler_stats
 )
+from services.tasks.dedup import dedup_stats
+from services.tasks.events import task_events_stats
+from services.tasks.worker import task_worker_stats
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
@@ -44,11 +48,12 @@ async def cancel_task_endpoint(
             detail=f"Cannot cancel task in {status_val} status"
         )
 
-    # 更新任务状态
-    update_task_status(
+    # 更新任务状态（is_cancelled=1：认领时跳过，运行中的完成结果也不会覆盖）
+    set_task_control(
         task_id=task_id,
         status="CANCELLED",
-        error="Task cancelled by user"
+        is_cancelled=True,
+        error="Task cancelled by user",
     )
 
     return {
@@ -68,8 +73,8 @@ async def pause_task_endpoint(
     """
     暂停指定任务。
 
-    - 仅 RUNNING 状态的任务可被暂停
-    - 暂停后状态为 PAUSED
+    - PENDING 或 RUNNING 状态的任务可被暂停
+    - 暂停后状态为 PAUSED，is_paused=1（排队中的任务不会再被认领）
     """
     task = get_task(task_id)
     if not task:
@@ -82,13 +87,13 @@ async def pause_task_endpoint(
             detail="Task already paused"
         )
 
-    if status_val != "RUNNING":
+    if status_val not in ("PENDING", "RUNNING"):
         raise HTTPException(
             status_code=400,
             detail=f"Cannot pause task in {status_val} status"
         )
 
-    update_task_status(task_id=task_id, status="PAUSED")
+    set_task_control(task_id=task_id, status="PAUSED", is_paused=True)
 
     return {
         "code": 0,
@@ -122,7 +127,7 @@ async def resume_task_endpoint(
         )
 
     # 恢复任务（重新进入队列）
-    update_task_status(task_id=task_id, status="PENDING")
+    set_task_control(task_id=task_id, status="PENDING", is_paused=False)
 
     return {
         "code": 0,
@@ -208,6 +213,7 @@ async def get_task_stats_endpoint(
     - 总任务数、成功数、失败数等
     - 按类型分类统计
     - 按日期分类统计
+    - worker 池状态（忙碌数、按类型并发、认领次数）、调度器状态（各类型公平份额进度）、去重复用统计、SSE 订阅数
     """
     from db.utils.sqlite import get_conn, q
 
@@ -306,7 +312,11 @@ async def get_task_stats_endpoint(
             "success_rate": round(success_rate, 4),
             "avg_duration": int(row_dict.get("avg_duration", 0) or 0),
             "by_type": by_type,
-            "by_day": by_day
+            "by_day": by_day,
+            "worker": task_worker_stats(),
+            "scheduler": task_scheduler_stats(),
+            "dedup": dedup_stats(),
+            "events": task_events_stats(),
         }
     }
 
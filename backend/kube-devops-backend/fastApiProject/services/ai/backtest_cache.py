@@ -0,0 +1,125 @@
+# services/ai/backtest_cache.py
+"""
+预测回测（holdout 选模型 + MAE/RMSE/MAPE）结果缓存
+
+- 回测要把每个候选模型在前 80% 上再拟合一遍，成本 >= 正式拟合；指标几分钟内变化不大
+- key = (series_key, config_hash)；AI_BACKTEST_INTERVAL_SEC 内只算一次，其余预测直接复用
+- 内存 dict 为主，SQLite ai_backtest_metrics 兜底（重启 / 多 worker 进程共享）
+- 复用时在 note / meta 上标注 backtest=cached 与 age_sec（陈旧度）
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+AI_BACKTEST_INTERVAL_SEC = 900
+BACKTEST_MEM_MAX_ENTRIES = 4096
+
+
+def backtest_interval_sec() -> int:
+    try:
+        from config import settings  # type: ignore
+
+        return max(0, int(getattr(settings, "AI_BACKTEST_INTERVAL_SEC", AI_BACKTEST_INTERVAL_SEC)))
+    except Exception:
+        return AI_BACKTEST_INTERVAL_SEC
+
+
+class BacktestCache:
+    def __init__(self, max_entries: int = BACKTEST_MEM_MAX_ENTRIES) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._data: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._stats: Dict[str, int] = {"hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "db_errors": 0}
+
+    def get(self, series_key: str, config_hash: str) -> Optional[Dict[str, Any]]:
+        interval = backtest_interval_sec()
+        if interval <= 0:
+            return None
+        key = (series_key, config_hash)
+        now = int(time.time())
+        with self._lock:
+            rec = self._data.get(key)
+            if rec is not None and now - int(rec["computed_at"]) < interval:
+                self._stats["hits"] += 1
+                return dict(rec)
+
+        try:
+            from db.ai.repo import get_backtest
+
+            rec = get_backtest(series_key=series_key, config_hash=config_hash)
+        except Exception:
+            rec = None
+            with self._lock:
+                self._stats["db_errors"] += 1
+        with self._lock:
+            if rec is not None and now - int(rec.get("computed_at") or 0) < interval:
+                self._stats["db_hits"] += 1
+                self._put_locked(key, rec)
+                return dict(rec)
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, series_key: str, config_hash: str, record: Dict[str, Any]) -> None:
+        if backtest_interval_sec() <= 0:
+            return
+        rec = dict(record)
+        rec.setdefault("computed_at", int(time.time()))
+        with self._lock:
+            self._put_locked((series_key, config_hash), rec)
+            self._stats["stores"] += 1
+        try:
+            from db.ai.repo import upsert_backtest
+
+            upsert_backtest(series_key=series_key, config_hash=config_hash, record=rec)
+        except Exception:
+            with self._lock:
+                self._stats["db_errors"] += 1
+
+    def _put_locked(self, key: Tuple[str, str], rec: Dict[str, Any]) -> None:
+        self._data[key] = dict(rec)
+        if len(self._data) > self.max_entries:
+            # 丢最旧的一批（按 computed_at）
+            drop = sorted(self._data.items(), key=lambda kv: int(kv[1].get("computed_at") or 0))
+            for k, _v in drop[: len(self._data) - self.max_entries]:
+                self._data.pop(k, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["entries"] = len(self._data)
+        out["interval_sec"] = backtest_interval_sec()
+        lookups = out["hits"] + out["db_hits"] + out["misses"]
+        out["hit_ratio"] = round((out["hits"] + out["db_hits"]) / lookups, 4) if lookups else 0.0
+        return out
+
+
+backtest_cache = BacktestCache()
+
+
+def backtest_meta(note: str) -> Dict[str, Any]:
+    """
+    响应 meta.backtest（从 ErrorMetrics.note 解析）：
+    source=fresh 本次刚回测；cached 复用缓存（age_sec = 距上次回测秒数）；none 没有回测（baseline）
+    """
+    parts = dict(p.split("=", 1) for p in str(note or "").split("|") if "=" in p)
+    source = parts.get("backtest") or "none"
+    age: Optional[int] = None
+    if source == "cached":
+        try:
+            age = int(parts.get("backtest_age_sec") or 0)
+        except ValueError:
+            age = None
+    elif source == "fresh":
+        age = 0
+    return {
+        "source": source,
+        "reused": source == "cached",
+        "age_sec": age,
+        "interval_sec": backtest_interval_sec(),
+    }
@@ -1,34 +1,244 @@
 # services/ai/cache.py
+"""
+AI 进程内缓存（预测结果 / 建议快照 / 任务状态）
+
+- 线程安全；条数 + 近似字节数双上限，超出按 LRU 淘汰
+- 命名空间 = key 第一个 "|" 之前的前缀（cpu_forecast / ai_task / suggestion_snapshot ...）
+  AI_CACHE_PREFIX_QUOTAS 可给单个前缀限条数，超额只淘汰该前缀自己的最久未用条目
+- 过期：get 时惰性删除 + 后台线程每 AI_CACHE_SWEEP_SEC 扫一遍
+- 字节数是估算值（递归 sys.getsizeof，长列表抽样），只用于限额，不精确
+"""
 from __future__ import annotations
+
+import sys
+import threading
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
+AI_CACHE_MAX_ENTRIES = 5000
+AI_CACHE_MAX_MB = 128
+AI_CACHE_SWEEP_SEC = 30
+_SIZE_SAMPLE = 64
+_SIZE_MAX_DEPTH = 6
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _parse_quotas(raw: str) -> Dict[str, int]:
+    # "ai_task=2000,suggestion_snapshot=500"
+    out: Dict[str, int] = {}
+    for part in str(raw or "").split(","):
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            out[k.strip()] = max(0, int(v))
+        except ValueError:
+            continue
+    return out
+
+
+def approx_size(obj: Any, depth: int = 0) -> int:
+    size = sys.getsizeof(obj, 64)
+    if depth >= _SIZE_MAX_DEPTH:
+        return size
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        sample = items[:_SIZE_SAMPLE]
+        part = sum(approx_size(k, depth + 1) + approx_size(v, depth + 1) for k, v in sample)
+        return size + (part * len(items) // len(sample) if sample else 0)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        seq = list(obj)
+        sample = seq[:_SIZE_SAMPLE]
+        part = sum(approx_size(v, depth + 1) for v in sample)
+        return size + (part * len(seq) // len(sample) if sample else 0)
+    # pydantic 模型 / 普通对象：按实例属性估算
+    d = getattr(obj, "__dict__", None)
+    if isinstance(d, dict):
+        return size + approx_size(d, depth + 1)
+    return size
+
+
+def _prefix(key: str) -> str:
+    return str(key).split("|", 1)[0]
+
 
 @dataclass
 class CacheItem:
     expire_at: float
     value: Any
+    nbytes: int = 0
+    prefix: str = ""
 
 
 class TTLCache:
-    def __init__(self):
-        self._data: Dict[str, CacheItem] = {}
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        quotas: Optional[Dict[str, int]] = None,
+        sweep_interval: Optional[float] = None,
+    ):
+        self.max_entries = int(max_entries or _setting("AI_CACHE_MAX_ENTRIES", AI_CACHE_MAX_ENTRIES))
+        self.max_bytes = int(max_bytes or float(_setting("AI_CACHE_MAX_MB", AI_CACHE_MAX_MB)) * 1024 * 1024)
+        self.quotas = dict(quotas if quotas is not None else _parse_quotas(_setting("AI_CACHE_PREFIX_QUOTAS", "")))
+        self.sweep_interval = float(sweep_interval or _setting("AI_CACHE_SWEEP_SEC", AI_CACHE_SWEEP_SEC))
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, CacheItem]" = OrderedDict()
+        # 前缀 -> 该前缀下的 key（LRU 顺序与 _data 同步）
+        self._by_prefix: Dict[str, "OrderedDict[str, None]"] = {}
+        self._bytes = 0
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "expired": 0,
+            "evicted_entries": 0,
+            "evicted_bytes": 0,
+            "evicted_quota": 0,
+            "rejected_too_large": 0,
+        }
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
 
-    def get(self, key: str) -> Optional[Any]:
-        item = self._data.get(key)
-        if not item:
-            return None
-        if time.time() > item.expire_at:
-            self._data.pop(key, None)
+    # ---------- 内部 ----------
+    def _remove_locked(self, key: str) -> Optional[CacheItem]:
+        item = self._data.pop(key, None)
+        if item is None:
             return None
-        return item.value
+        self._bytes -= item.nbytes
+        keys = self._by_prefix.get(item.prefix)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                self._by_prefix.pop(item.prefix, None)
+        return item
+
+    def _touch_locked(self, key: str, item: CacheItem) -> None:
+        self._data.move_to_end(key)
+        keys = self._by_prefix.get(item.prefix)
+        if keys is not None and key in keys:
+            keys.move_to_end(key)
+
+    def _enforce_locked(self, prefix: str) -> None:
+        quota = self.quotas.get(prefix)
+        if quota is not None:
+            keys = self._by_prefix.get(prefix)
+            while keys and len(keys) > quota:
+                self._remove_locked(next(iter(keys)))
+                self._stats["evicted_quota"] += 1
+        while self._data and len(self._data) > self.max_entries:
+            self._remove_locked(next(iter(self._data)))
+            self._stats["evicted_entries"] += 1
+        while self._data and self._bytes > self.max_bytes:
+            self._remove_locked(next(iter(self._data)))
+            self._stats["evicted_bytes"] += 1
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="ai-cache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"ai_cache sweep failed: {e}")
+
+    # ---------- 对外 ----------
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                self._stats["misses"] += 1
+                return None
+            if now > item.expire_at:
+                self._remove_locked(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._touch_locked(key, item)
+            self._stats["hits"] += 1
+            return item.value
 
     def set(self, key: str, value: Any, ttl: int):
-        self._data[key] = CacheItem(expire_at=time.time() + ttl, value=value)
+        if ttl is None or ttl <= 0:
+            self.delete(key)
+            return
+        # 估算在锁外做（大对象递归较慢）
+        nbytes = approx_size(value)
+        prefix = _prefix(key)
+        with self._lock:
+            self._remove_locked(key)
+            if nbytes > self.max_bytes:
+                self._stats["rejected_too_large"] += 1
+                return
+            self._data[key] = CacheItem(expire_at=time.time() + ttl, value=value, nbytes=nbytes, prefix=prefix)
+            self._by_prefix.setdefault(prefix, OrderedDict())[key] = None
+            self._bytes += nbytes
+            self._stats["sets"] += 1
+            self._enforce_locked(prefix)
+            self._ensure_sweeper()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove_locked(key)
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            dead = [k for k, item in self._data.items() if now > item.expire_at]
+            for k in dead:
+                self._remove_locked(k)
+            self._stats["expired"] += len(dead)
+        return len(dead)
 
     def clear(self):
-        self._data.clear()
+        with self._lock:
+            self._data.clear()
+            self._by_prefix.clear()
+            self._bytes = 0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            prefixes = {
+                p: {
+                    "entries": len(keys),
+                    "bytes": sum(self._data[k].nbytes for k in keys),
+                    "quota": self.quotas.get(p),
+                }
+                for p, keys in self._by_prefix.items()
+            }
+            out.update({"entries": len(self._data), "bytes": self._bytes})
+        out.update(
+            {
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "sweep_interval_sec": self.sweep_interval,
+                "prefixes": prefixes,
+            }
+        )
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
 
 
 ai_cache = TTLCache()
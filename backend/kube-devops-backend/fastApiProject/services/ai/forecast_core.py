@@ -1,7 +1,7 @@
 # services/ai/forecast_core.py
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import datetime, timezone, timedelta
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
@@ -10,9 +10,14 @@ import json
 import math
 import time
 
+import numpy as np
 import pandas as pd
 
+from services.ai.backtest_cache import backtest_cache
+from services.ai.forecasters import Forecaster, list_forecasters, register_forecaster
 from services.ai.metrics import mae, rmse, mape
+from services.ai.model_store import model_store, model_store_enabled, record_fit
+from services.ai.series_cache import SeriesSegmentCache
 from services.ai.schemas import BandPoint, ErrorMetrics
 from services.monitoring.prometheus_client import instant_vector, prom_query_range
 
@@ -25,6 +30,7 @@ class ForecastConfig:
     warmup_seconds: int = 0
     prophet_growth: str = "flat"
     prophet_changepoint_prior_scale: float = 0.01
+    season_period_sec: int = 0  # Holt-Winters 季节周期；0=AI_FORECAST_SEASON_PERIOD_SEC
 
 
 DEFAULT_MAX_POINTS = 20000
@@ -128,7 +134,17 @@ def build_history_series(
     effective_step = compute_effective_step(minutes, step)
     end = now_fn()
     start = end - timedelta(minutes=minutes)
-    return query_range_tuples(promql, start.timestamp(), end.timestamp(), effective_step)
+    if not _series_cache_enabled():
+        return query_range_tuples(promql, start.timestamp(), end.timestamp(), effective_step)
+    # ✅ 增量：只拉缓存没覆盖的头/尾（含不稳定的尾部边缘）
+    return _series_cache.get_range(
+        _prom_base_key(),
+        promql,
+        start.timestamp(),
+        end.timestamp(),
+        effective_step,
+        lambda q, s, e, st: query_range_tuples(q, s, e, st),
+    )
 
 
 def build_forecast_series(
@@ -140,17 +156,57 @@ def build_forecast_series(
     *,
     clip_fn: Optional[Callable[[List[BandPoint]], List[BandPoint]]] = None,
     now_fn: Callable[[], datetime] = now_utc,
+    target: str = "",
 ) -> Tuple[List[Tuple[int, float]], List[BandPoint], ErrorMetrics]:
     effective_step = compute_effective_step(minutes, step)
     history = build_history_series(promql, minutes, effective_step, now_fn=now_fn)
-    forecast, metrics = fit_predict_prophet(
-        history, horizon_minutes=horizon, step=effective_step, config=config
+    forecast, metrics = fit_predict(
+        history,
+        horizon_minutes=horizon,
+        step=effective_step,
+        config=config,
+        series_key=series_key_for(promql),
+        target=target,
     )
     if clip_fn:
         forecast = clip_fn(forecast)
     return history, forecast, metrics
 
 
+_series_cache = SeriesSegmentCache()
+
+
+def _series_cache_enabled() -> bool:
+    try:
+        from config import settings  # type: ignore
+
+        return bool(getattr(settings, "AI_SERIES_CACHE_ENABLED", True))
+    except Exception:
+        return True
+
+
+def _prom_base_key() -> str:
+    # 切换 Prometheus 后不复用旧数据源的段
+    try:
+        from services.ops.runtime_config import get_value  # type: ignore
+
+        v, _src = get_value("PROMETHEUS_BASE")
+        return str(v or "")
+    except Exception:
+        return ""
+
+
+def series_key_for(promql: str) -> str:
+    """回测缓存用的序列 key：数据源 + PromQL"""
+    return stable_hash(f"{_prom_base_key()}|{promql}")
+
+
+def series_cache_stats() -> Dict[str, Any]:
+    out = _series_cache.stats()
+    out["enabled"] = _series_cache_enabled()
+    return out
+
+
 def query_range_tuples(promql: str, start_ts: int, end_ts: int, step: int) -> List[Tuple[int, float]]:
     data = prom_query_range(query=promql, start=float(start_ts), end=float(end_ts), step=step)
     result = (((data or {}).get("data") or {}).get("result") or [])
@@ -271,12 +327,237 @@ def _baseline_forecast(
     return forecast, ErrorMetrics(note=note)
 
 
-def fit_predict_prophet(
+def _new_prophet(cfg: ForecastConfig) -> Any:
+    from prophet import Prophet  # type: ignore
+
+    return Prophet(
+        growth=cfg.prophet_growth,
+        daily_seasonality=False,
+        weekly_seasonality=False,
+        yearly_seasonality=False,
+        changepoint_prior_scale=float(cfg.prophet_changepoint_prior_scale),
+    )
+
+
+def _stan_init(model: Any) -> Dict[str, Any]:
+    # 上次拟合的参数作为 Stan 优化初值（Prophet 文档里的 warm start 写法）
+    res: Dict[str, Any] = {}
+    for pname in ("k", "m", "sigma_obs"):
+        res[pname] = model.params[pname][0][0]
+    for pname in ("delta", "beta"):
+        res[pname] = model.params[pname][0]
+    return res
+
+
+def _prophet_fit(
+    ts: np.ndarray,
+    y: np.ndarray,
+    future_ts: np.ndarray,
+    step: int,
+    season: int,
+    cfg: Any = None,
+    state: Optional[Dict[str, Any]] = None,
+) -> Optional[Tuple[Tuple[np.ndarray, np.ndarray, np.ndarray], Dict[str, Any]]]:
+    """
+    Prophet 需要整段窗口重拟合；热启动只是用上次的参数做初值，迭代次数少很多
+    changepoint 个数变了（delta 维度不同）等导致初值不可用时回退冷启动
+    """
+    cfg = cfg or ForecastConfig()
+    df = pd.DataFrame({"ds": pd.to_datetime(ts, unit="s", utc=True).tz_localize(None), "y": y.astype(float)})
+
+    init = None
+    if state and state.get("model") == "prophet" and state.get("json"):
+        try:
+            from prophet.serialize import model_from_json  # type: ignore
+
+            init = _stan_init(model_from_json(state["json"]))
+        except Exception:
+            init = None
+
+    model = _new_prophet(cfg)
+    if init is not None:
+        try:
+            model.fit(df, init=init)
+        except Exception:
+            init = None
+            model = _new_prophet(cfg)
+            model.fit(df)
+    else:
+        model.fit(df)
+
+    future = pd.DataFrame({"ds": pd.to_datetime(future_ts, unit="s", utc=True).tz_localize(None)})
+    pred = model.predict(future)
+    if pred.empty:
+        return None
+    band = (
+        pred["yhat"].to_numpy(dtype=float),
+        pred["yhat_lower"].to_numpy(dtype=float),
+        pred["yhat_upper"].to_numpy(dtype=float),
+    )
+    new_state: Dict[str, Any] = {"model": "prophet", "last_ts": int(ts[-1]) if ts.size else 0}
+    new_state["warm_runs"] = int((state or {}).get("warm_runs") or 0) + 1 if init is not None else 0
+    try:
+        from prophet.serialize import model_to_json  # type: ignore
+
+        new_state["json"] = model_to_json(model)
+    except Exception:
+        pass
+    return band, new_state
+
+
+def _prophet_band(
+    ts: np.ndarray, y: np.ndarray, future_ts: np.ndarray, step: int, season: int, cfg: Any = None
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    out = _prophet_fit(ts, y, future_ts, step, season, cfg)
+    return out[0] if out else None
+
+
+register_forecaster("prophet", 100, _prophet_band, _prophet_fit)
+
+DEFAULT_FORECAST_MODELS = "ewma,holt,holt_winters,prophet"
+DEFAULT_MAPE_TOLERANCE = 0.1
+DEFAULT_SEASON_PERIOD_SEC = 3600
+
+
+def _model_names() -> List[str]:
+    try:
+        from config import settings  # type: ignore
+
+        raw = str(getattr(settings, "AI_FORECAST_MODELS", DEFAULT_FORECAST_MODELS) or DEFAULT_FORECAST_MODELS)
+    except Exception:
+        raw = DEFAULT_FORECAST_MODELS
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+def _mape_tolerance() -> float:
+    try:
+        from config import settings  # type: ignore
+
+        return max(0.0, float(getattr(settings, "AI_FORECAST_MAPE_TOLERANCE", DEFAULT_MAPE_TOLERANCE)))
+    except Exception:
+        return DEFAULT_MAPE_TOLERANCE
+
+
+def _season_points(cfg: ForecastConfig, step: int) -> int:
+    sec = int(cfg.season_period_sec or 0)
+    if sec <= 0:
+        try:
+            from config import settings  # type: ignore
+
+            sec = int(getattr(settings, "AI_FORECAST_SEASON_PERIOD_SEC", DEFAULT_SEASON_PERIOD_SEC) or 0)
+        except Exception:
+            sec = DEFAULT_SEASON_PERIOD_SEC
+    return int(sec // max(1, step)) if sec > 0 else 0
+
+
+def _run_model(
+    fc: Forecaster,
+    ts: np.ndarray,
+    y: np.ndarray,
+    future_ts: np.ndarray,
+    step: int,
+    season: int,
+    cfg: ForecastConfig,
+    *,
+    stateful: bool = False,
+    state: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]], int, Optional[str], Optional[Dict[str, Any]]]:
+    """
+    stateful=True：走 fit_state（可热启动，并导出新参数）
+    returns: (band | None, fit_ms, error, 新参数 | None)
+    """
+    t0 = time.perf_counter()
+    new_state: Optional[Dict[str, Any]] = None
+    try:
+        if stateful and fc.fit_state is not None:
+            out = fc.fit_state(ts, y, future_ts, step, season, cfg, state)
+            band, new_state = out if out else (None, None)
+        else:
+            band = fc.fn(ts, y, future_ts, step, season, cfg)
+        err = None
+        if band is not None and not np.all(np.isfinite(band[0])):
+            band, new_state, err = None, None, "non_finite"
+    except Exception as exc:
+        band, new_state, err = None, None, str(exc) or exc.__class__.__name__
+    return band, int((time.perf_counter() - t0) * 1000), err, new_state
+
+
+def _select_model(
+    candidates: List[Forecaster],
+    train: List[Tuple[int, float]],
+    valid: List[Tuple[int, float]],
+    step: int,
+    season: int,
+    cfg: ForecastConfig,
+) -> Tuple[Optional[Forecaster], Dict[str, float], Dict[str, Any], List[str]]:
+    """
+    20% holdout：每个候选在 train 上拟合、预测 valid，算 MAPE
+    在 best_mape * (1 + tolerance) 以内选 cost 最低的
+    returns: (chosen, chosen 的 holdout 指标, 各候选 mape, 被跳过的候选说明)
+    """
+    tr = np.asarray(train, dtype=np.float64)
+    va = np.asarray(valid, dtype=np.float64)
+    y_true = va[:, 1].tolist()
+    scores: Dict[str, Any] = {}
+    preds: Dict[str, List[float]] = {}
+    skipped: List[str] = []
+    for fc in candidates:
+        band, _ms, err, _st = _run_model(fc, tr[:, 0], tr[:, 1], va[:, 0], step, season, cfg)
+        if band is None:
+            skipped.append(f"{fc.name}:{err or 'n/a'}")
+            continue
+        preds[fc.name] = [max(0.0, float(v)) for v in band[0].tolist()]
+        scores[fc.name] = float(mape(y_true, preds[fc.name]))
+
+    if not scores:
+        return None, {}, scores, skipped
+
+    best = min(scores.values())
+    limit = best * (1.0 + _mape_tolerance()) + 1e-9
+    chosen = next(fc for fc in candidates if fc.name in scores and scores[fc.name] <= limit)
+    y_pred = preds[chosen.name]
+    baseline_last = train[-1][1] if train else 0.0
+    baseline_pred = [max(0.0, float(baseline_last)) for _ in y_true]
+    metrics = {
+        "mae": float(mae(y_true, y_pred)),
+        "rmse": float(rmse(y_true, y_pred)),
+        "mape": float(scores[chosen.name]),
+        "baseline_mape": float(mape(y_true, baseline_pred)),
+    }
+    return chosen, metrics, scores, skipped
+
+
+def backtest_config_hash(cfg: ForecastConfig, step: int, models: Optional[List[str]] = None) -> str:
+    """
+    回测结果与这些参数绑定：任一变化（换模型集合 / 容忍度 / 季节周期 / step）都要重新回测
+    """
+    payload = {
+        "cfg": asdict(cfg),
+        "models": list(models or _model_names()),
+        "tolerance": _mape_tolerance(),
+        "season": _season_points(cfg, step),
+        "step": int(step),
+    }
+    return stable_hash(json.dumps(payload, sort_keys=True, default=str))
+
+
+def fit_predict_detailed(
     history: List[Tuple[int, float]],
     horizon_minutes: int,
     step: int,
     config: Optional[ForecastConfig] = None,
-) -> Tuple[List[BandPoint], ErrorMetrics]:
+    *,
+    models: Optional[List[str]] = None,
+    backtest: Optional[Dict[str, Any]] = None,
+    model_key: Optional[Tuple[str, str, str]] = None,
+) -> Tuple[List[BandPoint], ErrorMetrics, Optional[Dict[str, Any]]]:
+    """
+    多模型预测：holdout 选模型（误差在容忍度内选最便宜的），再用全量样本拟合选中的模型
+    backtest：上次回测结果（模型 + 指标）；给了就跳过 holdout 回测，只拟合一次
+    model_key：(target, series_key, config_hash)；给了就从 model_store 读上次参数热启动，拟合完写回
+    returns: (forecast, metrics, 本次新算出的回测结果 | None)
+    note: <model>|points=..|min_required=..|train=..|valid=..|fit=cold|warm|fit_ms=..|mape=<候选:mape,...>|backtest=fresh|cached
+    """
     cfg = config or ForecastConfig()
     periods = max(1, int(horizon_minutes * 60 / step))
     ratio_points = int(periods * float(cfg.min_points_ratio))
@@ -293,91 +574,144 @@ def fit_predict_prophet(
     holdout_n = int(points_len * 0.2) if points_len > 0 else 0
     train_len = points_len - holdout_n
     valid_len = holdout_n
+    base_note = f"points={points_len}|min_required={dynamic_min}|train={train_len}|valid={valid_len}"
+
+    if not history or points_len < dynamic_min:
+        return (*_baseline_forecast(clean, periods, step, cfg, f"baseline|{base_note}"), None)
+
+    candidates = list_forecasters(models or _model_names())
+    if not candidates:
+        return (*_baseline_forecast(clean, periods, step, cfg, f"baseline|{base_note}|no_models"), None)
+    season = _season_points(cfg, step)
+
+    chosen: Optional[Forecaster] = None
+    metrics: Dict[str, float] = {}
+    scores_note = ""
+    skipped: List[str] = []
+    fresh: Optional[Dict[str, Any]] = None
+    if backtest:
+        chosen = next((fc for fc in candidates if fc.name == backtest.get("model")), None)
+    if chosen is not None:
+        # ✅ 复用回测：不再做 holdout 拟合
+        metrics = {k: float(backtest.get(k) or 0.0) for k in ("mae", "rmse", "mape", "baseline_mape")}
+        scores_note = str(backtest.get("scores") or "")
+    elif holdout_n > 0 and train_len >= 2:
+        chosen, metrics, scores, skipped = _select_model(
+            candidates, clean[:-holdout_n], clean[-holdout_n:], step, season, cfg
+        )
+        scores_note = ",".join(f"{k}:{v:.2f}" for k, v in scores.items())
+        if chosen is not None:
+            fresh = {"model": chosen.name, **metrics, "scores": scores_note, "computed_at": int(time.time())}
+    else:
+        chosen = candidates[0]
+    if chosen is None:
+        return (*_baseline_forecast(clean, periods, step, cfg, f"baseline|{base_note}|skipped={','.join(skipped)}"), None)
+
+    arr = np.asarray(clean, dtype=np.float64)
+    last_ts = int(arr[-1, 0])
+    future_ts = np.asarray([last_ts + (i + 1) * step for i in range(periods)], dtype=np.float64)
+    use_store = bool(model_key) and chosen.fit_state is not None and model_store_enabled()
+    prev = model_store.load(*model_key) if use_store else None
+    band, fit_ms, err, state = _run_model(
+        chosen, arr[:, 0], arr[:, 1], future_ts, step, season, cfg, stateful=use_store, state=prev
+    )
+    if use_store and state:
+        model_store.save(*model_key, state)
+    fit_mode = "warm" if state and int(state.get("warm_runs") or 0) > 0 else "cold"
+    if band is None:
+        note = f"baseline|{base_note}|{chosen.name}_error={err}"
+        return (*_baseline_forecast(clean, periods, step, cfg, note), None)
+
+    yhat, lower, upper = band
+    forecast = [
+        BandPoint(
+            ts=int(future_ts[i]),
+            yhat=max(0.0, float(yhat[i])),
+            yhat_lower=max(0.0, float(lower[i])),
+            yhat_upper=max(0.0, float(upper[i])),
+        )
+        for i in range(periods)
+    ]
 
-    if not history:
-        note = f"baseline|points={points_len}|min_required={dynamic_min}|train={train_len}|valid={valid_len}"
-        return _baseline_forecast(clean, periods, step, cfg, note)
-
-    if points_len < dynamic_min:
-        note = f"baseline|points={points_len}|min_required={dynamic_min}|train={train_len}|valid={valid_len}"
-        return _baseline_forecast(clean, periods, step, cfg, note)
+    note = f"{chosen.name}|{base_note}|fit={fit_mode}|fit_ms={fit_ms}"
+    if scores_note:
+        note += f"|mape={scores_note}"
+    if skipped:
+        note += "|skipped=" + ",".join(skipped)
+    if fresh is not None:
+        note += "|backtest=fresh"
+    elif backtest and metrics:
+        age = max(0, int(time.time()) - int(backtest.get("computed_at") or 0))
+        note += f"|backtest=cached|backtest_age_sec={age}"
+    return forecast, ErrorMetrics(note=note, **metrics), fresh
 
-    df = pd.DataFrame(clean, columns=["ts", "y"])
-    df["ds"] = pd.to_datetime(df["ts"], unit="s", utc=True).dt.tz_localize(None)
-    df = df[["ds", "y"]]
-    df["y"] = df["y"].astype(float)
 
-    try:
-        from prophet import Prophet  # type: ignore
-    except Exception as exc:
-        note = f"baseline|points={points_len}|min_required={dynamic_min}|train={train_len}|valid={valid_len}"
-        return _baseline_forecast(clean, periods, step, cfg, note + f"|prophet_error={exc}")
+def fit_predict_auto(
+    history: List[Tuple[int, float]],
+    horizon_minutes: int,
+    step: int,
+    config: Optional[ForecastConfig] = None,
+    *,
+    models: Optional[List[str]] = None,
+) -> Tuple[List[BandPoint], ErrorMetrics]:
+    forecast, metrics, _bt = fit_predict_detailed(history, horizon_minutes, step, config, models=models)
+    return forecast, metrics
 
-    model = Prophet(
-        growth=cfg.prophet_growth,
-        daily_seasonality=False,
-        weekly_seasonality=False,
-        yearly_seasonality=False,
-        changepoint_prior_scale=float(cfg.prophet_changepoint_prior_scale),
-    )
-    model.fit(df)
 
-    future = model.make_future_dataframe(periods=periods, freq=f"{step}S", include_history=False)
-    forecast_df = model.predict(future)
+def fit_predict(
+    history: List[Tuple[int, float]],
+    horizon_minutes: int,
+    step: int,
+    config: Optional[ForecastConfig] = None,
+    *,
+    series_key: Optional[str] = None,
+    target: str = "",
+) -> Tuple[List[BandPoint], ErrorMetrics]:
+    """
+    AI_FORECAST_BACKEND=process 时拟合放到进程池（不占 API 线程 / GIL）；inline 或进程池不可用时原地拟合
+    series_key：给了就按 (series_key, 配置) 复用 AI_BACKTEST_INTERVAL_SEC 内的回测结果，
+                并按 (target, series_key, 配置) 从 model_store 热启动
+    """
+    from services.ai import forecast_pool
 
-    forecast: List[BandPoint] = []
-    for _, row in forecast_df.iterrows():
-        ts = int(pd.Timestamp(row["ds"]).timestamp())
-        forecast.append(
-            BandPoint(
-                ts=ts,
-                yhat=max(0.0, float(row["yhat"])),
-                yhat_lower=max(0.0, float(row["yhat_lower"])),
-                yhat_upper=max(0.0, float(row["yhat_upper"])),
-            )
+    cfg = config or ForecastConfig()
+    cfg_hash = backtest_config_hash(cfg, step) if series_key else ""
+    cached = backtest_cache.get(series_key, cfg_hash) if series_key else None
+    model_key = (str(target or ""), series_key, cfg_hash) if series_key else None
+
+    fresh: Optional[Dict[str, Any]] = None
+    if not forecast_pool.process_backend_enabled():
+        forecast, metrics, fresh = fit_predict_detailed(
+            history, horizon_minutes, step, cfg, backtest=cached, model_key=model_key
         )
+    else:
+        try:
+            bands, metrics_d, _fit_ms, fresh = forecast_pool.run_fit(
+                history, horizon_minutes, step, cfg, backtest=cached, model_key=model_key
+            )
+            forecast = [BandPoint(ts=int(t), yhat=y, yhat_lower=lo, yhat_upper=hi) for (t, y, lo, hi) in bands]
+            metrics = ErrorMetrics(**metrics_d)
+        except TimeoutError as e:
+            # ✅ 卡住的拟合已被回收：本次退化为 baseline，接口不报错
+            periods = max(1, int(horizon_minutes * 60 / step))
+            return _baseline_forecast(history, periods, step, cfg, f"baseline|points={len(history)}|fit_timeout={e}")
+        except (OSError, RuntimeError) as e:
+            print(f"forecast_pool unavailable, fit inline: {e}")
+            forecast, metrics, fresh = fit_predict_detailed(
+                history, horizon_minutes, step, cfg, backtest=cached, model_key=model_key
+            )
 
-    if not forecast:
-        note = f"baseline|points={points_len}|min_required={dynamic_min}|train={train_len}|valid={valid_len}"
-        return _baseline_forecast(clean, periods, step, cfg, note + "|prophet_empty")
-
-    if holdout_n <= 0 or train_len < 2:
-        metrics = ErrorMetrics(
-            note=f"prophet|points={points_len}|min_required={dynamic_min}|train={train_len}|valid={valid_len}"
-        )
-        return forecast, metrics
+    if series_key and fresh:
+        backtest_cache.put(series_key, cfg_hash, fresh)
+    record_fit(metrics.note)
+    return forecast, metrics
 
-    train = clean[:-holdout_n]
-    valid = clean[-holdout_n:]
 
-    train_df = pd.DataFrame(train, columns=["ts", "y"])
-    train_df["ds"] = pd.to_datetime(train_df["ts"], unit="s", utc=True).dt.tz_localize(None)
-    train_df = train_df[["ds", "y"]]
-    train_df["y"] = train_df["y"].astype(float)
+def backtest_cache_stats() -> Dict[str, Any]:
+    return backtest_cache.stats()
 
-    model_bt = Prophet(
-        growth=cfg.prophet_growth,
-        daily_seasonality=False,
-        weekly_seasonality=False,
-        yearly_seasonality=False,
-        changepoint_prior_scale=float(cfg.prophet_changepoint_prior_scale),
-    )
-    model_bt.fit(train_df)
 
-    future_valid = pd.DataFrame(
-        {"ds": [pd.to_datetime(ts, unit="s", utc=True).tz_localize(None) for ts, _ in valid]}
-    )
-    valid_pred = model_bt.predict(future_valid)
-    y_true = [v for _, v in valid]
-    y_pred = [max(0.0, float(v)) for v in valid_pred["yhat"].tolist()]
-    baseline_last = train[-1][1] if train else 0.0
-    baseline_pred = [max(0.0, float(baseline_last)) for _ in y_true]
+def model_store_stats() -> Dict[str, Any]:
+    from services.ai.model_store import model_store_stats as _stats
 
-    metrics = ErrorMetrics(
-        mae=float(mae(y_true, y_pred)),
-        rmse=float(rmse(y_true, y_pred)),
-        mape=float(mape(y_true, y_pred)),
-        baseline_mape=float(mape(y_true, baseline_pred)),
-        note=f"prophet|points={points_len}|min_required={dynamic_min}|train={train_len}|valid={valid_len}",
-    )
-    return forecast, metrics
+    return _stats()
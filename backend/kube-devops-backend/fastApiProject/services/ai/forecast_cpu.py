@@ -6,7 +6,9 @@ from typing import List, Optional, Tuple, Dict, Any
 from config import settings
 from services.ops.runtime_config import get_value  # ✅DB override > settings/.env > default
 
+from services.ai.backtest_cache import backtest_meta
 from services.ai.cache import ai_cache
+from services.ai.model_store import fit_meta
 from services.ai.schemas import TsPoint, BandPoint, CpuHistoryResp, CpuForecastResp, ErrorMetrics
 from services.ai.forecast_core import (
     ForecastConfig,
@@ -137,6 +139,7 @@ def get_cpu_forecast(
         step,
         CPU_CONFIG,
         clip_fn=lambda pts: clip_range(pts, 0.0, 100.0),
+        target="node_cpu",
     )
     history_series = [TsPoint(ts=t, value=v) for (t, v) in history]
 
@@ -159,6 +162,8 @@ def get_cpu_forecast(
             "prom_base": _prom_base(),
             "resolved_instance": resolved_instance,
             "baseline_points": _baseline_points(history, forecast_series),
+            "backtest": backtest_meta(metrics.note),
+            "fit": fit_meta(metrics.note),
         },
     )
     ai_cache.set(cache_key, resp, ttl=cache_ttl)
@@ -6,7 +6,9 @@ from typing import List, Optional, Tuple, Dict, Any
 from config import settings
 from services.ops.runtime_config import get_value  # ✅DB override > settings/.env > default
 
+from services.ai.backtest_cache import backtest_meta
 from services.ai.cache import ai_cache
+from services.ai.model_store import fit_meta
 from services.ai.schemas import TsPoint, BandPoint, MemHistoryResp, MemForecastResp, ErrorMetrics
 from services.ai.forecast_core import (
     ForecastConfig,
@@ -148,6 +150,7 @@ def get_mem_forecast(
         step,
         MEM_CONFIG,
         clip_fn=_clip_percent,
+        target="node_mem",
     )
     history_series = [TsPoint(ts=t, value=v) for (t, v) in history]
 
@@ -170,6 +173,8 @@ def get_mem_forecast(
             "prom_base": _prom_base(),
             "resolved_instance": resolved_instance,
             "baseline_points": _baseline_points(history, forecast_series),
+            "backtest": backtest_meta(metrics.note),
+            "fit": fit_meta(metrics.note),
         },
     )
     ai_cache.set(cache_key, resp, ttl=cache_ttl)
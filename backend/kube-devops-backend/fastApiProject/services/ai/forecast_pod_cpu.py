@@ -1,20 +1,42 @@
 ﻿# services/ai/forecast_pod_cpu.py
 from __future__ import annotations
 
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
 from typing import List, Optional, Tuple, Dict, Any
 
+from services.ai.backtest_cache import backtest_cache, backtest_meta
 from services.ai.cache import ai_cache
-from services.ai.schemas import TsPoint, BandPoint, PodCpuHistoryResp, PodCpuForecastResp, ErrorMetrics
+from services.ai.model_store import fit_meta, record_fit
+from services.ai.schemas import (
+    TsPoint,
+    BandPoint,
+    PodCpuHistoryResp,
+    PodCpuForecastResp,
+    PodCpuBatchItem,
+    PodCpuBatchForecastResp,
+    ErrorMetrics,
+)
 from services.ai.forecast_core import (
     ForecastConfig,
     clip_non_negative,
     stable_hash,
+    build_cache_key,
     build_contract_meta,
     build_history_series,
     build_forecast_series,
+    backtest_config_hash,
+    compute_effective_step,
+    fit_predict_detailed,
+    series_key_for,
+    now_utc,
 )
+from services.ai.forecast_pool import on_fit_timeout, process_backend_enabled, reset_forecast_pool, submit_fit
 from services.ops.runtime_config import get_value  # ✅DB override > settings/.env > default
-from services.monitoring.prometheus_client import instant_vector
+from services.monitoring.prometheus_client import instant_vector, prom_query_range
 
 def _baseline_points(history: list[tuple[int, float]], forecast: list[BandPoint]) -> list[TsPoint]:
     if not forecast:
@@ -160,6 +182,7 @@ def get_pod_cpu_forecast(
         step,
         POD_CPU_CONFIG,
         clip_fn=clip_non_negative,
+        target="pod_cpu",
     )
     history_series = [TsPoint(ts=t, value=v) for (t, v) in history]
 
@@ -185,7 +208,231 @@ def get_pod_cpu_forecast(
             "prom_base": _prom_base(),
             "limit_mcpu": limit_mcpu,
             "baseline_points": _baseline_points(history, forecast_series),
+            "backtest": backtest_meta(metrics.note),
+            "fit": fit_meta(metrics.note),
         },
     )
     ai_cache.set(cache_key, resp, ttl=cache_ttl)
     return resp
+
+
+# ========================= 批量：整个 namespace / deployment =========================
+POD_CPU_BATCH_MAX_SERIES = 500
+POD_CPU_BATCH_TIMEOUT_SEC = 600
+
+
+def _promql_name_re(name: str) -> str:
+    # k8s 名称只含 [a-z0-9-.]，只需转义 "."（PromQL 字符串里反斜杠本身也要转义）
+    return str(name).replace(".", "\\\\.")
+
+
+def _batch_pod_cpu_promql(
+    namespace: str,
+    deployment: Optional[str] = None,
+    pods: Optional[List[str]] = None,
+    window: str = "2m",
+) -> str:
+    """
+    一次 range query 拿全部 Pod：与单 Pod 的 _default_pod_cpu_promql 同口径，只是 sum by (pod)
+    """
+    sel = [f'namespace="{namespace}"', 'container!=""', 'image!=""']
+    if pods:
+        sel.append('pod=~"' + "|".join(_promql_name_re(p) for p in pods) + '"')
+    elif deployment:
+        sel.append(f'pod=~"{_promql_name_re(deployment)}-.*"')
+    return f'sum by (pod) (rate(container_cpu_usage_seconds_total{{{",".join(sel)}}}[{window}])) * 1000'
+
+
+def _split_matrix(data: Dict[str, Any]) -> Dict[str, List[Tuple[int, float]]]:
+    out: Dict[str, List[Tuple[int, float]]] = {}
+    for r in (((data or {}).get("data") or {}).get("result") or []):
+        name = str((r.get("metric") or {}).get("pod") or "")
+        if not name:
+            continue
+        pts: List[Tuple[int, float]] = []
+        for ts, v in r.get("values") or []:
+            try:
+                pts.append((int(float(ts)), float(v)))
+            except Exception:
+                continue
+        out[name] = pts
+    return out
+
+
+def _batch_limits_mcpu(namespace: str) -> Dict[str, float]:
+    """一次 instant query 拿整个 namespace 的 Pod CPU limit（mCPU）"""
+    promql = f'sum by (pod) (kube_pod_container_resource_limits{{resource="cpu", unit="core", namespace="{namespace}"}}) * 1000'
+    out: Dict[str, float] = {}
+    for r in _query_instant(promql):
+        name = str((r.get("metric") or {}).get("pod") or "")
+        try:
+            out[name] = float((r.get("value") or [None, None])[1])
+        except Exception:
+            continue
+    return out
+
+
+def _fit_inline(
+    history: List[Tuple[int, float]],
+    horizon: int,
+    step: int,
+    config: ForecastConfig,
+    *,
+    backtest: Optional[Dict[str, Any]],
+    model_key: Tuple[str, str, str],
+) -> Future:
+    """AI_FORECAST_BACKEND=inline：原地拟合，结果包成已完成的 Future（和 submit_fit 的结果同构）"""
+    fut: Future = Future()
+    t0 = time.perf_counter()
+    try:
+        forecast, metrics, fresh = fit_predict_detailed(
+            history, horizon, step, config, backtest=backtest, model_key=model_key
+        )
+    except Exception as e:
+        fut.set_exception(e)
+        return fut
+    fit_ms = int((time.perf_counter() - t0) * 1000)
+    bands = [(p.ts, p.yhat, p.yhat_lower, p.yhat_upper) for p in forecast]
+    fut.set_result((bands, metrics.model_dump(), fit_ms, fresh))
+    return fut
+
+
+def get_pod_cpu_forecast_batch(
+    namespace: str,
+    minutes: int,
+    horizon: int,
+    step: int,
+    deployment: Optional[str] = None,
+    pods: Optional[List[str]] = None,
+    cache_ttl: int = 300,
+    max_series: int = POD_CPU_BATCH_MAX_SERIES,
+) -> PodCpuBatchForecastResp:
+    """
+    批量预测：1 次 query_range（sum by pod）+ 进程池并行拟合（AI_FORECAST_BACKEND=inline 时逐条原地拟合）
+    单条失败/超时只记到 failures，不影响其它 Pod
+    """
+    pods = sorted({str(p).strip() for p in (pods or []) if str(p).strip()})
+    q = _batch_pod_cpu_promql(namespace, deployment=deployment, pods=pods or None)
+    cache_key = build_cache_key(
+        "pod_cpu_forecast_batch",
+        ns=namespace,
+        dep=deployment or "",
+        pods=pods,
+        m=minutes,
+        h=horizon,
+        s=step,
+        n=max_series,
+    )
+    cached = ai_cache.get(cache_key)
+    if cached:
+        return cached
+
+    t0 = time.perf_counter()
+    effective_step = compute_effective_step(minutes, step)
+    end = now_utc()
+    start = end - timedelta(minutes=minutes)
+    data = prom_query_range(q, start.timestamp(), end.timestamp(), effective_step)
+    query_ms = int((time.perf_counter() - t0) * 1000)
+
+    series = _split_matrix(data)
+    names = sorted(series.keys())
+    failures: Dict[str, str] = {}
+    if len(names) > int(max_series):
+        for name in names[int(max_series):]:
+            failures[name] = "skipped: exceeds max_series"
+        names = names[: int(max_series)]
+
+    submitted: Dict[str, Any] = {}
+    done_at: Dict[str, float] = {}
+    bt_hash = backtest_config_hash(POD_CPU_CONFIG, effective_step)
+    bt_keys = {name: series_key_for(f"{q}|pod={name}") for name in names}
+    fit = submit_fit if process_backend_enabled() else _fit_inline
+    for name in names:
+        submit_t = time.perf_counter()
+        try:
+            cached_bt = backtest_cache.get(bt_keys[name], bt_hash)
+            fut = fit(
+                series[name],
+                horizon,
+                effective_step,
+                POD_CPU_CONFIG,
+                backtest=cached_bt,
+                model_key=("pod_cpu", bt_keys[name], bt_hash),
+            )
+        except Exception as e:
+            failures[name] = f"submit failed: {e}"
+            continue
+        submitted[name] = (fut, submit_t)
+        fut.add_done_callback(lambda _f, n=name: done_at.__setitem__(n, time.perf_counter()))
+
+    forecasts: Dict[str, PodCpuBatchItem] = {}
+    deadline = time.monotonic() + POD_CPU_BATCH_TIMEOUT_SEC
+    # ✅ 只回收出错任务所在的那一代池：别的请求可能已经建好了新池
+    broken_gens: set = set()
+    for name, (fut, submit_t) in submitted.items():
+        try:
+            fc, metrics, fit_ms, fresh_bt = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            on_fit_timeout(fut)
+            failures[name] = "timeout"
+            continue
+        except BrokenProcessPool as e:
+            broken_gens.add(getattr(fut, "pool_gen", None))
+            failures[name] = f"worker crashed: {e}"
+            continue
+        except Exception as e:
+            failures[name] = str(e) or e.__class__.__name__
+            continue
+
+        if fresh_bt:
+            backtest_cache.put(bt_keys[name], bt_hash, fresh_bt)
+        record_fit(metrics.get("note") or "")
+        wall_ms = int((done_at.get(name, time.perf_counter()) - submit_t) * 1000)
+        forecast = clip_non_negative(
+            [BandPoint(ts=int(t), yhat=y, yhat_lower=lo, yhat_upper=hi) for (t, y, lo, hi) in fc]
+        )
+        forecasts[name] = PodCpuBatchItem(
+            pod=name,
+            history=[TsPoint(ts=t, value=v) for (t, v) in series[name]],
+            forecast=forecast,
+            metrics=ErrorMetrics(**metrics),
+            timings_ms={"fit": int(fit_ms), "queue": max(0, wall_ms - int(fit_ms)), "wall": wall_ms},
+        )
+    for gen in broken_gens:
+        reset_forecast_pool(gen)
+
+    try:
+        limits = _batch_limits_mcpu(namespace)
+    except Exception:
+        limits = {}
+
+    resp = PodCpuBatchForecastResp(
+        namespace=namespace,
+        deployment=deployment,
+        history_minutes=minutes,
+        horizon_minutes=horizon,
+        step=step,
+        forecasts=forecasts,
+        failures=failures,
+        meta={
+            **build_contract_meta(
+                target="pod_cpu",
+                unit="mCPU",
+                promql=q,
+                history_points=sum(len(v) for v in series.values()),
+                forecast_points=sum(len(v.forecast) for v in forecasts.values()),
+            ),
+            "prom_base": _prom_base(),
+            "effective_step": effective_step,
+            "series_total": len(series),
+            "series_ok": len(forecasts),
+            "series_failed": len(failures),
+            "backtest_reused": sum(1 for v in forecasts.values() if backtest_meta(v.metrics.note)["reused"]),
+            "limit_mcpu": {k: v for k, v in limits.items() if k in forecasts},
+            "timings_ms": {"query": query_ms, "total": int((time.perf_counter() - t0) * 1000)},
+        },
+    )
+    # 有拟合失败的批次不缓存，下次重试（超出 max_series 的跳过不算）
+    if not any(not v.startswith("skipped") for v in failures.values()):
+        ai_cache.set(cache_key, resp, ttl=cache_ttl)
+    return resp
@@ -0,0 +1,350 @@
+# services/ai/forecast_pool.py
+"""
+预测拟合进程池：CPU 密集的 Stan 优化不占 API 线程池 / GIL
+
+- spawn 方式启动子进程（父进程有 sqlite / k8s watch 等线程，fork 不安全）
+- 预热：子进程 initializer 预先 import pandas / prophet；启动时先把 worker 全部拉起来
+- 序列化：历史序列打包成 (int64 ts bytes, float64 value bytes)，结果打包成 float64 (n x 4) bytes
+  不 pickle pandas / pydantic 对象
+- 单次拟合超时：整池回收（已卡死的 Stan 进程无法单独取消），被波及的任务重提交一次
+- 指标：排队深度、拟合耗时 / 排队耗时分位、超时与回收次数
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+AI_FORECAST_WORKERS_DEFAULT = 4
+AI_FORECAST_FIT_TIMEOUT_SEC = 120
+AI_FORECAST_MAX_TASKS_PER_CHILD = 200
+
+BandTuple = Tuple[int, float, float, float]
+PackedSeries = Tuple[bytes, bytes]
+
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_gen = 0
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "timeouts": 0,
+    "recycles": 0,
+    "resubmits": 0,
+    "inflight": 0,
+}
+_fit_ms: Deque[float] = deque(maxlen=1024)
+_wait_ms: Deque[float] = deque(maxlen=1024)
+
+
+# ---------- 配置 ----------
+def _worker_count() -> int:
+    n = int(getattr(settings, "AI_FORECAST_WORKERS", 0) or 0)
+    if n <= 0:
+        n = min(AI_FORECAST_WORKERS_DEFAULT, os.cpu_count() or 1)
+    return max(1, n)
+
+
+def fit_timeout_sec() -> float:
+    return float(getattr(settings, "AI_FORECAST_FIT_TIMEOUT_SEC", AI_FORECAST_FIT_TIMEOUT_SEC) or AI_FORECAST_FIT_TIMEOUT_SEC)
+
+
+def process_backend_enabled() -> bool:
+    return str(getattr(settings, "AI_FORECAST_BACKEND", "process") or "process").strip().lower() == "process"
+
+
+# ---------- 序列化 ----------
+def pack_history(history: List[Tuple[int, float]]) -> PackedSeries:
+    if not history:
+        return b"", b""
+    arr = np.asarray(history, dtype=np.float64)
+    return arr[:, 0].astype(np.int64).tobytes(), np.ascontiguousarray(arr[:, 1]).tobytes()
+
+
+def unpack_history(packed: PackedSeries) -> List[Tuple[int, float]]:
+    ts_b, val_b = packed
+    if not ts_b:
+        return []
+    ts = np.frombuffer(ts_b, dtype=np.int64)
+    vals = np.frombuffer(val_b, dtype=np.float64)
+    return list(zip(ts.tolist(), vals.tolist()))
+
+
+def _pack_bands(bands: List[BandTuple]) -> bytes:
+    if not bands:
+        return b""
+    return np.asarray(bands, dtype=np.float64).tobytes()
+
+
+def unpack_bands(b: bytes) -> List[BandTuple]:
+    if not b:
+        return []
+    arr = np.frombuffer(b, dtype=np.float64).reshape(-1, 4)
+    return [(int(r[0]), float(r[1]), float(r[2]), float(r[3])) for r in arr.tolist()]
+
+
+# ---------- 子进程 ----------
+def _warm_worker() -> None:
+    # 子进程启动即 import 重依赖，第一次拟合不再付 import 成本
+    try:
+        import pandas  # noqa: F401
+    except Exception:
+        pass
+    try:
+        import prophet  # noqa: F401
+    except Exception:
+        pass
+    try:
+        import services.ai.forecast_core  # noqa: F401
+    except Exception:
+        pass
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _fit_packed(
+    packed: PackedSeries,
+    horizon_minutes: int,
+    step: int,
+    config: Any,
+    backtest: Optional[Dict[str, Any]],
+    model_key: Optional[Tuple[str, str, str]],
+) -> Tuple[bytes, Dict[str, Any], int, Optional[Dict[str, Any]]]:
+    from services.ai.forecast_core import fit_predict_detailed
+
+    history = unpack_history(packed)
+    t0 = time.perf_counter()
+    forecast, metrics, fresh = fit_predict_detailed(
+        history, horizon_minutes, step, config, backtest=backtest, model_key=model_key
+    )
+    fit_ms = int((time.perf_counter() - t0) * 1000)
+    bands = [(p.ts, p.yhat, p.yhat_lower, p.yhat_upper) for p in forecast]
+    return _pack_bands(bands), metrics.model_dump(), fit_ms, fresh
+
+
+# ---------- 进程池生命周期 ----------
+def _new_pool() -> ProcessPoolExecutor:
+    ctx = mp.get_context("spawn")
+    max_tasks = int(getattr(settings, "AI_FORECAST_MAX_TASKS_PER_CHILD", AI_FORECAST_MAX_TASKS_PER_CHILD) or 0)
+    kwargs: Dict[str, Any] = {"max_workers": _worker_count(), "mp_context": ctx, "initializer": _warm_worker}
+    if max_tasks > 0:
+        kwargs["max_tasks_per_child"] = max_tasks  # Python 3.11+：定期换新进程，防 Stan 内存涨
+    try:
+        return ProcessPoolExecutor(**kwargs)
+    except TypeError:
+        kwargs.pop("max_tasks_per_child", None)
+        return ProcessPoolExecutor(**kwargs)
+
+
+def get_forecast_pool() -> Tuple[ProcessPoolExecutor, int]:
+    global _pool, _pool_gen
+    with _pool_lock:
+        if _pool is None:
+            _pool = _new_pool()
+            _pool_gen += 1
+        return _pool, _pool_gen
+
+
+def _kill_pool(old: ProcessPoolExecutor) -> None:
+    procs = list((getattr(old, "_processes", None) or {}).values())
+    try:
+        old.shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+    for p in procs:
+        try:
+            p.terminate()
+        except Exception:
+            pass
+
+
+def reset_forecast_pool(gen: Optional[int] = None) -> None:
+    """
+    丢弃当前进程池并强制结束其子进程（超时卡死 / BrokenProcessPool 后调用）
+    gen：只回收指定代的池，避免多个超时同时触发时把刚重建的新池也杀掉
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or (gen is not None and gen != _pool_gen):
+            return
+        old = _pool
+        _pool = None
+    with _stats_lock:
+        _stats["recycles"] += 1
+    threading.Thread(target=_kill_pool, args=(old,), name="forecast-pool-kill", daemon=True).start()
+
+
+def warm_forecast_pool() -> None:
+    """启动时把 worker 全部拉起来（每个 worker 跑一次 initializer），不阻塞调用方"""
+    if not process_backend_enabled():
+        return
+
+    def _run() -> None:
+        try:
+            pool, _gen = get_forecast_pool()
+            futs = [pool.submit(_ping) for _ in range(_worker_count())]
+            for f in futs:
+                f.result(timeout=120)
+        except Exception as e:
+            print(f"forecast_pool warm failed: {e}")
+
+    threading.Thread(target=_run, name="forecast-pool-warm", daemon=True).start()
+
+
+def shutdown_forecast_pool() -> None:
+    global _pool
+    with _pool_lock:
+        old = _pool
+        _pool = None
+    if old is not None:
+        _kill_pool(old)
+
+
+# ---------- 提交 / 等待 ----------
+def _track(fut: Future, submit_t: float) -> None:
+    def _done(f: Future) -> None:
+        ms = (time.perf_counter() - submit_t) * 1000.0
+        with _stats_lock:
+            _stats["inflight"] -= 1
+            if f.cancelled() or f.exception() is not None:
+                _stats["failed"] += 1
+                return
+            _stats["completed"] += 1
+            fit_ms = float(f.result()[2])
+            _fit_ms.append(fit_ms)
+            _wait_ms.append(max(0.0, ms - fit_ms))
+
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["inflight"] += 1
+    fut.add_done_callback(_done)
+
+
+def submit_fit(
+    history: List[Tuple[int, float]],
+    horizon_minutes: int,
+    step: int,
+    config: Any,
+    *,
+    backtest: Optional[Dict[str, Any]] = None,
+    model_key: Optional[Tuple[str, str, str]] = None,
+) -> Future:
+    """
+    提交一次拟合；Future 结果为 (forecast tuples, metrics dict, fit_ms, 新回测结果 | None)
+    backtest：可复用的回测结果（见 backtest_cache），给了就跳过 holdout 回测
+    model_key：(target, series_key, config_hash)，子进程按它从 model_store 热启动
+    """
+    packed = pack_history(history)
+    pool, gen = get_forecast_pool()
+    raw = pool.submit(_fit_packed, packed, int(horizon_minutes), int(step), config, backtest, model_key)
+    _track(raw, time.perf_counter())
+
+    out: Future = Future()
+    out.pool_gen = gen  # type: ignore[attr-defined]
+    out.raw = raw  # type: ignore[attr-defined]
+
+    def _relay(f: Future) -> None:
+        if f.cancelled():
+            out.cancel()
+            return
+        err = f.exception()
+        if err is not None:
+            out.set_exception(err)
+            return
+        bands_b, metrics, fit_ms, fresh = f.result()
+        out.set_result((unpack_bands(bands_b), metrics, fit_ms, fresh))
+
+    raw.add_done_callback(_relay)
+    return out
+
+
+def on_fit_timeout(fut: Future) -> None:
+    """
+    调用方等待超时：还在排队就取消；已经在跑（Stan 卡住）就回收整池
+    """
+    with _stats_lock:
+        _stats["timeouts"] += 1
+    raw = getattr(fut, "raw", None)
+    if raw is not None and raw.cancel():
+        fut.cancel()
+        return
+    reset_forecast_pool(getattr(fut, "pool_gen", None))
+
+
+def run_fit(
+    history: List[Tuple[int, float]],
+    horizon_minutes: int,
+    step: int,
+    config: Any,
+    *,
+    backtest: Optional[Dict[str, Any]] = None,
+    model_key: Optional[Tuple[str, str, str]] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[List[BandTuple], Dict[str, Any], int, Optional[Dict[str, Any]]]:
+    """
+    同步拟合（阻塞调用线程，但 CPU 在子进程）
+    - 超时抛 TimeoutError（并回收卡住的 worker）
+    - 被其它超时回收波及（BrokenProcessPool）自动重提交一次
+    """
+    limit = float(timeout if timeout is not None else fit_timeout_sec())
+    for attempt in range(2):
+        fut = submit_fit(history, horizon_minutes, step, config, backtest=backtest, model_key=model_key)
+        try:
+            return fut.result(timeout=limit)
+        except FutureTimeout:
+            on_fit_timeout(fut)
+            raise TimeoutError(f"forecast fit timeout after {limit:.0f}s")
+        except BrokenProcessPool:
+            reset_forecast_pool(getattr(fut, "pool_gen", None))
+            if attempt == 0:
+                with _stats_lock:
+                    _stats["resubmits"] += 1
+                continue
+            raise
+    raise RuntimeError("unreachable")
+
+
+def _pct(vals: List[float], p: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return round(vals[min(len(vals) - 1, int(len(vals) * p))], 2)
+
+
+def forecast_pool_stats() -> Dict[str, Any]:
+    workers = _worker_count()
+    with _stats_lock:
+        out: Dict[str, Any] = dict(_stats)
+        fit_ms = list(_fit_ms)
+        wait_ms = list(_wait_ms)
+    with _pool_lock:
+        alive = _pool is not None
+        gen = _pool_gen
+    out.update(
+        {
+            "backend": "process" if process_backend_enabled() else "inline",
+            "workers": workers,
+            "pool_alive": alive,
+            "pool_generation": gen,
+            "queue_depth": max(0, int(out["inflight"]) - workers),
+            "fit_ms": {"p50": _pct(fit_ms, 0.5), "p95": _pct(fit_ms, 0.95), "p99": _pct(fit_ms, 0.99)},
+            "queue_wait_ms": {"p50": _pct(wait_ms, 0.5), "p95": _pct(wait_ms, 0.95), "p99": _pct(wait_ms, 0.99)},
+            "fit_timeout_sec": fit_timeout_sec(),
+        }
+    )
+    return out
@@ -0,0 +1,365 @@
+# services/ai/forecasters.py
+"""
+预测模型注册表：轻量 NumPy 模型（毫秒级）+ Prophet（由 forecast_core 注册）
+
+- 统一签名：fn(ts, y, future_ts, step, season, cfg) -> (yhat, lower, upper) | None
+    ts / y：训练样本（升序）；future_ts：要预测的时间点；season：季节周期（点数，0=不用）
+    cfg：ForecastConfig（Prophet 的 growth / changepoint 用，NumPy 模型忽略）
+    返回 None 表示该模型不适用（例如样本不足两个季节周期）
+- fit_state（可选）：fit_state(ts, y, future_ts, step, season, cfg, state) -> (band, new_state) | None
+    state 为上次拟合导出的参数（见 model_store）；给了就热启动，NumPy 模型只递推 last_ts 之后的新样本
+- cost：相对拟合成本，auto 选择时“误差差不多就选便宜的”
+- 平滑参数用网格搜索：整组参数按向量一起递推（时间维循环，参数维向量化），按一步预测 SSE 选最优
+- 区间：残差标准差 * z（z=1.2816，对齐 Prophet 默认 interval_width=0.8）
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+Band = Tuple[np.ndarray, np.ndarray, np.ndarray]
+ForecastFn = Callable[[np.ndarray, np.ndarray, np.ndarray, int, int, Any], Optional[Band]]
+StatefulFn = Callable[
+    [np.ndarray, np.ndarray, np.ndarray, int, int, Any, Optional[Dict[str, Any]]],
+    Optional[Tuple[Band, Dict[str, Any]]],
+]
+
+INTERVAL_Z = 1.2816
+HW_DAMPING = 0.98
+# 连续热启动这么多次后冷启动一次，重新网格搜索平滑参数
+MAX_WARM_RUNS = 50
+
+
+@dataclass(frozen=True)
+class Forecaster:
+    name: str
+    cost: int
+    fn: ForecastFn
+    fit_state: Optional[StatefulFn] = None
+
+
+_REGISTRY: Dict[str, Forecaster] = {}
+
+
+def register_forecaster(name: str, cost: int, fn: ForecastFn, fit_state: Optional[StatefulFn] = None) -> None:
+    _REGISTRY[str(name)] = Forecaster(name=str(name), cost=int(cost), fn=fn, fit_state=fit_state)
+
+
+def get_forecaster(name: str) -> Optional[Forecaster]:
+    return _REGISTRY.get(str(name or "").strip())
+
+
+def list_forecasters(names: Optional[List[str]] = None) -> List[Forecaster]:
+    """
+    names 为空 = 全部；按 cost 升序（便宜的在前）
+    """
+    if names:
+        items = [f for f in (get_forecaster(n) for n in names) if f is not None]
+    else:
+        items = list(_REGISTRY.values())
+    return sorted(items, key=lambda f: (f.cost, f.name))
+
+
+# ---------- 工具 ----------
+def _horizons(last_ts: float, future_ts: np.ndarray, step: int) -> np.ndarray:
+    h = np.rint((future_ts.astype(np.float64) - float(last_ts)) / float(max(1, step)))
+    return np.maximum(1, h).astype(np.int64)
+
+
+def _pick(sse: np.ndarray) -> int:
+    sse = np.where(np.isfinite(sse), sse, np.inf)
+    return int(np.argmin(sse))
+
+
+def _band(yhat: np.ndarray, sigma: float, widen: np.ndarray) -> Band:
+    half = INTERVAL_Z * float(sigma) * widen
+    return yhat, yhat - half, yhat + half
+
+
+def _warm_points(
+    name: str, ts: np.ndarray, y: np.ndarray, state: Optional[Dict[str, Any]]
+) -> Optional[np.ndarray]:
+    """
+    能热启动时返回 last_ts 之后的新样本（可能为空）；否则 None（冷启动）
+    窗口和上次不衔接（中间断档）也冷启动
+    """
+    if not state or state.get("model") != name or int(state.get("warm_runs") or 0) >= MAX_WARM_RUNS:
+        return None
+    last_ts = float(state.get("last_ts") or 0)
+    if ts.size == 0 or ts[0] > last_ts or ts[-1] < last_ts:
+        return None
+    return y[ts > last_ts]
+
+
+def _next_state(state: Optional[Dict[str, Any]], warm: bool, **values: Any) -> Dict[str, Any]:
+    runs = int((state or {}).get("warm_runs") or 0) + 1 if warm else 0
+    return {**values, "warm_runs": runs}
+
+
+# ---------- EWMA（简单指数平滑）----------
+_EWMA_ALPHAS = np.linspace(0.05, 0.95, 19)
+
+
+def _ses_run(
+    y: np.ndarray, alpha: np.ndarray, level: np.ndarray, sse: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    for v in y:
+        e = v - level
+        sse = sse + e * e
+        level = level + alpha * e
+    return level, sse
+
+
+def ewma_fit(
+    ts: np.ndarray,
+    y: np.ndarray,
+    future_ts: np.ndarray,
+    step: int,
+    season: int,
+    cfg: Any = None,
+    state: Optional[Dict[str, Any]] = None,
+) -> Optional[Tuple[Band, Dict[str, Any]]]:
+    new = _warm_points("ewma", ts, y, state)
+    if new is not None:
+        alpha = float(state["alpha"])
+        level, sse = _ses_run(new, np.array([alpha]), np.array([state["level"]]), np.array([state["sse"]]))
+        level_v, sse_v, n = float(level[0]), float(sse[0]), int(state["n"]) + new.size
+    else:
+        if y.size < 3:
+            return None
+        alphas = _EWMA_ALPHAS
+        level, sse = _ses_run(y[1:], alphas, np.full(alphas.shape, y[0]), np.zeros(alphas.shape))
+        i = _pick(sse)
+        alpha, level_v, sse_v, n = float(alphas[i]), float(level[i]), float(sse[i]), y.size - 1
+
+    sigma = np.sqrt(sse_v / max(1, n))
+    h = _horizons(ts[-1], future_ts, step)
+    band = _band(np.full(h.shape, level_v), sigma, np.sqrt(1.0 + (h - 1) * alpha**2))
+    st = _next_state(
+        state, new is not None, model="ewma", alpha=alpha, level=level_v, sse=sse_v, n=n, last_ts=int(ts[-1])
+    )
+    return band, st
+
+
+def ewma_forecast(
+    ts: np.ndarray, y: np.ndarray, future_ts: np.ndarray, step: int, season: int, cfg: Any = None
+) -> Optional[Band]:
+    out = ewma_fit(ts, y, future_ts, step, season, cfg)
+    return out[0] if out else None
+
+
+# ---------- Holt 阻尼线性趋势 ----------
+_HOLT_GRID = np.array(
+    np.meshgrid(
+        [0.1, 0.3, 0.5, 0.7, 0.9],
+        [0.01, 0.05, 0.1, 0.2],
+        [0.8, 0.9, 0.95, 0.98],
+        indexing="ij",
+    )
+).reshape(3, -1)
+
+
+def _damped_sum(phi: float, h: np.ndarray) -> np.ndarray:
+    # phi + phi^2 + ... + phi^h
+    if abs(1.0 - phi) < 1e-12:
+        return h.astype(np.float64)
+    return phi * (1.0 - phi**h) / (1.0 - phi)
+
+
+def _holt_run(
+    y: np.ndarray,
+    alpha: np.ndarray,
+    beta: np.ndarray,
+    phi: np.ndarray,
+    level: np.ndarray,
+    trend: np.ndarray,
+    sse: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    for v in y:
+        f = level + phi * trend
+        e = v - f
+        sse = sse + e * e
+        level = f + alpha * e
+        trend = phi * trend + alpha * beta * e
+    return level, trend, sse
+
+
+def holt_fit(
+    ts: np.ndarray,
+    y: np.ndarray,
+    future_ts: np.ndarray,
+    step: int,
+    season: int,
+    cfg: Any = None,
+    state: Optional[Dict[str, Any]] = None,
+) -> Optional[Tuple[Band, Dict[str, Any]]]:
+    new = _warm_points("holt", ts, y, state)
+    if new is not None:
+        p = {k: np.array([float(state[k])]) for k in ("alpha", "beta", "phi", "level", "trend", "sse")}
+        level, trend, sse = _holt_run(new, p["alpha"], p["beta"], p["phi"], p["level"], p["trend"], p["sse"])
+        alpha, beta, phi = float(state["alpha"]), float(state["beta"]), float(state["phi"])
+        n = int(state["n"]) + new.size
+        level_v, trend_v, sse_v = float(level[0]), float(trend[0]), float(sse[0])
+    else:
+        if y.size < 4:
+            return None
+        ga, gb, gp = _HOLT_GRID
+        level, trend, sse = _holt_run(
+            y[1:], ga, gb, gp, np.full(ga.shape, y[0]), np.full(ga.shape, y[1] - y[0]), np.zeros(ga.shape)
+        )
+        i = _pick(sse)
+        alpha, beta, phi = float(ga[i]), float(gb[i]), float(gp[i])
+        n = y.size - 1
+        level_v, trend_v, sse_v = float(level[i]), float(trend[i]), float(sse[i])
+
+    sigma = np.sqrt(sse_v / max(1, n))
+    h = _horizons(ts[-1], future_ts, step)
+    band = _band(level_v + _damped_sum(phi, h) * trend_v, sigma, np.sqrt(h))
+    st = _next_state(
+        state,
+        new is not None,
+        model="holt",
+        alpha=alpha,
+        beta=beta,
+        phi=phi,
+        level=level_v,
+        trend=trend_v,
+        sse=sse_v,
+        n=n,
+        last_ts=int(ts[-1]),
+    )
+    return band, st
+
+
+def holt_forecast(
+    ts: np.ndarray, y: np.ndarray, future_ts: np.ndarray, step: int, season: int, cfg: Any = None
+) -> Optional[Band]:
+    out = holt_fit(ts, y, future_ts, step, season, cfg)
+    return out[0] if out else None
+
+
+# ---------- Holt-Winters 加法季节（阻尼趋势）----------
+_HW_GRID = np.array(
+    np.meshgrid(
+        [0.1, 0.3, 0.5, 0.7],
+        [0.01, 0.05, 0.1],
+        [0.05, 0.1, 0.3],
+        indexing="ij",
+    )
+).reshape(3, -1)
+
+
+def _hw_run(
+    y: np.ndarray,
+    t0: int,
+    m: int,
+    alpha: np.ndarray,
+    beta: np.ndarray,
+    gamma: np.ndarray,
+    level: np.ndarray,
+    trend: np.ndarray,
+    seas: np.ndarray,
+    sse: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    t0：y[0] 在整条序列里的下标（决定季节相位）；seas 形状 (参数组数, m)，原地更新
+    """
+    phi = HW_DAMPING
+    for k, v in enumerate(y):
+        j = (t0 + k) % m
+        f = level + phi * trend + seas[:, j]
+        e = v - f
+        sse = sse + e * e
+        level = level + phi * trend + alpha * e
+        trend = phi * trend + alpha * beta * e
+        seas[:, j] += gamma * e
+    return level, trend, seas, sse
+
+
+def holt_winters_fit(
+    ts: np.ndarray,
+    y: np.ndarray,
+    future_ts: np.ndarray,
+    step: int,
+    season: int,
+    cfg: Any = None,
+    state: Optional[Dict[str, Any]] = None,
+) -> Optional[Tuple[Band, Dict[str, Any]]]:
+    m = int(season)
+    if m < 2:
+        return None
+    new = _warm_points("holt_winters", ts, y, state)
+    if new is not None and len(state.get("seas") or []) != m:
+        new = None
+
+    if new is not None:
+        p = {k: np.array([float(state[k])]) for k in ("alpha", "beta", "gamma", "level", "trend", "sse")}
+        seas = np.asarray(state["seas"], dtype=np.float64).reshape(1, m)
+        t0 = int(state["t"])
+        level, trend, seas, sse = _hw_run(
+            new, t0, m, p["alpha"], p["beta"], p["gamma"], p["level"], p["trend"], seas, p["sse"]
+        )
+        alpha, beta, gamma = float(state["alpha"]), float(state["beta"]), float(state["gamma"])
+        t_next, n = t0 + new.size, int(state["n"]) + new.size
+        level_v, trend_v, seas_v, sse_v = float(level[0]), float(trend[0]), seas[0], float(sse[0])
+    else:
+        # 至少两个完整周期才能初始化季节项
+        if y.size < 2 * m + 2:
+            return None
+        ga, gb, gg = _HW_GRID
+        k = ga.size
+        # 初值：前两个周期均值定趋势，季节项去掉周期内的趋势斜坡，level 对齐到第一个周期末
+        first = y[:m].mean()
+        slope = (y[m : 2 * m].mean() - first) / m
+        ramp = first + slope * (np.arange(m) - (m - 1) / 2.0)
+        level, trend, seas, sse = _hw_run(
+            y[m:],
+            m,
+            m,
+            ga,
+            gb,
+            gg,
+            np.full(k, first + slope * (m - 1) / 2.0),
+            np.full(k, slope),
+            np.tile(y[:m] - ramp, (k, 1)),
+            np.zeros(k),
+        )
+        i = _pick(sse)
+        alpha, beta, gamma = float(ga[i]), float(gb[i]), float(gg[i])
+        t_next, n = y.size, y.size - m
+        level_v, trend_v, seas_v, sse_v = float(level[i]), float(trend[i]), seas[i], float(sse[i])
+
+    sigma = np.sqrt(sse_v / max(1, n))
+    h = _horizons(ts[-1], future_ts, step)
+    idx = (t_next - 1 + h) % m
+    band = _band(level_v + _damped_sum(HW_DAMPING, h) * trend_v + seas_v[idx], sigma, np.sqrt(h))
+    st = _next_state(
+        state,
+        new is not None,
+        model="holt_winters",
+        alpha=alpha,
+        beta=beta,
+        gamma=gamma,
+        level=level_v,
+        trend=trend_v,
+        seas=[float(v) for v in seas_v],
+        t=int(t_next),
+        sse=sse_v,
+        n=n,
+        last_ts=int(ts[-1]),
+    )
+    return band, st
+
+
+def holt_winters_forecast(
+    ts: np.ndarray, y: np.ndarray, future_ts: np.ndarray, step: int, season: int, cfg: Any = None
+) -> Optional[Band]:
+    out = holt_winters_fit(ts, y, future_ts, step, season, cfg)
+    return out[0] if out else None
+
+
+register_forecaster("ewma", 1, ewma_forecast, ewma_fit)
+register_forecaster("holt", 2, holt_forecast, holt_fit)
+register_forecaster("holt_winters", 3, holt_winters_forecast, holt_winters_fit)
@@ -0,0 +1,220 @@
+# services/ai/model_store.py
+"""
+拟合模型持久化：预测缓存 miss 时从上次的参数热启动，而不是每次从零拟合
+
+- key = (target, series_key, config_hash)，一个 key 一个 JSON 文件（进程池子进程 / 重启后都能读到）
+- 内容：NumPy 模型的平滑参数 + 末端状态（level / trend / seas），或 Prophet model_to_json
+- 写入：临时文件 + os.replace（并发写同一个 key 不会读到半个文件）
+- 淘汰：目录总大小超过 AI_MODEL_STORE_MAX_MB，按 mtime 从旧到新删（读取会 touch mtime，近似 LRU）
+- 冷 / 热拟合耗时：从 ErrorMetrics.note 的 fit=cold|warm、fit_ms 统计（拟合可能在子进程里）
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+AI_MODEL_STORE_MAX_MB = 256
+MODEL_STORE_EVICT_RATIO = 0.9
+
+_DEFAULT_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "models"
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def model_store_enabled() -> bool:
+    return bool(_setting("AI_MODEL_STORE_ENABLED", True))
+
+
+class ModelStore:
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None) -> None:
+        self._root = root
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None
+        self._stats: Dict[str, int] = {"loads": 0, "hits": 0, "saves": 0, "evictions": 0, "errors": 0}
+
+    # ---------- 路径 / 配置 ----------
+    @property
+    def root(self) -> Path:
+        if self._root is not None:
+            return self._root
+        raw = str(_setting("AI_MODEL_STORE_DIR", "") or "").strip()
+        return Path(raw) if raw else _DEFAULT_DIR
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return int(self._max_bytes)
+        return int(float(_setting("AI_MODEL_STORE_MAX_MB", AI_MODEL_STORE_MAX_MB)) * 1024 * 1024)
+
+    def _path(self, target: str, series_key: str, config_hash: str) -> Path:
+        digest = hashlib.sha1(f"{target}|{series_key}|{config_hash}".encode("utf-8")).hexdigest()
+        return self.root / f"{digest}.json"
+
+    def _bump(self, k: str) -> None:
+        with self._lock:
+            self._stats[k] += 1
+
+    # ---------- 读写 ----------
+    def load(self, target: str, series_key: str, config_hash: str) -> Optional[Dict[str, Any]]:
+        self._bump("loads")
+        p = self._path(target, series_key, config_hash)
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            os.utime(p, None)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._bump("errors")
+            return None
+        state = doc.get("state") if isinstance(doc, dict) else None
+        if not isinstance(state, dict):
+            return None
+        self._bump("hits")
+        return state
+
+    def save(self, target: str, series_key: str, config_hash: str, state: Dict[str, Any]) -> None:
+        p = self._path(target, series_key, config_hash)
+        doc = {
+            "target": target,
+            "series_key": series_key,
+            "config_hash": config_hash,
+            "saved_at": int(time.time()),
+            "state": state,
+        }
+        try:
+            data = json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            if len(data) > self.max_bytes:
+                return
+            p.parent.mkdir(parents=True, exist_ok=True)
+            old = p.stat().st_size if p.exists() else 0
+            tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, p)
+        except Exception:
+            self._bump("errors")
+            return
+
+        with self._lock:
+            self._stats["saves"] += 1
+            if self._approx_bytes is not None:
+                self._approx_bytes += len(data) - old
+            need_scan = self._approx_bytes is None or self._approx_bytes > self.max_bytes
+        if need_scan:
+            self._evict()
+
+    def _scan(self) -> List[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(self.root) if e.is_file() and e.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def _evict(self) -> None:
+        entries = []
+        for e in self._scan():
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _m, size, _p in entries)
+        evicted = 0
+        if total > self.max_bytes:
+            goal = int(self.max_bytes * MODEL_STORE_EVICT_RATIO)
+            for _mtime, size, path in sorted(entries):
+                if total <= goal:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    evicted += 1
+                except FileNotFoundError:
+                    total -= size
+                except Exception:
+                    continue
+        with self._lock:
+            self._approx_bytes = total
+            self._stats["evictions"] += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        files = self._scan()
+        size = 0
+        for e in files:
+            try:
+                size += e.stat().st_size
+            except FileNotFoundError:
+                continue
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out.update({"dir": str(self.root), "files": len(files), "bytes": size, "max_bytes": self.max_bytes})
+        return out
+
+
+model_store = ModelStore()
+
+
+# ---------- 冷 / 热拟合耗时 ----------
+_fit_lock = threading.Lock()
+_fit_ms: Dict[str, Deque[float]] = {"cold": deque(maxlen=1024), "warm": deque(maxlen=1024)}
+_fit_count: Dict[str, int] = {"cold": 0, "warm": 0}
+
+
+def _note_parts(note: str) -> Dict[str, str]:
+    return dict(p.split("=", 1) for p in str(note or "").split("|") if "=" in p)
+
+
+def record_fit(note: str) -> None:
+    parts = _note_parts(note)
+    mode = parts.get("fit")
+    if mode not in _fit_ms:
+        return
+    try:
+        ms = float(parts.get("fit_ms") or 0)
+    except ValueError:
+        return
+    with _fit_lock:
+        _fit_ms[mode].append(ms)
+        _fit_count[mode] += 1
+
+
+def fit_meta(note: str) -> Dict[str, Any]:
+    """响应 meta.fit：本次正式拟合是冷启动还是热启动、耗时"""
+    parts = _note_parts(note)
+    try:
+        ms = int(parts.get("fit_ms") or 0)
+    except ValueError:
+        ms = 0
+    return {"mode": parts.get("fit") or "none", "ms": ms}
+
+
+def _pct(vals: List[float], p: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return round(vals[min(len(vals) - 1, int(len(vals) * p))], 2)
+
+
+def model_store_stats() -> Dict[str, Any]:
+    out = model_store.stats()
+    out["enabled"] = model_store_enabled()
+    with _fit_lock:
+        fits = {k: (list(v), _fit_count[k]) for k, v in _fit_ms.items()}
+    out["fit_ms"] = {
+        k: {"count": n, "p50": _pct(vals, 0.5), "p95": _pct(vals, 0.95)} for k, (vals, n) in fits.items()
+    }
+    return out
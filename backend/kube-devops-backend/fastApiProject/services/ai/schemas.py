@@ -89,6 +89,25 @@ class PodCpuForecastResp(BaseModel):
     meta: Dict[str, Any] = Field(default_factory=dict)
 
 
+class PodCpuBatchItem(BaseModel):
+    pod: str
+    history: List[TsPoint]
+    forecast: List[BandPoint]
+    metrics: ErrorMetrics
+    timings_ms: Dict[str, int] = Field(default_factory=dict)
+
+
+class PodCpuBatchForecastResp(BaseModel):
+    namespace: str
+    deployment: Optional[str] = None
+    history_minutes: int
+    horizon_minutes: int
+    step: int
+    forecasts: Dict[str, PodCpuBatchItem] = Field(default_factory=dict)
+    failures: Dict[str, str] = Field(default_factory=dict)
+    meta: Dict[str, Any] = Field(default_factory=dict)
+
+
 class AnomalyPoint(BaseModel):
     ts: int
     actual: float
@@ -0,0 +1,218 @@
+# services/ai/series_cache.py
+"""
+range query 增量段缓存：预测每次要 240 分钟历史，但两次调用之间只多了最后几个 step
+
+- 按 (PROMETHEUS_BASE, promql, step) 保存一段对齐到 step 网格的样本（NumPy 数组）
+- 请求来时只对“未覆盖区间”发 query_range：头部缺口 + 尾部缺口
+- 尾部边缘不稳定（抓取延迟 / rate 窗口未满 / 晚到样本）：上次拉取时刻往前 SERIES_CACHE_EDGE_SEC 的点每次重拉覆盖
+- 合并时按 ts 去重，新拉的覆盖旧的；乱序样本排序后再切片
+- 淘汰：空闲超过 SERIES_CACHE_IDLE_SEC；总字节超过 SERIES_CACHE_MAX_BYTES 按 LRU 丢
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SERIES_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SERIES_CACHE_IDLE_SEC = 3600
+SERIES_CACHE_EDGE_SEC = 120
+SERIES_CACHE_MAX_SPAN_SEC = 7 * 24 * 3600
+
+FetchFn = Callable[[str, int, int, int], List[Tuple[int, float]]]
+
+
+class _Segment:
+    __slots__ = ("ts", "vals", "cov_start", "cov_end", "fetched_at", "last_access")
+
+    def __init__(self) -> None:
+        self.ts = np.empty(0, dtype=np.int64)
+        self.vals = np.empty(0, dtype=np.float64)
+        # 已覆盖区间（闭区间，step 网格上）；区间内没有样本 = Prometheus 确实没数据
+        self.cov_start = 0
+        self.cov_end = -1
+        self.fetched_at = 0.0
+        self.last_access = 0.0
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ts.nbytes + self.vals.nbytes)
+
+    def empty(self) -> bool:
+        return self.cov_end < self.cov_start
+
+
+def _to_arrays(points: List[Tuple[int, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    if not points:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    arr = np.asarray(points, dtype=np.float64)
+    return arr[:, 0].astype(np.int64), arr[:, 1]
+
+
+class SeriesSegmentCache:
+    def __init__(
+        self,
+        max_bytes: int = SERIES_CACHE_MAX_BYTES,
+        idle_sec: int = SERIES_CACHE_IDLE_SEC,
+        edge_sec: int = SERIES_CACHE_EDGE_SEC,
+    ) -> None:
+        self.max_bytes = int(max_bytes)
+        self.idle_sec = int(idle_sec)
+        self.edge_sec = int(edge_sec)
+        self._lock = threading.Lock()
+        self._segs: "OrderedDict[Tuple[str, str, int], _Segment]" = OrderedDict()
+        self._bytes = 0
+        self._stats: Dict[str, int] = {
+            "requests": 0,
+            "full_fetches": 0,
+            "partial_fetches": 0,
+            "served_from_cache": 0,
+            "points_fetched": 0,
+            "points_served": 0,
+            "evictions": 0,
+        }
+
+    # ---------- 区间计算 ----------
+    def _gaps(self, seg: Optional[_Segment], a_start: int, a_end: int, step: int) -> Tuple[bool, List[Tuple[int, int]]]:
+        """
+        returns: (是否整段重拉, 需要拉取的区间列表)
+        """
+        if seg is None or seg.empty():
+            return True, [(a_start, a_end)]
+        # 与已覆盖区间不相交（或隔得太远）：整段重拉
+        if a_start > seg.cov_end + step or a_end < seg.cov_start - step:
+            return True, [(a_start, a_end)]
+
+        gaps: List[Tuple[int, int]] = []
+        if a_start < seg.cov_start:
+            gaps.append((a_start, seg.cov_start - step))
+
+        # 上次拉取时尚不稳定的尾部：从 fetched_at - edge 起重拉
+        unstable_from = int((seg.fetched_at - self.edge_sec) // step) * step
+        tail_from = min(seg.cov_end + step, max(unstable_from, seg.cov_start))
+        if a_end >= tail_from:
+            gaps.append((max(tail_from, a_start), a_end))
+        return False, [(s, e) for s, e in gaps if e >= s]
+
+    # ---------- 合并 / 淘汰 ----------
+    def _merge(self, seg: _Segment, start: int, end: int, points: List[Tuple[int, float]]) -> None:
+        new_ts, new_vals = _to_arrays(points)
+        # 新拉区间内的旧点全部作废（包括这次已经没有的点：晚到 staleness marker）
+        keep = (seg.ts < start) | (seg.ts > end)
+        ts = np.concatenate([seg.ts[keep], new_ts])
+        vals = np.concatenate([seg.vals[keep], new_vals])
+        if ts.size:
+            order = np.argsort(ts, kind="stable")
+            ts = ts[order]
+            vals = vals[order]
+            # 同一 ts 保留最后一个（新拉的排在后面）
+            last = np.ones(ts.size, dtype=bool)
+            last[:-1] = ts[1:] != ts[:-1]
+            ts = ts[last]
+            vals = vals[last]
+        seg.ts = ts
+        seg.vals = vals
+        if seg.empty():
+            seg.cov_start, seg.cov_end = start, end
+        else:
+            seg.cov_start = min(seg.cov_start, start)
+            seg.cov_end = max(seg.cov_end, end)
+
+    def _trim(self, seg: _Segment) -> None:
+        if seg.empty():
+            return
+        lo = seg.cov_end - SERIES_CACHE_MAX_SPAN_SEC
+        if seg.cov_start < lo:
+            keep = seg.ts >= lo
+            seg.ts = seg.ts[keep]
+            seg.vals = seg.vals[keep]
+            seg.cov_start = lo
+
+    def _evict_locked(self, now: float) -> None:
+        for k in [k for k, s in self._segs.items() if now - s.last_access > self.idle_sec]:
+            self._bytes -= self._segs.pop(k).nbytes
+            self._stats["evictions"] += 1
+        while self._segs and self._bytes > self.max_bytes:
+            _k, s = self._segs.popitem(last=False)
+            self._bytes -= s.nbytes
+            self._stats["evictions"] += 1
+
+    # ---------- 对外 ----------
+    def get_range(
+        self,
+        base: str,
+        promql: str,
+        start: float,
+        end: float,
+        step: int,
+        fetch: FetchFn,
+    ) -> List[Tuple[int, float]]:
+        step = max(1, int(step))
+        a_start = int(float(start) // step) * step
+        a_end = max(a_start, int(float(end) // step) * step)
+        key = (str(base or ""), str(promql or ""), step)
+        now = time.time()
+
+        with self._lock:
+            self._stats["requests"] += 1
+            seg = self._segs.get(key)
+            full, gaps = self._gaps(seg, a_start, a_end, step)
+
+        # 网络请求不持锁
+        fetched: List[Tuple[int, int, List[Tuple[int, float]]]] = []
+        for g_start, g_end in gaps:
+            pts = fetch(promql, g_start, g_end, step)
+            fetched.append((g_start, g_end, pts))
+
+        with self._lock:
+            seg = self._segs.get(key)
+            if seg is None or full:
+                if seg is not None:
+                    self._bytes -= seg.nbytes
+                seg = _Segment()
+                self._stats["full_fetches"] += 1
+            else:
+                self._bytes -= seg.nbytes
+                if fetched:
+                    self._stats["partial_fetches"] += 1
+                else:
+                    self._stats["served_from_cache"] += 1
+
+            for g_start, g_end, pts in fetched:
+                self._merge(seg, g_start, g_end, pts)
+                self._stats["points_fetched"] += len(pts)
+            # 只有尾部被重拉过才推进“稳定边缘”
+            if fetched and max(g_end for _s, g_end, _p in fetched) >= seg.cov_end:
+                seg.fetched_at = now
+            self._trim(seg)
+            seg.last_access = now
+
+            self._segs[key] = seg
+            self._segs.move_to_end(key)
+            self._bytes += seg.nbytes
+
+            lo = int(np.searchsorted(seg.ts, a_start, side="left"))
+            hi = int(np.searchsorted(seg.ts, a_end, side="right"))
+            out = list(zip(seg.ts[lo:hi].tolist(), seg.vals[lo:hi].tolist()))
+            self._stats["points_served"] += len(out)
+
+            self._evict_locked(now)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._segs.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["segments"] = len(self._segs)
+            out["bytes"] = self._bytes
+            out["max_bytes"] = self.max_bytes
+        served = out["points_served"]
+        out["fetch_ratio"] = round(out["points_fetched"] / served, 4) if served else 0.0
+        return out
@@ -0,0 +1,177 @@
+# services/alerts/grouping.py
+"""
+告警分组 / 风暴抑制（通知按组发，不再一条告警一条通知）
+
+- 分组：告警写入时按 ALERT_GROUP_BY 标签集合算 group_key（db.alerts.repo.alert_group_key），
+  alert_groups 在同一事务里维护 firing / total 成员数；节点故障导致的一批 Pod 告警落到同一个组
+- 只有成员新增 / 状态变化才把组标记为 dirty（Alertmanager 重复推送相同告警不算）
+- 发送节奏（语义同 Alertmanager）：
+  - group_wait：新组等这么久再发第一条，期间到达的同组告警一起发
+  - group_interval：组发过之后再有变化，至少隔这么久再发
+  - repeat：仍在 firing 且没有变化，隔 ALERT_GROUP_REPEAT_SEC 再提醒一次
+- 一次通知 = 一条组消息（成员数 + 前 ALERT_GROUP_SAMPLE 个成员），交给 feishu_dispatcher 限速发送
+- 从未通知过就已全部恢复的组不再发送
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from db.alerts.group_repo import (
+    alert_group_counts,
+    due_alert_groups,
+    group_members_sample,
+    mark_groups_notified,
+    next_group_due_at,
+)
+from db.alerts.repo import GROUP_FINGERPRINT_PREFIX, backfill_alert_group_keys
+
+ALERT_GROUP_INTERVAL_SEC = 300
+ALERT_GROUP_REPEAT_SEC = 4 * 3600
+ALERT_GROUP_SAMPLE = 10
+ALERT_GROUP_FLUSH_BATCH = 200
+ALERT_GROUP_IDLE_SEC = 5.0
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def grouping_enabled() -> bool:
+    return bool(_setting("ALERT_GROUPING_ENABLED", True))
+
+
+def _group_payload(group: Dict[str, Any], members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    labels = dict(group.get("labels") or {})
+    firing = int(group.get("firing_count") or 0)
+    total = int(group.get("total_count") or 0)
+    return {
+        "fingerprint": GROUP_FINGERPRINT_PREFIX + str(group["group_key"]),
+        "status": "firing" if firing else "resolved",
+        "labels": labels,
+        "annotations": {"summary": f"{firing} firing / {total} alerts"},
+        "source": "group",
+        "group": {
+            "key": str(group["group_key"]),
+            "firing": firing,
+            "total": total,
+            "first_seen": int(group.get("first_seen") or 0),
+            "members": [{"status": m["status"], "labels": m["labels"]} for m in members],
+        },
+    }
+
+
+class AlertGrouper:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats: Dict[str, int] = {"flushes": 0, "notified_groups": 0, "skipped_resolved": 0, "backfilled": 0}
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="alert-grouper", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        t = self._thread
+        if t is not None:
+            t.join(timeout=timeout)
+        self._thread = None
+
+    def _loop(self) -> None:
+        try:
+            n = backfill_alert_group_keys()
+            with self._lock:
+                self._stats["backfilled"] += n
+        except Exception as e:
+            print(f"alert_grouper backfill error={e}")
+
+        while not self._stop.is_set():
+            try:
+                self.flush()
+                due = next_group_due_at()
+            except Exception as e:
+                print(f"alert_grouper flush error={e}")
+                due = 0
+            timeout = ALERT_GROUP_IDLE_SEC
+            if due:
+                timeout = min(timeout, max(0.2, due - time.time()))
+            if self._wake.wait(timeout):
+                self._wake.clear()
+
+    def flush(self, now: Optional[int] = None) -> int:
+        """发送所有到期组；返回发出的组通知数"""
+        from services.notification.feishu_client import push_group_async
+
+        now = int(now if now is not None else time.time())
+        groups = due_alert_groups(now=now, limit=ALERT_GROUP_FLUSH_BATCH)
+        if not groups:
+            return 0
+
+        sample = max(1, int(_setting("ALERT_GROUP_SAMPLE", ALERT_GROUP_SAMPLE)))
+        done: List[Tuple[str, int, bool, bool]] = []
+        sent = skipped = 0
+        for g in groups:
+            firing = int(g["firing_count"]) > 0
+            if not firing and int(g["last_notified_at"]) == 0:
+                done.append((g["group_key"], int(g["version"]), firing, False))
+                skipped += 1
+                continue
+            push_group_async(_group_payload(g, group_members_sample(g["group_key"], limit=sample)))
+            done.append((g["group_key"], int(g["version"]), firing, True))
+            sent += 1
+
+        mark_groups_notified(
+            done,
+            now=now,
+            interval_sec=int(_setting("ALERT_GROUP_INTERVAL_SEC", ALERT_GROUP_INTERVAL_SEC)),
+            repeat_sec=int(_setting("ALERT_GROUP_REPEAT_SEC", ALERT_GROUP_REPEAT_SEC)),
+        )
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["notified_groups"] += sent
+            self._stats["skipped_resolved"] += skipped
+        return sent
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["enabled"] = grouping_enabled()
+        out["running"] = self._thread is not None and self._thread.is_alive()
+        try:
+            out["groups"] = alert_group_counts()
+        except Exception:
+            out["groups"] = {}
+        return out
+
+
+alert_grouper = AlertGrouper()
+
+
+def start_alert_grouper() -> None:
+    if grouping_enabled():
+        alert_grouper.start()
+
+
+def stop_alert_grouper() -> None:
+    alert_grouper.stop()
+
+
+def alert_grouping_stats() -> Dict[str, Any]:
+    return alert_grouper.stats()
@@ -0,0 +1,104 @@
+# services/alerts/ingest.py
+"""
+Alertmanager webhook 入库
+
+- 一个 webhook payload = 一次 upsert_alerts_bulk（executemany ... ON CONFLICT，单事务）
+- 在线程池里执行（asyncio.to_thread），不阻塞事件循环；提交完成（已落盘）后才应答 Alertmanager，
+  失败返回 5xx 让 Alertmanager 重发
+- 通知（飞书）在落盘之后投递，不占用应答时间
+- 吞吐指标：payload / 告警数、入库耗时分位、最近 60s 告警速率
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from db.alerts.repo import normalize_fingerprint, upsert_alerts_bulk
+from services.notification.feishu_client import push_alert_async
+
+INGEST_RATE_WINDOW_SEC = 60
+
+_lock = threading.Lock()
+_stats: Dict[str, int] = {"payloads": 0, "alerts": 0, "skipped": 0, "failed_payloads": 0, "max_batch": 0}
+_recent: Deque[Tuple[float, int, float]] = deque(maxlen=1024)  # (ts, 条数, 入库 ms)
+
+
+def parse_webhook_alerts(alerts: List[Any]) -> Tuple[List[Dict[str, Any]], int]:
+    """Alertmanager alerts[] → 入库行；返回 (rows, skipped)"""
+    rows: List[Dict[str, Any]] = []
+    skipped = 0
+    for a in alerts:
+        if not isinstance(a, dict):
+            skipped += 1
+            continue
+        labels = a.get("labels") or {}
+        annotations = a.get("annotations") or {}
+        labels = labels if isinstance(labels, dict) else {}
+        annotations = annotations if isinstance(annotations, dict) else {}
+        rows.append(
+            {
+                "fingerprint": normalize_fingerprint(fingerprint=a.get("fingerprint"), labels=labels),
+                "status": str(a.get("status") or "") or "firing",
+                "labels": labels,
+                "annotations": annotations,
+                "starts_at": str(a.get("startsAt") or ""),
+                "ends_at": str(a.get("endsAt") or ""),
+                "source": "alertmanager",
+            }
+        )
+    return rows, skipped
+
+
+def ingest_alerts(rows: List[Dict[str, Any]], *, skipped: int = 0) -> int:
+    """同步入库（调用方负责放到线程里）；返回入库条数，失败抛异常"""
+    t0 = time.perf_counter()
+    try:
+        n = upsert_alerts_bulk(rows, wait=True)
+    except Exception:
+        with _lock:
+            _stats["failed_payloads"] += 1
+        raise
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    with _lock:
+        _stats["payloads"] += 1
+        _stats["alerts"] += n
+        _stats["skipped"] += skipped
+        _stats["max_batch"] = max(_stats["max_batch"], n)
+        _recent.append((time.time(), n, elapsed_ms))
+
+    for r in rows:
+        push_alert_async(dict(r))
+    return n
+
+
+async def ingest_webhook(alerts: List[Any]) -> Dict[str, Any]:
+    rows, skipped = parse_webhook_alerts(alerts)
+    n = await asyncio.to_thread(ingest_alerts, rows, skipped=skipped) if rows else 0
+    return {"upserted": n, "skipped": skipped}
+
+
+def _pct(vals: List[float], p: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return round(vals[min(len(vals) - 1, int(len(vals) * p))], 2)
+
+
+def ingest_stats() -> Dict[str, Any]:
+    now = time.time()
+    with _lock:
+        out: Dict[str, Any] = dict(_stats)
+        recent = list(_recent)
+    ms = [m for _ts, _n, m in recent]
+    total_ms = sum(ms)
+    out["ingest_ms"] = {"p50": _pct(ms, 0.5), "p95": _pct(ms, 0.95), "p99": _pct(ms, 0.99)}
+    out["avg_batch"] = round(out["alerts"] / out["payloads"], 2) if out["payloads"] else 0.0
+    # 最近窗口的到达速率 / 入库本身的吞吐（条数 ÷ 入库耗时）
+    out["alerts_per_sec"] = round(
+        sum(n for ts, n, _m in recent if now - ts <= INGEST_RATE_WINDOW_SEC) / float(INGEST_RATE_WINDOW_SEC), 3
+    )
+    out["write_alerts_per_sec"] = round(sum(n for _ts, n, _m in recent) / (total_ms / 1000.0), 1) if total_ms else 0.0
+    return out
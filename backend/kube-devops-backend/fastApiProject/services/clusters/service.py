@@ -9,6 +9,7 @@ from fastapi import HTTPException
 
 from db.utils.sqlite import get_conn, q
 from services.k8s.kube_client import validate_kubeconfig_content
+from services.ops.runtime_config import bump_config_version
 
 
 def list_clusters() -> List[Dict[str, Any]]:
@@ -188,6 +189,8 @@ def activate_cluster(cluster_id: int) -> Dict[str, Any]:
         )
 
         conn.commit()
+        # ✅ ops_config 被直接改写：让 runtime_config 快照失效
+        bump_config_version()
 
         return {
             "ok": True,
@@ -8,6 +8,7 @@ from kubernetes.client.rest import ApiException
 
 from services.inspect.models import InspectItem
 from services.k8s.kube_client import get_core_v1, get_apps_v1
+from services.k8s.informer import cached_list
 
 # Prometheus 可选
 try:
@@ -110,8 +111,9 @@ def check_nodes_ready() -> InspectItem:
     need = "list nodes"
 
     try:
-        v1 = get_core_v1()
-        nodes = v1.list_node().items
+        nodes = cached_list("nodes")
+        if nodes is None:
+            nodes = get_core_v1().list_node().items
 
         total = len(nodes)
         not_ready: List[str] = []
@@ -233,8 +235,11 @@ def check_pods_abnormal(limit: int = 2000) -> InspectItem:
     need = "list pods (all namespaces)"
 
     try:
-        v1 = get_core_v1()
-        pods = v1.list_pod_for_all_namespaces(watch=False, limit=limit).items
+        pods = cached_list("pods")
+        if pods is None:
+            pods = get_core_v1().list_pod_for_all_namespaces(watch=False, limit=limit).items
+        else:
+            pods = pods[:limit]
 
         crash: List[str] = []
         imagepull: List[str] = []
@@ -308,8 +313,11 @@ def check_events_warnings(limit: int = 2000) -> InspectItem:
     need = "list events (all namespaces)"
 
     try:
-        v1 = get_core_v1()
-        evs = v1.list_event_for_all_namespaces(limit=limit).items  # type: ignore
+        evs = cached_list("events")
+        if evs is None:
+            evs = get_core_v1().list_event_for_all_namespaces(limit=limit).items  # type: ignore
+        else:
+            evs = evs[:limit]
 
         warn = []
         for ev in evs:
@@ -0,0 +1,451 @@
+# services/k8s/informer.py
+"""
+共享 informer：list + watch 维护内存快照，替代每个请求一次全量 LIST
+
+- 每种资源（pods/nodes/deployments/events）一个后台线程：先 LIST 拿 resourceVersion，再 watch 增量
+- watch 超时自然断开 -> 用最新 resourceVersion 续 watch；410 Gone -> 重新 LIST
+- 内存索引：namespace / node（pod.spec.nodeName）/ owner uid
+- runtime_config 按资源开关（INFORMER_*_ENABLED），未开启 / 未同步 / 过期 -> cached_* 返回 None，调用方回退直接 LIST
+- 切换集群（kube_client 重建 client）后自动重建 informer
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from config import settings
+from services.k8s.kube_client import get_apps_v1, get_core_v1
+
+INFORMER_WATCH_TIMEOUT_SEC = 300
+INFORMER_MAX_STALE_SEC = 180
+INFORMER_RECONCILE_SEC = 5
+INFORMER_BACKOFF_MAX_SEC = 30
+INFORMER_RATE_WINDOW_SEC = 60
+
+Key = Tuple[str, str]
+
+
+class _Gone(Exception):
+    """watch 返回 410：resourceVersion 太旧，需要重新 LIST"""
+
+
+def _cfg_bool(key: str) -> bool:
+    try:
+        from services.ops.runtime_config import get_value  # type: ignore
+
+        v, _src = get_value(key)
+        return bool(v)
+    except Exception:
+        return bool(getattr(settings, key, False))
+
+
+def _obj_key(obj: Any) -> Key:
+    md = getattr(obj, "metadata", None)
+    return (str(getattr(md, "namespace", "") or ""), str(getattr(md, "name", "") or ""))
+
+
+def _owner_uids(obj: Any) -> Tuple[str, ...]:
+    md = getattr(obj, "metadata", None)
+    refs = getattr(md, "owner_references", None) or []
+    return tuple(str(getattr(r, "uid", "") or "") for r in refs if getattr(r, "uid", None))
+
+
+def _pod_node(obj: Any) -> str:
+    return str(getattr(getattr(obj, "spec", None), "node_name", "") or "")
+
+
+class Informer:
+    def __init__(
+        self,
+        kind: str,
+        cfg_key: str,
+        get_api: Callable[[], Any],
+        list_attr: str,
+        node_of: Optional[Callable[[Any], str]] = None,
+    ) -> None:
+        self.kind = kind
+        self.cfg_key = cfg_key
+        self._get_api = get_api
+        self._list_attr = list_attr
+        self._node_of = node_of
+
+        self._lock = threading.RLock()
+        self._store: Dict[Key, Any] = {}
+        self._by_ns: Dict[str, Set[Key]] = {}
+        self._by_node: Dict[str, Set[Key]] = {}
+        self._by_owner: Dict[str, Set[Key]] = {}
+        self._idx: Dict[Key, Tuple[str, str, Tuple[str, ...]]] = {}
+
+        self.api: Any = None
+        self.rv: str = ""
+        self.synced = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._watch: Optional[watch.Watch] = None
+
+        self.last_sync_at = 0.0
+        self.last_list_at = 0.0
+        self.last_list_ms = 0
+        self.events_total = 0
+        self.relists = 0
+        self.errors = 0
+        self.last_error = ""
+        self._event_ts: Deque[float] = deque(maxlen=20000)
+
+    # ---------- store ----------
+    def _index_add(self, key: Key, obj: Any) -> None:
+        ns = key[0]
+        node = self._node_of(obj) if self._node_of else ""
+        owners = _owner_uids(obj)
+        self._idx[key] = (ns, node, owners)
+        self._by_ns.setdefault(ns, set()).add(key)
+        if node:
+            self._by_node.setdefault(node, set()).add(key)
+        for uid in owners:
+            self._by_owner.setdefault(uid, set()).add(key)
+
+    def _index_del(self, key: Key) -> None:
+        old = self._idx.pop(key, None)
+        if not old:
+            return
+        ns, node, owners = old
+        for idx, k in ((self._by_ns, ns), (self._by_node, node)):
+            s = idx.get(k)
+            if s is not None:
+                s.discard(key)
+                if not s:
+                    idx.pop(k, None)
+        for uid in owners:
+            s = self._by_owner.get(uid)
+            if s is not None:
+                s.discard(key)
+                if not s:
+                    self._by_owner.pop(uid, None)
+
+    def _put(self, obj: Any) -> None:
+        key = _obj_key(obj)
+        self._index_del(key)
+        self._store[key] = obj
+        self._index_add(key, obj)
+
+    def _delete(self, obj: Any) -> None:
+        key = _obj_key(obj)
+        self._index_del(key)
+        self._store.pop(key, None)
+
+    def _replace(self, items: List[Any]) -> None:
+        with self._lock:
+            self._reset_locked(items)
+
+    def _reset_locked(self, items: List[Any]) -> None:
+        self._store = {}
+        self._by_ns = {}
+        self._by_node = {}
+        self._by_owner = {}
+        self._idx = {}
+        for obj in items:
+            self._put(obj)
+
+    def clear(self) -> None:
+        self._replace([])
+        with self._lock:
+            self.synced = False
+            self.rv = ""
+
+    # ---------- list / watch ----------
+    def _list_fn(self) -> Callable[..., Any]:
+        return getattr(self.api, self._list_attr)
+
+    def _list(self, stop: threading.Event) -> None:
+        t0 = time.time()
+        resp = self._list_fn()(watch=False)
+        items = list(resp.items or [])
+        now = time.time()
+        with self._lock:
+            # 已被 stop（切集群/关闭）：丢弃这次结果，避免旧集群数据覆盖新快照
+            if stop.is_set():
+                return
+            self._reset_locked(items)
+            self.rv = str(getattr(resp.metadata, "resource_version", "") or "")
+            self.synced = True
+            self.last_list_at = now
+            self.last_sync_at = now
+            self.last_list_ms = int((now - t0) * 1000)
+
+    def _watch_until_gone(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            w = watch.Watch()
+            self._watch = w
+            try:
+                for ev in w.stream(
+                    self._list_fn(),
+                    resource_version=self.rv,
+                    timeout_seconds=INFORMER_WATCH_TIMEOUT_SEC,
+                    allow_watch_bookmarks=True,
+                ):
+                    if stop.is_set():
+                        w.stop()
+                        return
+                    self._on_event(ev, stop)
+            except ApiException as e:
+                if int(getattr(e, "status", 0) or 0) == 410:
+                    raise _Gone()
+                raise
+            finally:
+                self._watch = None
+            # 服务端 timeout 正常断开：用最新 rv 续 watch
+            with self._lock:
+                if not stop.is_set():
+                    self.last_sync_at = time.time()
+
+    def _on_event(self, ev: Dict[str, Any], stop: threading.Event) -> None:
+        typ = str(ev.get("type") or "")
+        raw = ev.get("raw_object") or {}
+        now = time.time()
+
+        if typ == "ERROR":
+            code = int((raw or {}).get("code") or 0) if isinstance(raw, dict) else 0
+            if code == 410:
+                raise _Gone()
+            raise RuntimeError(f"watch error: {raw}")
+
+        if typ == "BOOKMARK":
+            rv = ""
+            if isinstance(raw, dict):
+                rv = str(((raw.get("metadata") or {}).get("resourceVersion")) or "")
+            with self._lock:
+                if stop.is_set():
+                    return
+                if rv:
+                    self.rv = rv
+                self.last_sync_at = now
+            return
+
+        obj = ev.get("object")
+        if obj is None:
+            return
+        with self._lock:
+            if stop.is_set():
+                return
+            if typ == "DELETED":
+                self._delete(obj)
+            else:
+                self._put(obj)
+            rv = str(getattr(getattr(obj, "metadata", None), "resource_version", "") or "")
+            if rv:
+                self.rv = rv
+            self.last_sync_at = now
+            self.events_total += 1
+            self._event_ts.append(now)
+
+    def _run(self, stop: threading.Event) -> None:
+        backoff = 1.0
+        first = True
+        while not stop.is_set():
+            try:
+                if not first:
+                    with self._lock:
+                        self.relists += 1
+                first = False
+                self._list(stop)
+                backoff = 1.0
+                self._watch_until_gone(stop)
+            except _Gone:
+                continue
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                    self.last_error = str(e)[:300]
+                stop.wait(backoff)
+                backoff = min(backoff * 2, float(INFORMER_BACKOFF_MAX_SEC))
+
+    # ---------- lifecycle ----------
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self, api: Any) -> None:
+        self.stop()
+        self.clear()
+        self.api = api
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name=f"informer-{self.kind}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        w = self._watch
+        if w is not None:
+            try:
+                w.stop()
+            except Exception:
+                pass
+        self._thread = None
+
+    # ---------- read ----------
+    def staleness_sec(self) -> float:
+        with self._lock:
+            if not self.last_sync_at:
+                return -1.0
+            return max(0.0, time.time() - self.last_sync_at)
+
+    def usable(self) -> bool:
+        if not self.running() or not self.synced:
+            return False
+        return 0 <= self.staleness_sec() <= INFORMER_MAX_STALE_SEC
+
+    def list(self, namespace: Optional[str] = None) -> List[Any]:
+        # 与 LIST 返回顺序保持一致：按 (namespace, name) 排序
+        with self._lock:
+            if namespace:
+                keys = sorted(self._by_ns.get(namespace, ()))
+            else:
+                keys = sorted(self._store.keys())
+            return [self._store[k] for k in keys if k in self._store]
+
+    def by_node(self, node: str) -> List[Any]:
+        with self._lock:
+            return [self._store[k] for k in self._by_node.get(node, ()) if k in self._store]
+
+    def by_owner(self, uid: str) -> List[Any]:
+        with self._lock:
+            return [self._store[k] for k in self._by_owner.get(uid, ()) if k in self._store]
+
+    def count_by_node(self) -> Dict[str, int]:
+        with self._lock:
+            return {k: len(v) for k, v in self._by_node.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            recent = sum(1 for t in self._event_ts if now - t <= INFORMER_RATE_WINDOW_SEC)
+            return {
+                "enabled": _cfg_bool(self.cfg_key),
+                "running": self.running(),
+                "synced": self.synced,
+                "items": len(self._store),
+                "resource_version": self.rv,
+                "staleness_sec": round(now - self.last_sync_at, 3) if self.last_sync_at else None,
+                "events_total": self.events_total,
+                "events_per_sec": round(recent / float(INFORMER_RATE_WINDOW_SEC), 3),
+                "relists": self.relists,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "last_list_ms": self.last_list_ms,
+            }
+
+
+_INFORMERS: Dict[str, Informer] = {
+    "pods": Informer("pods", "INFORMER_PODS_ENABLED", get_core_v1, "list_pod_for_all_namespaces", node_of=_pod_node),
+    "nodes": Informer("nodes", "INFORMER_NODES_ENABLED", get_core_v1, "list_node"),
+    "deployments": Informer("deployments", "INFORMER_DEPLOYMENTS_ENABLED", get_apps_v1, "list_deployment_for_all_namespaces"),
+    "events": Informer("events", "INFORMER_EVENTS_ENABLED", get_core_v1, "list_event_for_all_namespaces"),
+}
+
+_mgr_thread: Optional[threading.Thread] = None
+_mgr_stop = threading.Event()
+_mgr_lock = threading.Lock()
+
+
+def _reconcile_once() -> None:
+    for inf in _INFORMERS.values():
+        enabled = _cfg_bool(inf.cfg_key)
+        if not enabled:
+            if inf.running() or inf.synced:
+                inf.stop()
+                inf.clear()
+            continue
+        try:
+            api = inf._get_api()
+        except Exception as e:
+            inf.last_error = str(e)[:300]
+            continue
+        # ✅ 切换集群后 kube_client 会重建 client 对象：旧快照作废，重新 list/watch
+        if not inf.running() or inf.api is not api:
+            inf.start(api)
+
+
+def _manager_loop() -> None:
+    while not _mgr_stop.is_set():
+        try:
+            _reconcile_once()
+        except Exception as e:
+            print(f"informer reconcile error: {e}")
+        _mgr_stop.wait(INFORMER_RECONCILE_SEC)
+
+
+def start_informers() -> None:
+    global _mgr_thread
+    with _mgr_lock:
+        if _mgr_thread is not None and _mgr_thread.is_alive():
+            return
+        _mgr_stop.clear()
+        _mgr_thread = threading.Thread(target=_manager_loop, name="informer-manager", daemon=True)
+        _mgr_thread.start()
+
+
+def stop_informers() -> None:
+    global _mgr_thread
+    _mgr_stop.set()
+    with _mgr_lock:
+        _mgr_thread = None
+    for inf in _INFORMERS.values():
+        inf.stop()
+
+
+def _usable(kind: str) -> Optional[Informer]:
+    inf = _INFORMERS.get(kind)
+    if inf is None or not _cfg_bool(inf.cfg_key) or not inf.usable():
+        return None
+    # 集群已切换但 informer 还没重建：不读旧集群快照
+    try:
+        if inf.api is not inf._get_api():
+            return None
+    except Exception:
+        return None
+    return inf
+
+
+def cached_list(kind: str, namespace: Optional[str] = None) -> Optional[List[Any]]:
+    """
+    快照读：返回对象列表；None 表示缓存不可用，调用方回退直接 LIST
+    """
+    inf = _usable(kind)
+    if inf is None:
+        return None
+    return inf.list(namespace)
+
+
+def cached_by_node(kind: str, node: str) -> Optional[List[Any]]:
+    inf = _usable(kind)
+    if inf is None:
+        return None
+    return inf.by_node(node)
+
+
+def cached_by_owner(kind: str, uid: str) -> Optional[List[Any]]:
+    inf = _usable(kind)
+    if inf is None:
+        return None
+    return inf.by_owner(uid)
+
+
+def cached_count_by_node(kind: str = "pods") -> Optional[Dict[str, int]]:
+    inf = _usable(kind)
+    if inf is None:
+        return None
+    return inf.count_by_node()
+
+
+def informer_stats() -> Dict[str, Any]:
+    return {
+        "running": _mgr_thread is not None and _mgr_thread.is_alive(),
+        "max_stale_sec": INFORMER_MAX_STALE_SEC,
+        "kinds": {k: inf.stats() for k, inf in _INFORMERS.items()},
+    }
@@ -160,12 +160,21 @@ def get_cluster_counts() -> Dict[str, int]:
     _load_kube()
     assert _api is not None and _apps is not None
 
-    nodes = _api.list_node().items
+    # ✅ informer 快照可用就直接计数（informer 依赖本模块，这里延迟导入）
+    from services.k8s.informer import cached_list
+
+    nodes = cached_list("nodes")
+    if nodes is None:
+        nodes = _api.list_node().items
     namespaces = _api.list_namespace().items
-    pods = _api.list_pod_for_all_namespaces(watch=False).items
+    pods = cached_list("pods")
+    if pods is None:
+        pods = _api.list_pod_for_all_namespaces(watch=False).items
     services = _api.list_service_for_all_namespaces(watch=False).items
 
-    deployments = _apps.list_deployment_for_all_namespaces(watch=False).items
+    deployments = cached_list("deployments")
+    if deployments is None:
+        deployments = _apps.list_deployment_for_all_namespaces(watch=False).items
     statefulsets = _apps.list_stateful_set_for_all_namespaces(watch=False).items
 
     workloads = len(deployments) + len(statefulsets)
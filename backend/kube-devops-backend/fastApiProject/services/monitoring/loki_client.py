@@ -1,11 +1,15 @@
 # /services/loki_client.py
+import heapq
 import math
 import hashlib
 import re
+import threading
 from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 from fastapi import HTTPException
+from requests.adapters import HTTPAdapter
 
 from config import settings
 
@@ -17,6 +21,33 @@ LOKI_MAX_POINTS = 11000
 # ✅ 最小 step，避免 1s 在长范围下爆点；也避免 0s
 LOKI_MIN_STEP_SECONDS = 2
 
+# ✅ 游标分页 / 流式读取
+LOKI_PAGE_LIMIT = 1000  # 单次 /query_range 最多取多少行（Loki 默认 max_entries_limit_per_query=5000）
+LOKI_PAGE_LIMIT_MAX = 5000
+LOKI_STREAM_CHUNK_SEC = 600  # 流式读取的初始时间窗，按命中密度自动放大 / 缩小
+LOKI_STREAM_MIN_CHUNK_SEC = 10
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def _setting(name: str, default: Any) -> Any:
+    return getattr(settings, name, default)
+
+
+def _get_session() -> requests.Session:
+    """游标翻页会连续打很多次 Loki：复用连接"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=0)
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
+            sess.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+            _session = sess
+        return _session
+
 
 def _loki_base() -> str:
     """
@@ -105,7 +136,7 @@ def _request_loki(path: str, params: dict):
     """
     url = f"{_loki_base()}{path}"
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = _get_session().get(url, params=params, timeout=10)
     except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=f"Loki request failed: {e}")
 
@@ -161,47 +192,240 @@ def query_logs_instant(query: str, limit: int, time: str | None, direction: str)
     return {"items": items}
 
 
-def query_logs_range(query: str, minutes: int, limit: int, direction: str):
+def _entry(ts_ns: str, labels: dict, line: str) -> dict:
+    return {
+        "id": _make_id(ts_ns, labels, line),
+        "ts": _ns_to_timestr(ts_ns),
+        "stream": labels.get("stream", "stdout"),
+        "line": line,
+        "labels": labels,
+    }
+
+
+def _merged_values(data: dict, backward: bool) -> Iterator[Tuple[int, str, dict, str]]:
     """
-    Loki: /query_range
-    ✅ 修复点：step 不再写死 "1s"，而是按范围自动放大，避免 11000 points 报错
+    每个 stream 的 values 已按 direction 排好序：按纳秒整数多路归并（不再全部展开后按格式化字符串排序）
+    产出 (ts_ns 整数, ts_ns 原串, labels, line)
     """
-    query = sanitize_logql(query)
+    def _stream(labels: dict, values: list) -> Iterator[Tuple[int, str, dict, str]]:
+        for ts, line in values:
+            yield int(ts), ts, labels, line
 
-    end = datetime.now(timezone.utc) - timedelta(seconds=5)
-    start = end - timedelta(minutes=minutes)
+    streams = [
+        _stream(_normalize_stream_labels(r.get("stream", {})), r.get("values", []) or [])
+        for r in data.get("data", {}).get("result", []) or []
+    ]
+    return heapq.merge(*streams, key=lambda x: x[0], reverse=backward)
 
-    start_ns = int(start.timestamp() * 1e9)
-    end_ns = int(end.timestamp() * 1e9)
 
-    step_s = _calc_step_seconds(start_ns, end_ns)
-    step = f"{step_s}s"
+def encode_log_cursor(ts_ns: int, count: int) -> str:
+    """游标 = 最后一行的纳秒时间戳 + 该时间戳上已返回的行数（同一纳秒内按 id 排序，所以偏移量是确定的）"""
+    return f"{int(ts_ns)}:{int(count)}"
 
-    params = {
-        "query": query,
-        "start": start_ns,
-        "end": end_ns,
-        "limit": limit,
-        "direction": direction,
-        "step": step,  # ✅关键：动态 step
-    }
 
-    data = _request_loki("/query_range", params)
+def decode_log_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not cursor:
+        return None
+    try:
+        ts, _, count = str(cursor).partition(":")
+        return int(ts), max(0, int(count or 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
 
-    items = []
-    for r in data.get("data", {}).get("result", []):
-        labels = _normalize_stream_labels(r.get("stream", {}))
-        values = r.get("values", []) or []
-        for ts_ns, line in values:
-            items.append(
-                {
-                    "id": _make_id(ts_ns, labels, line),
-                    "ts": _ns_to_timestr(ts_ns),
-                    "stream": labels.get("stream", "stdout"),
-                    "line": line,
-                    "labels": labels,
-                }
-            )
 
-    items.sort(key=lambda x: x["ts"], reverse=(direction == "backward"))
-    return {"items": items}
+class LogCursorReader:
+    """
+    按时间窗 + 最后一行纳秒时间戳走 Loki /query_range：
+    - 每次只请求一个时间窗（start/end 都有界）、最多 page_limit 行
+    - 同一纳秒上的行总是按 id 排序输出，游标里的“已返回行数”因此在每次请求里含义一致
+    - 取满一页时，最后那个时间戳可能没取全：这一页只输出它之前的行，
+      再单独取 [ts, ts+1) 这一纳秒（最多 LOKI_PAGE_LIMIT_MAX 行，超出的部分跳过），
+      然后窗口越过该时间戳继续（backward：end=ts；forward：start=ts+1）——每一页都一定前进
+    - 窗口取不满就换下一个窗口；稀疏时窗口翻倍、密集时减半
+    - 任何时刻内存里只有一页（constant memory），next_cursor 可在下一次请求里续读
+    """
+
+    def __init__(
+        self,
+        query: str,
+        *,
+        start_ns: int,
+        end_ns: int,
+        direction: str = "backward",
+        cursor: Optional[str] = None,
+        chunk_sec: Optional[int] = None,
+        page_limit: Optional[int] = None,
+    ) -> None:
+        self.query = sanitize_logql(query)
+        self.backward = direction != "forward"
+        self.start_ns = int(start_ns)
+        self.end_ns = int(end_ns)
+        self.page_limit = max(1, min(LOKI_PAGE_LIMIT_MAX, int(page_limit or _setting("LOKI_PAGE_LIMIT", LOKI_PAGE_LIMIT))))
+        # chunk_sec=None：整个范围一个窗口（小请求就是一次 /query_range，和原来一样）
+        self.chunk_ns = int(chunk_sec * 1e9) if chunk_sec else max(1, self.end_ns - self.start_ns)
+        self.pages = 0
+        self.exhausted = False
+
+        self._last_ts: Optional[int] = None
+        self._last_count = 0
+        self._resume = decode_log_cursor(cursor)
+        if self._resume is not None:
+            self._last_ts, self._last_count = self._resume
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        if self.exhausted or self._last_ts is None:
+            return None
+        return encode_log_cursor(self._last_ts, self._last_count)
+
+    def _page(self, lo: int, hi: int, limit: int) -> dict:
+        self.pages += 1
+        return _request_loki(
+            "/query_range",
+            {
+                "query": self.query,
+                "start": lo,
+                "end": hi,
+                "limit": limit,
+                "direction": "backward" if self.backward else "forward",
+                "step": f"{_calc_step_seconds(lo, hi)}s",
+            },
+        )
+
+    def _emit(self, ts: int, ts_str: str, labels: dict, line: str) -> dict:
+        if ts != self._last_ts:
+            self._last_ts, self._last_count = ts, 0
+        self._last_count += 1
+        entry = _entry(ts_str, labels, line)
+        entry["ts_ns"] = ts_str
+        return entry
+
+    def _sorted_groups(self, rows: List[Tuple[int, str, dict, str]]) -> Iterator[dict]:
+        """rows 已按时间排好；同一纳秒内按 id 排序后输出"""
+        i = 0
+        while i < len(rows):
+            j = i
+            while j < len(rows) and rows[j][0] == rows[i][0]:
+                j += 1
+            group = sorted(rows[i:j], key=lambda r: _make_id(r[1], r[2], r[3]))
+            for ts, ts_str, labels, line in group:
+                yield self._emit(ts, ts_str, labels, line)
+            i = j
+
+    def _bucket(self, ts: int, skip: int) -> Iterator[dict]:
+        """单独取一个纳秒上的全部行（按 id 排序），跳过前 skip 行"""
+        rows = list(_merged_values(self._page(ts, ts + 1, LOKI_PAGE_LIMIT_MAX), self.backward))
+        rows.sort(key=lambda r: _make_id(r[1], r[2], r[3]))
+        self._last_ts, self._last_count = ts, min(skip, len(rows))
+        for ts_, ts_str, labels, line in rows[skip:]:
+            yield self._emit(ts_, ts_str, labels, line)
+
+    def __iter__(self) -> Iterator[dict]:
+        lo, hi = self.start_ns, self.end_ns
+        if self._resume is not None:
+            ts, skip = self._resume
+            if lo <= ts < hi:
+                yield from self._bucket(ts, skip)
+            if self.backward:
+                hi = min(hi, ts)
+            else:
+                lo = max(lo, ts + 1)
+
+        if self.backward:
+            w_hi = hi
+            w_lo = max(lo, w_hi - self.chunk_ns)
+        else:
+            w_lo = lo
+            w_hi = min(hi, w_lo + self.chunk_ns)
+        limit = self.page_limit
+
+        while w_lo < w_hi:
+            # 一页最多 limit 行，整页放在内存里
+            rows = list(_merged_values(self._page(w_lo, w_hi, limit), self.backward))
+            if len(rows) >= limit:
+                # 窗口没取完：最后一个时间戳可能只取到一部分，单独按纳秒取全
+                last_ts = rows[-1][0]
+                yield from self._sorted_groups([r for r in rows if r[0] != last_ts])
+                yield from self._bucket(last_ts, 0)
+                if self.backward:
+                    w_hi = last_ts
+                else:
+                    w_lo = last_ts + 1
+                self.chunk_ns = max(int(LOKI_STREAM_MIN_CHUNK_SEC * 1e9), self.chunk_ns // 2)
+                continue
+
+            yield from self._sorted_groups(rows)
+            # 窗口取完了：换下一个窗口，稀疏时放大
+            if len(rows) * 4 < limit:
+                self.chunk_ns = min(max(1, hi - lo), self.chunk_ns * 2)
+            if self.backward:
+                w_hi = w_lo
+                w_lo = max(lo, w_hi - self.chunk_ns)
+            else:
+                w_lo = w_hi
+                w_hi = min(hi, w_lo + self.chunk_ns)
+        self.exhausted = True
+
+
+def range_bounds_ns(minutes: int) -> Tuple[int, int]:
+    end = datetime.now(timezone.utc) - timedelta(seconds=5)
+    start = end - timedelta(minutes=minutes)
+    return int(start.timestamp() * 1e9), int(end.timestamp() * 1e9)
+
+
+def query_logs_range(query: str, minutes: int, limit: int, direction: str, *, cursor: Optional[str] = None):
+    """
+    Loki: /query_range
+    ✅ 修复点：step 不再写死 "1s"，而是按范围自动放大，避免 11000 points 报错
+    ✅ 小请求仍是一次 /query_range；取满 limit 时返回 next_cursor，带上它可以继续往后翻
+    """
+    start_ns, end_ns = range_bounds_ns(minutes)
+    reader = LogCursorReader(
+        query, start_ns=start_ns, end_ns=end_ns, direction=direction, cursor=cursor, page_limit=max(1, int(limit))
+    )
+    items: List[dict] = []
+    for entry in reader:
+        entry.pop("ts_ns", None)
+        items.append(entry)
+        if len(items) >= limit:
+            break
+    return {"items": items, "next_cursor": reader.next_cursor if len(items) >= limit else None}
+
+
+def stream_logs_range(
+    query: str,
+    *,
+    start_ns: int,
+    end_ns: int,
+    direction: str = "backward",
+    max_lines: int = 100000,
+    cursor: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    流式读取（NDJSON 用）：逐行产出 {"type": "log", ...}，最后一行 {"type": "end", next_cursor, count, pages}
+    按 LOKI_STREAM_CHUNK_SEC 时间窗走，内存里只保留一页
+    """
+    reader = LogCursorReader(
+        query,
+        start_ns=start_ns,
+        end_ns=end_ns,
+        direction=direction,
+        cursor=cursor,
+        chunk_sec=int(_setting("LOKI_STREAM_CHUNK_SEC", LOKI_STREAM_CHUNK_SEC)),
+    )
+    count = 0
+    max_lines = max(1, int(max_lines))
+    for entry in reader:
+        count += 1
+        entry["type"] = "log"
+        yield entry
+        if count >= max_lines:
+            break
+    truncated = not reader.exhausted
+    yield {
+        "type": "end",
+        "count": count,
+        "pages": reader.pages,
+        "truncated": truncated,
+        "next_cursor": reader.next_cursor,
+    }
@@ -0,0 +1,187 @@
+# services/monitoring/prom_cache.py
+"""
+Prometheus 查询结果短 TTL 缓存（多个大屏轮询同一组 PromQL 时只打一次上游）
+
+- key 由调用方给出：(接口, base, 规范化 PromQL, step 对齐后的时间...)
+- 有界 LRU：条数 + 字节数双上限
+- single-flight：同一 key 并发 miss 只发一次上游请求，其余等待共享结果（失败也共享）
+- 返回的是共享对象：调用方只读，不要原地修改
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+PROM_CACHE_MAX_ENTRIES = 1024
+PROM_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+def normalize_promql(query: str) -> str:
+    """
+    折叠引号外的空白（多行 PromQL 与单行写法命中同一个 key）；引号内原样保留
+    """
+    out = []
+    quote = ""
+    escaped = False
+    pending_space = False
+    for ch in str(query or "").strip():
+        if quote:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = ""
+            continue
+        if ch.isspace():
+            pending_space = True
+            continue
+        if pending_space and out:
+            out.append(" ")
+        pending_space = False
+        out.append(ch)
+        if ch in ("'", '"', "`"):
+            quote = ch
+    return "".join(out)
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class PromResultCache:
+    def __init__(self, max_entries: int = PROM_CACHE_MAX_ENTRIES, max_bytes: int = PROM_CACHE_MAX_BYTES) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self._lock = threading.Lock()
+        # key -> (expires_at, value, nbytes)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._evictions = 0
+        self._started = time.monotonic()
+
+    def _stat(self, label: str, k: str) -> None:
+        st = self._stats.get(label)
+        if st is None:
+            st = {"requests": 0, "hits": 0, "coalesced": 0, "upstream": 0, "errors": 0}
+            self._stats[label] = st
+        st[k] += 1
+        if k in ("hits", "coalesced", "upstream"):
+            st["requests"] += 1
+
+    def _drop(self, key: Hashable) -> None:
+        ent = self._data.pop(key, None)
+        if ent is not None:
+            self._bytes -= ent[2]
+
+    def _store(self, key: Hashable, value: Any, nbytes: int, ttl: float) -> None:
+        now = time.monotonic()
+        self._drop(key)
+        self._data[key] = (now + ttl, value, nbytes)
+        self._bytes += nbytes
+        # 旧时间桶的 key 不会再被访问：顺手清掉队头已过期的
+        while self._data:
+            k0, ent0 = next(iter(self._data.items()))
+            if ent0[0] > now:
+                break
+            self._drop(k0)
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            k0 = next(iter(self._data))
+            self._drop(k0)
+            self._evictions += 1
+
+    def get_or_fetch(
+        self,
+        label: str,
+        key: Hashable,
+        ttl: float,
+        fetch: Callable[[], Tuple[Any, int]],
+        *,
+        wait_timeout: float = 30.0,
+    ) -> Any:
+        """
+        fetch() -> (value, nbytes)；nbytes < 0 表示结果不可缓存（例如 status != success）
+        """
+        now = time.monotonic()
+        with self._lock:
+            ent = self._data.get(key)
+            if ent is not None:
+                if ent[0] > now:
+                    self._data.move_to_end(key)
+                    self._stat(label, "hits")
+                    return ent[1]
+                self._drop(key)
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self._stat(label, "upstream")
+            else:
+                self._stat(label, "coalesced")
+
+        if not leader:
+            if not flight.event.wait(wait_timeout):
+                raise TimeoutError("prometheus single-flight wait timeout")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value, nbytes = fetch()
+            flight.value = value
+            with self._lock:
+                if ttl > 0 and 0 <= nbytes <= self.max_bytes:
+                    self._store(key, value, nbytes, ttl)
+            return value
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stat(label, "errors")
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = max(1e-6, time.monotonic() - self._started)
+            endpoints: Dict[str, Any] = {}
+            saved_total = 0
+            for label, st in self._stats.items():
+                saved = st["hits"] + st["coalesced"]
+                saved_total += saved
+                endpoints[label] = {
+                    **st,
+                    "hit_ratio": round(saved / st["requests"], 4) if st["requests"] else 0.0,
+                    "upstream_qps": round(st["upstream"] / uptime, 4),
+                    "saved_qps": round(saved / uptime, 4),
+                }
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "inflight": len(self._flights),
+                "uptime_sec": int(uptime),
+                "saved_qps": round(saved_total / uptime, 4),
+                "endpoints": endpoints,
+            }
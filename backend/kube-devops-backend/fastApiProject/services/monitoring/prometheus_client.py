@@ -1,9 +1,17 @@
 # services/prometheus_client.py
 from __future__ import annotations
 
-import requests
+import math
+import random
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.monitoring.prom_cache import PromResultCache, normalize_promql
 
 from fastapi import HTTPException
 
@@ -43,25 +51,243 @@ def _timeout() -> int:
     return _cfg_int("HTTP_TIMEOUT_SECONDS", int(getattr(settings, "HTTP_TIMEOUT_SECONDS", 10)))
 
 
-def prom_query(query: str, ts: Optional[float] = None) -> Dict[str, Any]:
+# ---------- ✅ 连接池 Session（keep-alive，避免每次查询重新 TCP/TLS 握手） ----------
+PROM_RETRY_STATUS = (502, 503, 504)
+PROM_RETRY_BACKOFF_SEC = 0.2
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_session_sig: Optional[Tuple[str, int]] = None
+
+_stats_lock = threading.Lock()
+_conn_totals: Dict[str, int] = {"requests": 0, "connections": 0}  # 已被替换掉的旧 session 的累计
+_stats: Dict[str, int] = {"session_builds": 0, "retries": 0, "errors": 0}
+_latency: Dict[str, Dict[str, Any]] = {}
+
+
+def _pool_size() -> int:
+    return max(1, _cfg_int("PROM_POOL_MAXSIZE", int(getattr(settings, "PROM_POOL_MAXSIZE", 20))))
+
+
+def _retry_total() -> int:
+    return max(0, _cfg_int("PROM_RETRY_TOTAL", int(getattr(settings, "PROM_RETRY_TOTAL", 2))))
+
+
+def _pool_counters(sess: Optional[requests.Session]) -> Tuple[int, int]:
+    """
+    从 urllib3 连接池读取 (请求数, 新建连接数)；复用率 = 1 - 新建连接 / 请求
+    """
+    reqs = 0
+    conns = 0
+    if sess is None:
+        return 0, 0
+    for adapter in sess.adapters.values():
+        pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+        if pools is None:
+            continue
+        try:
+            for key in list(pools.keys()):
+                pool = pools.get(key) if hasattr(pools, "get") else pools[key]
+                if pool is None:
+                    continue
+                reqs += int(getattr(pool, "num_requests", 0) or 0)
+                conns += int(getattr(pool, "num_connections", 0) or 0)
+        except Exception:
+            continue
+    return reqs, conns
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    sess = requests.Session()
+    # 重试自己做（带抖动），adapter 只负责连接池
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    sess.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+    return sess
+
+
+def _get_session(base: str) -> requests.Session:
+    """
+    PROMETHEUS_BASE / 池大小变化（UI 改配置）时重建 session
+    """
+    global _session, _session_sig
+    sig = (base, _pool_size())
+    with _session_lock:
+        if _session is not None and _session_sig == sig:
+            return _session
+        old = _session
+        _session = _build_session(sig[1])
+        _session_sig = sig
+    with _stats_lock:
+        _stats["session_builds"] += 1
+        if old is not None:
+            r, c = _pool_counters(old)
+            _conn_totals["requests"] += r
+            _conn_totals["connections"] += c
+    if old is not None:
+        try:
+            old.close()
+        except Exception:
+            pass
+    return _session
+
+
+def _observe(endpoint: str, ms: float, ok: bool) -> None:
+    with _stats_lock:
+        h = _latency.get(endpoint)
+        if h is None:
+            h = {"count": 0, "sum_ms": 0.0, "errors": 0, "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+            _latency[endpoint] = h
+        h["count"] += 1
+        h["sum_ms"] += ms
+        if not ok:
+            h["errors"] += 1
+        i = 0
+        while i < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[i]:
+            i += 1
+        h["buckets"][i] += 1
+
+
+def _prom_fetch(endpoint: str, params: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    返回 (JSON, 响应体字节数)；非 success 的结果字节数记为 -1（不进缓存）
+    """
+    base = _require_prom_base()
+    sess = _get_session(base)
+    url = f"{base}/{endpoint}"
+    retries = _retry_total()
+    timeout = _timeout()
+
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        attempt = 0
+        while True:
+            try:
+                resp = sess.get(url, params=params, timeout=timeout)
+            except requests.ConnectionError:
+                # 复用的 keep-alive 连接被对端关闭等：按同样的退避重试
+                if attempt >= retries:
+                    raise
+            else:
+                if resp.status_code not in PROM_RETRY_STATUS or attempt >= retries:
+                    resp.raise_for_status()
+                    out = resp.json()
+                    ok = True
+                    nbytes = len(resp.content or b"") if out.get("status") == "success" else -1
+                    return out, nbytes
+                resp.close()
+            attempt += 1
+            with _stats_lock:
+                _stats["retries"] += 1
+            # 指数退避 + 抖动，避免多个请求同时打回恢复中的 Prometheus
+            time.sleep(PROM_RETRY_BACKOFF_SEC * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+    finally:
+        if not ok:
+            with _stats_lock:
+                _stats["errors"] += 1
+        _observe(endpoint, (time.perf_counter() - t0) * 1000.0, ok)
+
+
+def prom_client_stats() -> Dict[str, Any]:
+    with _session_lock:
+        sess = _session
+        sig = _session_sig
+    live_reqs, live_conns = _pool_counters(sess)
+    with _stats_lock:
+        reqs = _conn_totals["requests"] + live_reqs
+        conns = _conn_totals["connections"] + live_conns
+        latency = {}
+        for ep, h in _latency.items():
+            buckets = {}
+            acc = 0
+            for i, le in enumerate(LATENCY_BUCKETS_MS):
+                acc += h["buckets"][i]
+                buckets[str(le)] = acc
+            buckets["+Inf"] = acc + h["buckets"][-1]
+            latency[ep] = {
+                "count": h["count"],
+                "errors": h["errors"],
+                "avg_ms": round(h["sum_ms"] / h["count"], 2) if h["count"] else 0.0,
+                "buckets_le_ms": buckets,
+            }
+        out: Dict[str, Any] = dict(_stats)
+    out.update(
+        {
+            "base": sig[0] if sig else "",
+            "pool_maxsize": sig[1] if sig else _pool_size(),
+            "http_requests": reqs,
+            "new_connections": conns,
+            "reuse_ratio": round(1.0 - float(conns) / reqs, 4) if reqs else 0.0,
+            "latency": latency,
+        }
+    )
+    return out
+
+
+# ---------- ✅ 短 TTL 结果缓存 + single-flight ----------
+PROM_CACHE_INSTANT_STEP_SEC = 10
+PROM_CACHE_MAX_TTL_SEC = 60
+
+_result_cache = PromResultCache(
+    max_entries=int(getattr(settings, "PROM_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(getattr(settings, "PROM_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+)
+
+
+def _cache_enabled() -> bool:
+    return bool(getattr(settings, "PROM_CACHE_ENABLED", True))
+
+
+def _instant_step() -> int:
+    return max(1, int(getattr(settings, "PROM_CACHE_INSTANT_STEP_SEC", PROM_CACHE_INSTANT_STEP_SEC)))
+
+
+def _cached_get(label: str, endpoint: str, params: Dict[str, Any], key: Tuple[Any, ...], ttl: float) -> Dict[str, Any]:
+    if not _cache_enabled() or ttl <= 0:
+        return _prom_fetch(endpoint, params)[0]
+    # 等待者最多等一次完整请求（含重试）
+    wait = float(_timeout()) * (_retry_total() + 1) + 5.0
+    return _result_cache.get_or_fetch(label, key, ttl, lambda: _prom_fetch(endpoint, params), wait_timeout=wait)
+
+
+def _instant(query: str, ts: Optional[float], label: str) -> Dict[str, Any]:
     params: Dict[str, Any] = {"query": query}
     if ts is not None:
         params["time"] = ts
-    base = _require_prom_base()
-    resp = requests.get(f"{base}/query", params=params, timeout=_timeout())
-    resp.raise_for_status()
-    return resp.json()
+    step = _instant_step()
+    # 不带 time：按 step 分桶（同一个桶内的并发/轮询共享结果）
+    t_key: Any = float(ts) if ts is not None else ("now", int(time.time() // step))
+    key = ("query", _prom_base(), normalize_promql(query), t_key)
+    return _cached_get(label, "query", params, key, step / 2.0)
+
+
+def prom_query(query: str, ts: Optional[float] = None) -> Dict[str, Any]:
+    return _instant(query, ts, "query")
 
 
 def prom_query_range(query: str, start: float, end: float, step: int) -> Dict[str, Any]:
-    base = _require_prom_base()
-    resp = requests.get(
-        f"{base}/query_range",
-        params={"query": query, "start": start, "end": end, "step": step},
-        timeout=_timeout(),
-    )
-    resp.raise_for_status()
-    return resp.json()
+    step_i = max(1, int(step))
+    ttl = min(float(PROM_CACHE_MAX_TTL_SEC), max(1.0, step_i / 2.0))
+    if not _cache_enabled() or ttl <= 0:
+        # 不走缓存：按调用方原始窗口查询
+        return _prom_fetch("query_range", {"query": query, "start": start, "end": end, "step": step_i})[0]
+    # ✅ 走缓存：同一个 key 的调用方共享同一份结果，所以实际查询的也必须是对齐后的窗口
+    #    start 向下、end 向上取整到 step 整数倍：窗口只会变宽，不会丢掉两端（尤其是最新的不完整 step）
+    a_start = int(math.floor(float(start) / step_i)) * step_i
+    a_end = max(a_start, int(math.ceil(float(end) / step_i)) * step_i)
+    params = {"query": query, "start": a_start, "end": a_end, "step": step_i}
+    key = ("query_range", _prom_base(), normalize_promql(query), a_start, a_end, step_i)
+    return _cached_get("query_range", "query_range", params, key, ttl)
+
+
+def prom_cache_stats() -> Dict[str, Any]:
+    out = _result_cache.stats()
+    out["enabled"] = _cache_enabled()
+    out["instant_step_sec"] = _instant_step()
+    return out
 
 
 def range_by_minutes(query: str, minutes: int = 15, step: int = 30) -> Dict[str, Any]:
@@ -75,7 +301,7 @@ def instant_vector(query: str) -> List[Dict[str, Any]]:
     返回 Prometheus instant query 的 result vector（list）
     """
     try:
-        data = prom_query(query)
+        data = _instant(query, None, "instant_vector")
         return ((data.get("data") or {}).get("result")) or []
     except Exception:
         return []
@@ -0,0 +1,146 @@
+# services/monitoring/query_plan.py
+"""
+Prometheus 查询计划：一组具名 PromQL 并发执行（BFF 总览接口用）
+
+- 有界线程池（PROM_FANOUT_WORKERS），页面耗时 ≈ max(单条耗时) 而不是 sum
+- 每条查询独立超时；超时/失败只影响自己：返回 default，并在 errors 里标注原因
+- kind:
+    value -> instant query 第一条 value[1]（float，等价 instant_value）
+    query -> instant query 原始 JSON（等价 prom_query）
+    range -> range_by_minutes 原始 JSON
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Dict, Literal, Optional, Tuple
+
+from config import settings
+from services.monitoring.prometheus_client import prom_query, range_by_minutes
+
+PROM_FANOUT_WORKERS = 8
+
+QueryKind = Literal["value", "query", "range"]
+
+
+def _empty_query_result(error: str) -> Dict[str, Any]:
+    return {"status": "error", "error": error, "data": {"resultType": "vector", "result": []}}
+
+
+def _empty_range_result(error: str) -> Dict[str, Any]:
+    return {"status": "error", "error": error, "data": {"resultType": "matrix", "result": []}}
+
+
+@dataclass
+class PromQ:
+    query: str
+    kind: QueryKind = "value"
+    minutes: int = 15
+    step: int = 30
+    default: Any = None
+    timeout: Optional[float] = None
+
+
+@dataclass
+class PlanResult:
+    values: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings_ms: Dict[str, int] = field(default_factory=dict)
+    total_ms: int = 0
+
+    def get(self, name: str, default: Any = None) -> Any:
+        v = self.values.get(name)
+        return default if v is None else v
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.errors)
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "partial": self.partial,
+            "errors": dict(self.errors),
+            "timingsMs": dict(self.timings_ms),
+            "totalMs": self.total_ms,
+        }
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(getattr(settings, "PROM_FANOUT_WORKERS", PROM_FANOUT_WORKERS) or PROM_FANOUT_WORKERS)
+            _pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prom-fanout")
+        return _pool
+
+
+def _default_for(q: PromQ, error: str) -> Any:
+    if q.default is not None:
+        return q.default
+    if q.kind == "value":
+        return 0.0
+    if q.kind == "range":
+        return _empty_range_result(error)
+    return _empty_query_result(error)
+
+
+def _exec(q: PromQ) -> Any:
+    if q.kind == "range":
+        return range_by_minutes(q.query, minutes=q.minutes, step=q.step)
+    data = prom_query(q.query)
+    if q.kind == "query":
+        return data
+    # value：拿不到数据不算错误，按 default 处理
+    result = (data.get("data") or {}).get("result") or []
+    if not result:
+        return q.default if q.default is not None else 0.0
+    return float(result[0]["value"][1])
+
+
+def _timed(q: PromQ) -> Tuple[Any, Optional[str], int]:
+    t0 = time.perf_counter()
+    try:
+        return _exec(q), None, int((time.perf_counter() - t0) * 1000)
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__, int((time.perf_counter() - t0) * 1000)
+
+
+def run_query_plan(plan: Dict[str, PromQ], *, timeout: Optional[float] = None) -> PlanResult:
+    """
+    并发执行查询计划，永远返回（部分）结果，不抛异常
+    timeout：单条查询默认超时（秒），PromQ.timeout 可单独覆盖
+    """
+    default_timeout = float(timeout if timeout is not None else getattr(settings, "HTTP_TIMEOUT_SECONDS", 10))
+    pool = _get_pool()
+
+    t0 = time.monotonic()
+    futures: Dict[str, Future] = {name: pool.submit(_timed, q) for name, q in plan.items()}
+
+    out = PlanResult()
+    for name, fut in futures.items():
+        q = plan[name]
+        deadline = t0 + float(q.timeout if q.timeout is not None else default_timeout)
+        try:
+            value, err, ms = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            fut.cancel()
+            value, err, ms = None, "timeout", int((time.monotonic() - t0) * 1000)
+        except Exception as e:
+            value, err, ms = None, str(e), int((time.monotonic() - t0) * 1000)
+
+        out.timings_ms[name] = ms
+        if err is not None:
+            out.errors[name] = err
+            out.values[name] = _default_for(q, err)
+        else:
+            out.values[name] = value
+
+    out.total_ms = int((time.monotonic() - t0) * 1000)
+    return out
@@ -8,6 +8,7 @@ from kubernetes.client import ApiException
 
 # ✅ 统一用 kube_client 的 getter（避免直接依赖 _load_kube / 手动 new Api）
 from services.k8s.kube_client import get_core_v1, get_custom_objects  # 你需要在 kube_client.py 提供 get_custom_objects()
+from services.k8s.informer import cached_list
 
 
 def _parse_cpu_to_cores(cpu: str) -> float:
@@ -126,7 +127,10 @@ def list_nodes() -> List[Dict[str, Any]]:
     """
     v1 = get_core_v1()
 
-    nodes = v1.list_node().items
+    # ✅ informer 快照可用就不打 apiserver；否则回退直接 LIST
+    nodes = cached_list("nodes")
+    if nodes is None:
+        nodes = v1.list_node().items
     metrics_map = _fetch_node_metrics_map()
 
     rows: List[Dict[str, Any]] = []
@@ -182,7 +186,9 @@ def list_nodes() -> List[Dict[str, Any]]:
 
     # podUsed：统计每个节点当前 Running/Pending 的 Pod 数量
     try:
-        pods = v1.list_pod_for_all_namespaces(watch=False).items
+        pods = cached_list("pods")
+        if pods is None:
+            pods = v1.list_pod_for_all_namespaces(watch=False).items
         cnt: Dict[str, int] = {}
         for p in pods:
             node_name = p.spec.node_name
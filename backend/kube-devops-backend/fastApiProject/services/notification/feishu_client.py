@@ -1,17 +1,9 @@
 from __future__ import annotations
 
-import json
-import threading
-from typing import Any, Dict, Optional
-
-import requests
+from typing import Any, Dict, List
 
 from config import settings
 from services.ops.runtime_config import get_value
-from db.alerts.repo import update_push_status
-
-
-_executor = threading.BoundedSemaphore(8)
 
 
 def _cfg_str(key: str, default: str = "") -> str:
@@ -29,6 +21,8 @@ def _alerts_page_url() -> str:
 
 
 def _build_card(alert: Dict[str, Any]) -> Dict[str, Any]:
+    if alert.get("group"):
+        return _build_group_card(alert)
     labels = alert.get("labels") or {}
     annotations = alert.get("annotations") or {}
     title = str(labels.get("alertname") or annotations.get("summary") or "Platform Alert")
@@ -58,32 +52,97 @@ def _build_card(alert: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def _alert_line(a: Dict[str, Any]) -> str:
+    group = a.get("group")
+    if group:
+        return f"- **{group.get('key')}**: {group.get('firing', 0)} firing / {group.get('total', 0)} alerts"
+    labels = a.get("labels") or {}
+    annotations = a.get("annotations") or {}
+    name = str(labels.get("alertname") or annotations.get("summary") or "Platform Alert")
+    severity = str(labels.get("severity") or "warning")
+    resource = str(labels.get("namespace") or "") + "/" + str(labels.get("pod") or labels.get("deployment") or "")
+    return f"- [{severity}] **{name}** {resource} ({a.get('status') or ''})"
+
+
+def _build_group_card(alert: Dict[str, Any]) -> Dict[str, Any]:
+    """组通知：组标签 + 成员数 + 前几个成员"""
+    group = alert.get("group") or {}
+    labels = alert.get("labels") or {}
+    title = ", ".join(f"{k}={v}" for k, v in labels.items() if v) or str(group.get("key") or "Alert group")
+    members = group.get("members") or []
+    total = int(group.get("total") or 0)
+    lines = [_alert_line(m) for m in members]
+    if total > len(members):
+        lines.append(f"... and {total - len(members)} more")
+    url = _alerts_page_url()
+
+    fields = [
+        {"is_short": True, "text": f"**Status**\n{alert.get('status') or ''}"},
+        {"is_short": True, "text": f"**Firing / Total**\n{group.get('firing', 0)} / {total}"},
+        {"is_short": False, "text": "\n".join(lines) or "-"},
+    ]
+    if url:
+        fields.append({"is_short": False, "text": f"**Link**\n{url}"})
+
+    return {
+        "msg_type": "interactive",
+        "card": {
+            "header": {"title": {"tag": "plain_text", "content": f"Alert group: {title}"}},
+            "elements": [{"tag": "div", "fields": fields}],
+        },
+    }
+
+
+def _build_storm_card(alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """告警风暴：多条告警（或多个组）合成一张卡片（每条一行）"""
+    url = _alerts_page_url()
+    lines = [_alert_line(a) for a in alerts]
+    firing = sum(1 for a in alerts if str(a.get("status") or "") != "resolved")
+
+    fields = [
+        {"is_short": True, "text": f"**Alerts**\n{len(alerts)}"},
+        {"is_short": True, "text": f"**Firing**\n{firing}"},
+        {"is_short": False, "text": "\n".join(lines)},
+    ]
+    if url:
+        fields.append({"is_short": False, "text": f"**Link**\n{url}"})
+
+    return {
+        "msg_type": "interactive",
+        "card": {
+            "header": {"title": {"tag": "plain_text", "content": f"Alert storm: {len(alerts)} alerts"}},
+            "elements": [{"tag": "div", "fields": fields}],
+        },
+    }
+
+
 def push_alert_async(alert: Dict[str, Any]) -> None:
+    """
+    告警已写入告警中心后调用
+    - 开启分组（默认）：只唤醒分组引擎，按组发通知
+    - 关闭分组：单条告警投递到通知出站队列
+    """
     url = _feishu_webhook_url()
     fingerprint = str(alert.get("fingerprint") or "")
     if not url or not fingerprint:
         return
 
-    def _runner() -> None:
-        if not _executor.acquire(blocking=False):
-            return
-        try:
-            payload = _build_card(alert)
-            resp = requests.post(url, json=payload, timeout=6)
-            ok = 200 <= resp.status_code < 300
-            if ok:
-                update_push_status(fingerprint=fingerprint, status="ok", error="")
-            else:
-                update_push_status(
-                    fingerprint=fingerprint,
-                    status="failed",
-                    error=f"status={resp.status_code} body={resp.text[:200]}",
-                )
-        except Exception as e:
-            update_push_status(fingerprint=fingerprint, status="failed", error=str(e))
-        finally:
-            _executor.release()
-
-    t = threading.Thread(target=_runner, name="feishu-push", daemon=True)
-    t.start()
+    from services.alerts.grouping import alert_grouper, grouping_enabled
+
+    if grouping_enabled():
+        alert_grouper.wake()
+        return
+
+    from services.notification.feishu_dispatcher import feishu_dispatcher
+
+    feishu_dispatcher.enqueue(alert)
+
+
+def push_group_async(group_alert: Dict[str, Any]) -> None:
+    """组通知投递到通知出站队列（持久化、合并、限速、重试），由 feishu_dispatcher 发送"""
+    if not _feishu_webhook_url():
+        return
+
+    from services.notification.feishu_dispatcher import feishu_dispatcher
 
+    feishu_dispatcher.enqueue(group_alert)
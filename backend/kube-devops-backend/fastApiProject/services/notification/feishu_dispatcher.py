@@ -0,0 +1,320 @@
+# services/notification/feishu_dispatcher.py
+"""
+飞书通知分发器（替代每条告警起一个线程、信号量满就丢）
+
+- 持久化：push_alert_async → notify_outbox（SQLite），进程重启后继续发；待发送条数超过
+  NOTIFY_QUEUE_MAX 时新 fingerprint 记为 dropped（已有的仍然合并）
+- 合并：同一 fingerprint 未发出前只保留最新一条（firing → resolved 来回抖动只发最终状态）
+- 分发线程认领到期记录；一次认领 >= NOTIFY_STORM_THRESHOLD 条视为告警风暴，
+  每 NOTIFY_MERGE_MAX 条合成一张卡片
+- 固定 NOTIFY_WORKERS 个发送线程 + 连接池 Session；令牌桶限速（飞书自定义机器人 100 次/分钟、5 次/秒）
+- 失败指数退避重试（NOTIFY_RETRY_BASE_SEC * 2^attempts，封顶 NOTIFY_RETRY_MAX_SEC），
+  超过 NOTIFY_MAX_RETRIES 标记 dead；告警上记录 last_push_status = ok / retrying / failed / dropped
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from db.alerts.outbox_repo import (
+    claim_due_notifications,
+    enqueue_notification,
+    mark_notifications_failed,
+    mark_notifications_sent,
+    outbox_counts,
+    prune_dead_notifications,
+    reset_sending_notifications,
+)
+
+NOTIFY_WORKERS = 2
+NOTIFY_RATE_PER_MIN = 100
+NOTIFY_BURST = 5
+NOTIFY_QUEUE_MAX = 10000
+NOTIFY_MAX_RETRIES = 5
+NOTIFY_RETRY_BASE_SEC = 2
+NOTIFY_RETRY_MAX_SEC = 300
+NOTIFY_STORM_THRESHOLD = 3
+NOTIFY_MERGE_MAX = 20
+NOTIFY_COALESCE_MS = 200  # 被唤醒后稍等再认领：等写线程提交，也让突发告警能合并
+NOTIFY_CLAIM_BATCH = 100
+NOTIFY_DEAD_TTL_SEC = 7 * 24 * 3600
+NOTIFY_HTTP_TIMEOUT_SEC = 6
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: int) -> None:
+        self.rate = max(0.01, float(rate_per_sec))
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """阻塞直到拿到一个令牌；stop 被置位时放弃返回 False"""
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+                self._ts = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    if waited:
+                        self.waits += 1
+                    return True
+                need = (1.0 - self._tokens) / self.rate
+            waited = True
+            if stop is not None:
+                if stop.wait(need):
+                    return False
+            else:
+                time.sleep(need)
+
+
+class FeishuDispatcher:
+    def __init__(self) -> None:
+        self.workers = max(1, int(_setting("NOTIFY_WORKERS", NOTIFY_WORKERS)))
+        self.queue_max = max(1, int(_setting("NOTIFY_QUEUE_MAX", NOTIFY_QUEUE_MAX)))
+        self.max_retries = max(0, int(_setting("NOTIFY_MAX_RETRIES", NOTIFY_MAX_RETRIES)))
+        self.storm_threshold = max(2, int(_setting("NOTIFY_STORM_THRESHOLD", NOTIFY_STORM_THRESHOLD)))
+        self.merge_max = max(1, int(_setting("NOTIFY_MERGE_MAX", NOTIFY_MERGE_MAX)))
+        self.bucket = TokenBucket(
+            float(_setting("NOTIFY_RATE_PER_MIN", NOTIFY_RATE_PER_MIN)) / 60.0,
+            int(_setting("NOTIFY_BURST", NOTIFY_BURST)),
+        )
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._session: Optional[requests.Session] = None
+        self._inflight = 0
+        self._pending_estimate = 0
+        self._send_ms: Deque[float] = deque(maxlen=512)
+        self._stats: Dict[str, int] = {
+            "enqueued": 0,
+            "dropped": 0,
+            "messages": 0,
+            "merged_messages": 0,
+            "alerts_sent": 0,
+            "coalesced": 0,
+            "failures": 0,
+            "retries": 0,
+            "dead": 0,
+        }
+
+    # ---------- 入队 ----------
+    def enqueue(self, alert: Dict[str, Any]) -> None:
+        fingerprint = str(alert.get("fingerprint") or "")
+        if not fingerprint:
+            return
+        with self._lock:
+            allow_new = self._pending_estimate < self.queue_max
+            self._pending_estimate += 1 if allow_new else 0
+            self._stats["enqueued"] += 1
+            if not allow_new:
+                self._stats["dropped"] += 1
+        enqueue_notification(fingerprint=fingerprint, payload=alert, allow_new=allow_new)
+        self._wake.set()
+
+    # ---------- 生命周期 ----------
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            try:
+                reclaimed = reset_sending_notifications()
+                if reclaimed:
+                    print(f"feishu_dispatcher reclaimed={reclaimed}")
+            except Exception as e:
+                print(f"feishu_dispatcher reset error={e}")
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers, max_retries=0)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="feishu-push")
+            self._thread = threading.Thread(target=self._loop, name="feishu-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        t = self._thread
+        if t is not None:
+            t.join(timeout=timeout)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
+        self._thread = None
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    # ---------- 分发 ----------
+    def _refresh_pending(self) -> int:
+        counts = outbox_counts()
+        with self._lock:
+            self._pending_estimate = int(counts.get("pending", 0)) + int(counts.get("sending", 0))
+        return int(counts.get("next_due_at") or 0)
+
+    def _loop(self) -> None:
+        last_prune = 0.0
+        while not self._stop.is_set():
+            try:
+                next_due = self._refresh_pending()
+                if time.time() - last_prune > 3600:
+                    prune_dead_notifications(older_than_sec=NOTIFY_DEAD_TTL_SEC)
+                    last_prune = time.time()
+                with self._lock:
+                    capacity = self.workers * 2 - self._inflight
+                rows = claim_due_notifications(limit=NOTIFY_CLAIM_BATCH) if capacity > 0 else []
+            except Exception as e:
+                print(f"feishu_dispatcher claim error={e}")
+                rows, next_due = [], 0
+
+            if rows:
+                for msg in self._group(rows):
+                    with self._lock:
+                        self._inflight += 1
+                    self._pool.submit(self._send, msg)
+                continue
+
+            # 没有到期的：等新告警唤醒，或等最早一条重试到期
+            timeout = 5.0
+            if next_due:
+                timeout = min(timeout, max(0.2, next_due - time.time()))
+            if self._wake.wait(timeout):
+                self._wake.clear()
+                self._stop.wait(float(_setting("NOTIFY_COALESCE_MS", NOTIFY_COALESCE_MS)) / 1000.0)
+
+    def _group(self, rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        if len(rows) < self.storm_threshold:
+            return [[r] for r in rows]
+        return [rows[i: i + self.merge_max] for i in range(0, len(rows), self.merge_max)]
+
+    def _post(self, url: str, payload: Dict[str, Any]) -> Optional[str]:
+        """返回 None 表示成功，否则错误描述"""
+        resp = self._session.post(url, json=payload, timeout=NOTIFY_HTTP_TIMEOUT_SEC)
+        if not 200 <= resp.status_code < 300:
+            return f"status={resp.status_code} body={resp.text[:200]}"
+        try:
+            body = resp.json()
+        except ValueError:
+            return None
+        code = body.get("code", body.get("StatusCode", 0)) if isinstance(body, dict) else 0
+        if code not in (0, None):
+            return f"code={code} msg={body.get('msg') or body.get('StatusMessage') or ''}"
+        return None
+
+    def _send(self, msg: List[Dict[str, Any]]) -> None:
+        from services.notification.feishu_client import _build_card, _build_storm_card, _feishu_webhook_url
+
+        ids = [int(r["id"]) for r in msg]
+        t0 = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            url = _feishu_webhook_url()
+            if not url:
+                error = "feishu webhook url not configured"
+            elif not self.bucket.acquire(self._stop):
+                error = "dispatcher stopped"
+            else:
+                alerts = [r["payload"] for r in msg]
+                payload = _build_card(alerts[0]) if len(alerts) == 1 else _build_storm_card(alerts)
+                error = self._post(url, payload)
+        except Exception as e:
+            error = str(e)
+        finally:
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            with self._lock:
+                self._inflight -= 1
+                self._send_ms.append(elapsed_ms)
+
+        try:
+            if error is None:
+                mark_notifications_sent(ids)
+                with self._lock:
+                    self._stats["messages"] += 1
+                    self._stats["alerts_sent"] += len(msg)
+                    self._stats["coalesced"] += sum(int(r.get("coalesced") or 0) for r in msg)
+                    if len(msg) > 1:
+                        self._stats["merged_messages"] += 1
+                return
+            attempts = max(int(r.get("attempts") or 0) for r in msg) + 1
+            if attempts > self.max_retries:
+                mark_notifications_failed(ids, error=error, next_at=None)
+                with self._lock:
+                    self._stats["failures"] += 1
+                    self._stats["dead"] += len(msg)
+                return
+            base = float(_setting("NOTIFY_RETRY_BASE_SEC", NOTIFY_RETRY_BASE_SEC))
+            cap = float(_setting("NOTIFY_RETRY_MAX_SEC", NOTIFY_RETRY_MAX_SEC))
+            delay = min(cap, base * (2 ** (attempts - 1))) * random.uniform(0.8, 1.2)
+            mark_notifications_failed(ids, error=error, next_at=int(time.time() + delay))
+            with self._lock:
+                self._stats["failures"] += 1
+                self._stats["retries"] += len(msg)
+        finally:
+            self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            ms = sorted(self._send_ms)
+            out["inflight"] = self._inflight
+            out["pending_estimate"] = self._pending_estimate
+        out["rate_limited_waits"] = self.bucket.waits
+        out["running"] = self.running()
+        out["send_ms"] = {
+            "p50": round(ms[int(len(ms) * 0.5)], 2) if ms else 0.0,
+            "p95": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 2) if ms else 0.0,
+        }
+        try:
+            out["outbox"] = outbox_counts()
+        except Exception:
+            out["outbox"] = {}
+        out["config"] = {
+            "workers": self.workers,
+            "rate_per_min": round(self.bucket.rate * 60.0, 2),
+            "burst": int(self.bucket.capacity),
+            "queue_max": self.queue_max,
+            "max_retries": self.max_retries,
+            "storm_threshold": self.storm_threshold,
+            "merge_max": self.merge_max,
+        }
+        return out
+
+
+feishu_dispatcher = FeishuDispatcher()
+
+
+def start_notify_dispatcher() -> None:
+    feishu_dispatcher.start()
+
+
+def stop_notify_dispatcher() -> None:
+    feishu_dispatcher.stop()
+
+
+def notify_dispatcher_stats() -> Dict[str, Any]:
+    return feishu_dispatcher.stats()
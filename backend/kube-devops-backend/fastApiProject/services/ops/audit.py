@@ -6,6 +6,7 @@ import time
 from typing import Any, Dict, List
 
 from db.utils.sqlite import get_conn, q, write_with_retry
+from db.utils.write_queue import submit_write
 
 MAX_FAILURE_COUNT = 3  # 保留也行（仅用于展示/外部代码需要），但 log_heal_event 不再用它推进状态
 
@@ -17,28 +18,28 @@ def log_action(
     dry_run: bool,
     result: str,
     detail: str,
+    *,
+    wait: bool = False,
 ):
-    def _op() -> None:
-        conn = get_conn()
-        try:
-            q(
-                conn,
-                "INSERT INTO ops_actions(ts, action, target, params, dry_run, result, detail) VALUES(?,?,?,?,?,?,?)",
-                (
-                    int(time.time()),
-                    action,
-                    json.dumps(target, ensure_ascii=False, default=str),
-                    json.dumps(params, ensure_ascii=False, default=str),
-                    1 if dry_run else 0,
-                    result,
-                    detail,
-                ),
-            )
-            conn.commit()
-        finally:
-            conn.close()
-
-    write_with_retry(_op)
+    row = (
+        int(time.time()),
+        action,
+        json.dumps(target, ensure_ascii=False, default=str),
+        json.dumps(params, ensure_ascii=False, default=str),
+        1 if dry_run else 0,
+        result,
+        detail,
+    )
+
+    def _apply(conn) -> None:
+        q(
+            conn,
+            "INSERT INTO ops_actions(ts, action, target, params, dry_run, result, detail) VALUES(?,?,?,?,?,?,?)",
+            row,
+        )
+
+    # ✅ 走单写线程批量提交
+    submit_write(_apply, wait=wait)
 
 
 def list_events(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
@@ -98,6 +99,7 @@ def log_heal_event(
     action: str,
     result: str,
     fail_count_inc: int = 0,  # ✅ 仍保留字段，但它只影响 heal_events.fail_count（审计统计），不再影响 heal_state
+    wait: bool = False,
 ) -> Dict[str, Any]:
     """
     ✅ 纯审计：只写 heal_events（给 UI/排查看）
@@ -114,77 +116,66 @@ def log_heal_event(
 
     now_ts = int(time.time())
 
-    def _op() -> Dict[str, Any]:
-        conn = get_conn()
-        try:
-            cur = q(
-                conn,
-                "SELECT id, fail_count, is_failing FROM heal_events WHERE namespace=? AND deployment_uid=?",
-                (namespace, key_uid),
-            )
-            row = cur.fetchone()
-
-            if row:
-                new_fail = int(row["fail_count"] or 0) + inc
-
-                # ? 注意：这里的 is_failing 只是“事件表历史字段”，不作为真相。
-                # 既然按 A 真相在 heal_state，我们这里不主动改 is_failing，避免语义混乱。
-                q(
-                    conn,
-                    """
-                    UPDATE heal_events
-                    SET ts=?, deployment_name=?, pod=?, pod_uid=?, reason=?, action=?, result=?, fail_count=?
-                    WHERE id=?
-                    """,
-                    (now_ts, show_name, pod, pod_uid, reason, action, result, int(new_fail), int(row["id"])),
-                )
-
-                conn.commit()
-                return {
-                    "ok": True,
-                    "id": int(row["id"]),
-                    "fail_count": int(new_fail),
-                    "is_failing": int(row["is_failing"] or 0),
-                }
-
-            # insert new row
+    def _apply(conn) -> Dict[str, Any]:
+        cur = q(
+            conn,
+            "SELECT id, fail_count, is_failing FROM heal_events WHERE namespace=? AND deployment_uid=?",
+            (namespace, key_uid),
+        )
+        row = cur.fetchone()
+
+        if row:
+            new_fail = int(row["fail_count"] or 0) + inc
+
+            # ? 注意：这里的 is_failing 只是“事件表历史字段”，不作为真相。
+            # 既然按 A 真相在 heal_state，我们这里不主动改 is_failing，避免语义混乱。
             q(
                 conn,
                 """
-                INSERT INTO heal_events
-                  (ts, namespace, deployment_uid, deployment_name, pod, pod_uid, reason, action, result, fail_count, is_failing)
-                VALUES (?,  ?,        ?,             ?,              ?,   ?,      ?,      ?,      ?,      ?,         ?)
+                UPDATE heal_events
+                SET ts=?, deployment_name=?, pod=?, pod_uid=?, reason=?, action=?, result=?, fail_count=?
+                WHERE id=?
                 """,
-                (
-                    now_ts,
-                    namespace,
-                    key_uid,
-                    show_name,
-                    pod,
-                    pod_uid,
-                    reason,
-                    action,
-                    result,
-                    int(inc),
-                    0,  # ? 按 A：事件表的 is_failing 不作为真相，默认 0（或保留原逻辑也行，但会误导）
-                ),
+                (now_ts, show_name, pod, pod_uid, reason, action, result, int(new_fail), int(row["id"])),
             )
-
-            conn.commit()
-
-            cur2 = q(
-                conn,
-                "SELECT id, fail_count, is_failing FROM heal_events WHERE namespace=? AND deployment_uid=?",
-                (namespace, key_uid),
-            )
-            r2 = cur2.fetchone()
             return {
                 "ok": True,
-                "id": int(r2["id"]),
-                "fail_count": int(r2["fail_count"]),
-                "is_failing": int(r2["is_failing"] or 0),
+                "id": int(row["id"]),
+                "fail_count": int(new_fail),
+                "is_failing": int(row["is_failing"] or 0),
             }
-        finally:
-            conn.close()
 
-    return write_with_retry(_op)
+        # insert new row
+        cur2 = q(
+            conn,
+            """
+            INSERT INTO heal_events
+              (ts, namespace, deployment_uid, deployment_name, pod, pod_uid, reason, action, result, fail_count, is_failing)
+            VALUES (?,  ?,        ?,             ?,              ?,   ?,      ?,      ?,      ?,      ?,         ?)
+            """,
+            (
+                now_ts,
+                namespace,
+                key_uid,
+                show_name,
+                pod,
+                pod_uid,
+                reason,
+                action,
+                result,
+                int(inc),
+                0,  # ? 按 A：事件表的 is_failing 不作为真相，默认 0（或保留原逻辑也行，但会误导）
+            ),
+        )
+        return {
+            "ok": True,
+            "id": int(cur2.lastrowid or 0),
+            "fail_count": int(inc),
+            "is_failing": 0,
+        }
+
+    # ✅ 走单写线程批量提交；wait=False 时不等待落库（审计可容忍毫秒级延迟）
+    out = submit_write(_apply, wait=wait)
+    if not wait and out is None:
+        return {"ok": True, "queued": True}
+    return out
@@ -5,11 +5,12 @@ import json
 import os
 import socket
 import tempfile
+import threading
 import time
 from typing import Any, Dict, List, Optional, Set, Tuple
 
 from config import settings
-from db.utils.sqlite import get_conn, q
+from db.utils.sqlite import get_conn, q, qmany, write_with_retry
 from services.ops.actions import apply_action
 from services.ops.audit import log_heal_event
 from services.ops.k8s_api import (
@@ -214,7 +215,247 @@ def _emit_healer_alert(
     )
 
 
+# ---------------------------
+# scan-scoped state snapshot
+# ---------------------------
+
+_HEAL_STATE_COLS = "namespace, deployment_uid, deployment_name, fail_count, is_failing, reason, updated_ts, last_replicas"
+
+
+class _HealScanState:
+    """
+    一次扫描内的 heal 状态快照：
+    - 开头按命名空间批量加载 ops_cooldown / heal_state / heal_pending
+    - 扫描过程中读写都走内存 map
+    - 结尾只把变更行在一个事务里回写
+    - 回写是有条件的：行在 load() 之后被别人改过 / 删过（heal_reset 复位、heal_view 清理），
+      就跳过这一行，不拿扫描开始时的旧快照覆盖
+    """
+
+    def __init__(self, namespace: Optional[str]) -> None:
+        self.namespace = namespace
+        self.cooldown: Dict[str, int] = {}
+        # value=None 表示本轮已删除
+        self.states: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        self.pendings: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        self.dirty_cooldown: Set[str] = set()
+        self.dirty_states: Set[Tuple[str, str]] = set()
+        self.dirty_pendings: Set[Tuple[str, str]] = set()
+        # load() 时的整行快照（不存在的不记），persist 时比对
+        self.loaded_states: Dict[Tuple[str, str], Tuple[Any, ...]] = {}
+        self.loaded_pendings: Dict[Tuple[str, str], Tuple[Any, ...]] = {}
+
+    def covers_ns(self, namespace: str) -> bool:
+        return self.namespace is None or namespace == self.namespace
+
+    def covers_key(self, key: str) -> bool:
+        if self.namespace is None:
+            return key.startswith("heal:")
+        parts = key.split(":")
+        if key.startswith("heal:cooldown:") and len(parts) > 2:
+            return parts[2] == self.namespace
+        if key.startswith("heal:alert:") and len(parts) > 3:
+            return parts[3] == self.namespace
+        return False
+
+    def load(self) -> Dict[str, int]:
+        conn = get_conn()
+        try:
+            if self.namespace is None:
+                crows = q(conn, "SELECT k, ts FROM ops_cooldown WHERE k LIKE 'heal:%'", ()).fetchall()
+                srows = q(conn, f"SELECT {_HEAL_STATE_COLS} FROM heal_state", ()).fetchall()
+                prows = q(conn, "SELECT * FROM heal_pending", ()).fetchall()
+            else:
+                ns = self.namespace
+                crows = q(
+                    conn,
+                    "SELECT k, ts FROM ops_cooldown WHERE k LIKE ? OR k LIKE ?",
+                    (f"heal:cooldown:{ns}:%", f"heal:alert:%:{ns}:%"),
+                ).fetchall()
+                srows = q(conn, f"SELECT {_HEAL_STATE_COLS} FROM heal_state WHERE namespace=?", (ns,)).fetchall()
+                prows = q(conn, "SELECT * FROM heal_pending WHERE namespace=?", (ns,)).fetchall()
+        finally:
+            conn.close()
+
+        for r in crows:
+            k = str(r["k"])
+            if self.covers_key(k):
+                self.cooldown[k] = int(r["ts"])
+        for r in srows:
+            key = (str(r["namespace"]), str(r["deployment_uid"]))
+            self.loaded_states[key] = tuple(r)
+            self.states[key] = {
+                "exists": True,
+                "namespace": r["namespace"],
+                "deployment_uid": r["deployment_uid"],
+                "deployment_name": r["deployment_name"],
+                "fail_count": int(r["fail_count"] or 0),
+                "is_failing": int(r["is_failing"] or 0),
+                "reason": r["reason"] or "",
+                "updated_ts": int(r["updated_ts"] or 0),
+                "last_replicas": r["last_replicas"],
+            }
+        for r in prows:
+            key = (str(r["namespace"]), str(r["deployment_uid"]))
+            self.loaded_pendings[key] = tuple(r)
+            self.pendings[key] = dict(r)
+        return {"cooldown": len(self.cooldown), "state": len(self.states), "pending": len(self.pendings)}
+
+    def persist(self) -> Dict[str, int]:
+        if not (self.dirty_cooldown or self.dirty_states or self.dirty_pendings):
+            return {"cooldown": 0, "state": 0, "pending": 0, "skipped_changed": 0}
+
+        now = int(time.time())
+        cooldown_rows = [(k, int(self.cooldown[k])) for k in self.dirty_cooldown]
+        state_upserts: List[Tuple[Any, ...]] = []
+        state_deletes: List[Tuple[str, str]] = []
+        for key in self.dirty_states:
+            st = self.states.get(key)
+            if st is None:
+                state_deletes.append(key)
+                continue
+            state_upserts.append(
+                (
+                    key[0],
+                    key[1],
+                    st.get("deployment_name") or "",
+                    int(st.get("fail_count") or 0),
+                    int(st.get("is_failing") or 0),
+                    str(st.get("reason") or ""),
+                    int(st.get("updated_ts") or now),
+                    st.get("last_replicas"),
+                )
+            )
+        pending_upserts: List[Tuple[Any, ...]] = []
+        pending_deletes: List[Tuple[str, str]] = []
+        for key in self.dirty_pendings:
+            pd = self.pendings.get(key)
+            if pd is None:
+                pending_deletes.append(key)
+                continue
+            pending_upserts.append(
+                (
+                    key[0],
+                    key[1],
+                    int(pd.get("pending") or 0),
+                    int(pd.get("pending_until_ts") or 0),
+                    pd.get("deployment_name") or "",
+                    pd.get("last_action") or "",
+                    int(pd.get("last_action_ts") or 0),
+                    pd.get("last_pod") or "",
+                    pd.get("last_pod_uid") or "",
+                    pd.get("last_reason") or "",
+                )
+            )
+
+        applied: Dict[str, int] = {}
+
+        def _unchanged(conn, table: str, cols: str, keys: List[Tuple[str, str]], loaded: Dict) -> Set[Tuple[str, str]]:
+            """当前行与 load() 时的快照一致（或两边都不存在）的 key"""
+            out: Set[Tuple[str, str]] = set()
+            for key in keys:
+                r = q(conn, f"SELECT {cols} FROM {table} WHERE namespace=? AND deployment_uid=?", key).fetchone()
+                if (tuple(r) if r is not None else None) == loaded.get(key):
+                    out.add(key)
+            return out
+
+        def _op() -> None:
+            conn = get_conn()
+            try:
+                # ✅ 先拿写锁再比对快照：比对和回写之间不会再插进别的写
+                conn.execute("BEGIN IMMEDIATE;")
+                ok_states = _unchanged(conn, "heal_state", _HEAL_STATE_COLS, list(self.dirty_states), self.loaded_states)
+                ok_pendings = _unchanged(conn, "heal_pending", "*", list(self.dirty_pendings), self.loaded_pendings)
+                state_deletes_ok = [k for k in state_deletes if k in ok_states]
+                state_upserts_ok = [r for r in state_upserts if (r[0], r[1]) in ok_states]
+                pending_deletes_ok = [k for k in pending_deletes if k in ok_pendings]
+                pending_upserts_ok = [r for r in pending_upserts if (r[0], r[1]) in ok_pendings]
+                if cooldown_rows:
+                    qmany(
+                        conn,
+                        """
+                        INSERT INTO ops_cooldown(k, ts) VALUES(?, ?)
+                        ON CONFLICT(k) DO UPDATE SET ts=excluded.ts
+                        """,
+                        cooldown_rows,
+                    )
+                if state_deletes_ok:
+                    qmany(conn, "DELETE FROM heal_state WHERE namespace=? AND deployment_uid=?", state_deletes_ok)
+                if state_upserts_ok:
+                    qmany(
+                        conn,
+                        """
+                        INSERT INTO heal_state(
+                          namespace, deployment_uid, deployment_name,
+                          fail_count, is_failing, reason, updated_ts,
+                          last_replicas
+                        )
+                        VALUES(?,?,?,?,?,?,?,?)
+                        ON CONFLICT(namespace, deployment_uid) DO UPDATE SET
+                          deployment_name=excluded.deployment_name,
+                          fail_count=excluded.fail_count,
+                          is_failing=excluded.is_failing,
+                          reason=excluded.reason,
+                          updated_ts=excluded.updated_ts,
+                          last_replicas=COALESCE(excluded.last_replicas, heal_state.last_replicas)
+                        """,
+                        state_upserts_ok,
+                    )
+                if pending_deletes_ok:
+                    qmany(conn, "DELETE FROM heal_pending WHERE namespace=? AND deployment_uid=?", pending_deletes_ok)
+                if pending_upserts_ok:
+                    qmany(
+                        conn,
+                        """
+                        INSERT INTO heal_pending(namespace, deployment_uid, pending, pending_until_ts, deployment_name,
+                                                 last_action, last_action_ts, last_pod, last_pod_uid, last_reason)
+                        VALUES(?,?,?,?,?,?,?,?,?,?)
+                        ON CONFLICT(namespace, deployment_uid) DO UPDATE SET
+                          pending=excluded.pending,
+                          pending_until_ts=excluded.pending_until_ts,
+                          deployment_name=excluded.deployment_name,
+                          last_action=excluded.last_action,
+                          last_action_ts=excluded.last_action_ts,
+                          last_pod=excluded.last_pod,
+                          last_pod_uid=excluded.last_pod_uid,
+                          last_reason=excluded.last_reason
+                        """,
+                        pending_upserts_ok,
+                    )
+                conn.commit()
+                applied.update(
+                    state=len(state_upserts_ok) + len(state_deletes_ok),
+                    pending=len(pending_upserts_ok) + len(pending_deletes_ok),
+                    skipped_changed=len(self.dirty_states) - len(ok_states) + len(self.dirty_pendings) - len(ok_pendings),
+                )
+            finally:
+                conn.close()
+
+        write_with_retry(_op)
+        out = {
+            "cooldown": len(cooldown_rows),
+            "state": applied.get("state", 0),
+            "pending": applied.get("pending", 0),
+            "skipped_changed": applied.get("skipped_changed", 0),
+        }
+        self.dirty_cooldown.clear()
+        self.dirty_states.clear()
+        self.dirty_pendings.clear()
+        return out
+
+
+_scan_local = threading.local()
+
+
+def _scan_state() -> Optional[_HealScanState]:
+    return getattr(_scan_local, "state", None)
+
+
 def _get_last_ts(key: str) -> Optional[int]:
+    ss = _scan_state()
+    if ss is not None and ss.covers_key(key):
+        return ss.cooldown.get(key)
+
     conn = get_conn()
     try:
         cur = q(conn, "SELECT ts FROM ops_cooldown WHERE k=?", (key,))
@@ -225,6 +466,12 @@ def _get_last_ts(key: str) -> Optional[int]:
 
 
 def _set_last_ts(key: str, ts: int) -> None:
+    ss = _scan_state()
+    if ss is not None and ss.covers_key(key):
+        ss.cooldown[key] = int(ts)
+        ss.dirty_cooldown.add(key)
+        return
+
     conn = get_conn()
     try:
         q(
@@ -241,6 +488,13 @@ def _set_last_ts(key: str, ts: int) -> None:
 
 
 def _get_deploy_state(namespace: str, deployment_uid: str) -> Dict[str, Any]:
+    ss = _scan_state()
+    if ss is not None and ss.covers_ns(namespace):
+        st = ss.states.get((namespace, deployment_uid))
+        if not st:
+            return {"exists": False, "fail_count": 0, "is_failing": 0}
+        return {k: v for k, v in st.items() if k not in ("last_replicas", "updated_ts")}
+
     conn = get_conn()
     try:
         cur = q(
@@ -265,6 +519,15 @@ def _get_deploy_state(namespace: str, deployment_uid: str) -> Dict[str, Any]:
 
 
 def _clear_deploy_state(namespace: str, deployment_uid: str) -> None:
+    ss = _scan_state()
+    if ss is not None and ss.covers_ns(namespace):
+        key = (namespace, deployment_uid)
+        ss.states[key] = None
+        ss.pendings[key] = None
+        ss.dirty_states.add(key)
+        ss.dirty_pendings.add(key)
+        return
+
     conn = get_conn()
     try:
         q(conn, "DELETE FROM heal_state WHERE namespace=? AND deployment_uid=?", (namespace, deployment_uid))
@@ -296,6 +559,26 @@ def _set_deploy_state(
         if not _deployment_exists_cached(namespace, deployment_name, deployment_uid):
             _clear_deploy_state(namespace, deployment_uid)
             return
+
+    ss = _scan_state()
+    if ss is not None and ss.covers_ns(namespace):
+        key = (namespace, deployment_uid)
+        prev = ss.states.get(key) or {}
+        ss.states[key] = {
+            "exists": True,
+            "namespace": namespace,
+            "deployment_uid": deployment_uid,
+            "deployment_name": deployment_name,
+            "fail_count": int(fail_count),
+            "is_failing": int(is_failing),
+            "reason": str(reason or ""),
+            "updated_ts": int(time.time()),
+            # ✅ 与 SQL 的 COALESCE 语义一致：不传则保留旧值
+            "last_replicas": prev.get("last_replicas") if last_replicas is None else int(last_replicas),
+        }
+        ss.dirty_states.add(key)
+        return
+
     conn = get_conn()
     try:
         now = int(time.time())
@@ -356,6 +639,13 @@ def _decay_fail_count(namespace: str, deployment_uid: str, step: int) -> int:
 
 
 def _get_pending(namespace: str, deployment_uid: str) -> Dict[str, Any]:
+    ss = _scan_state()
+    if ss is not None and ss.covers_ns(namespace):
+        pd = ss.pendings.get((namespace, deployment_uid))
+        if not pd:
+            return {"exists": False}
+        return dict(pd)
+
     conn = get_conn()
     try:
         cur = q(
@@ -388,6 +678,27 @@ def _set_pending(
         if not _deployment_exists_cached(namespace, deployment_name, deployment_uid):
             _clear_deploy_state(namespace, deployment_uid)
             return
+
+    row = {
+        "namespace": namespace,
+        "deployment_uid": deployment_uid,
+        "pending": 1,
+        "pending_until_ts": int(pending_until_ts),
+        "deployment_name": deployment_name or "",
+        "last_action": last_action or "",
+        "last_action_ts": int(last_action_ts),
+        "last_pod": last_pod or "",
+        "last_pod_uid": last_pod_uid or "",
+        "last_reason": last_reason or "",
+    }
+
+    ss = _scan_state()
+    if ss is not None and ss.covers_ns(namespace):
+        key = (namespace, deployment_uid)
+        ss.pendings[key] = row
+        ss.dirty_pendings.add(key)
+        return
+
     conn = get_conn()
     try:
         q(
@@ -409,14 +720,14 @@ def _set_pending(
             (
                 namespace,
                 deployment_uid,
-                1,
-                int(pending_until_ts),
-                deployment_name or "",
-                last_action or "",
-                int(last_action_ts),
-                last_pod or "",
-                last_pod_uid or "",
-                last_reason or "",
+                row["pending"],
+                row["pending_until_ts"],
+                row["deployment_name"],
+                row["last_action"],
+                row["last_action_ts"],
+                row["last_pod"],
+                row["last_pod_uid"],
+                row["last_reason"],
             ),
         )
         conn.commit()
@@ -425,6 +736,13 @@ def _set_pending(
 
 
 def _clear_pending(namespace: str, deployment_uid: str) -> None:
+    ss = _scan_state()
+    if ss is not None and ss.covers_ns(namespace):
+        key = (namespace, deployment_uid)
+        ss.pendings[key] = None
+        ss.dirty_pendings.add(key)
+        return
+
     conn = get_conn()
     try:
         q(conn, "DELETE FROM heal_pending WHERE namespace=? AND deployment_uid=?", (namespace, deployment_uid))
@@ -695,15 +1013,20 @@ def _process_pending_heals(
     circuit_opened = 0
     details: List[Dict[str, Any]] = []
 
-    conn = get_conn()
-    try:
-        if namespace:
-            cur = q(conn, "SELECT * FROM heal_pending WHERE namespace=?", (namespace,))
-        else:
-            cur = q(conn, "SELECT * FROM heal_pending", ())
-        pendings = cur.fetchall()
-    finally:
-        conn.close()
+    ss = _scan_state()
+    if ss is not None and ss.namespace == namespace:
+        # ✅ 扫描开头已批量加载；这里只取快照（list() 防止遍历中被修改）
+        pendings = [dict(v) for v in list(ss.pendings.values()) if v]
+    else:
+        conn = get_conn()
+        try:
+            if namespace:
+                cur = q(conn, "SELECT * FROM heal_pending WHERE namespace=?", (namespace,))
+            else:
+                cur = q(conn, "SELECT * FROM heal_pending", ())
+            pendings = cur.fetchall()
+        finally:
+            conn.close()
 
     pod_index: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
     for p in pods:
@@ -896,9 +1219,74 @@ def run_heal_scan_once(namespace: Optional[str] = None) -> Dict[str, Any]:
 
     deny_ns, only_reasons = _load_policy_sets()
 
+    # ✅ 分阶段耗时：list / classify / state_load / act / persist
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
     pods = list_pods(namespace=namespace)
+    timings["list_ms"] = (time.perf_counter() - t0) * 1000.0
     checked = len(pods)
 
+    t0 = time.perf_counter()
+    reasons = [_classify_reason(p) for p in pods]
+    timings["classify_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    # ✅ 批量预加载本轮涉及命名空间的 cooldown/state/pending，避免每个 pod 3 次查询
+    t0 = time.perf_counter()
+    ss = _HealScanState(namespace)
+    loaded = ss.load()
+    timings["state_load_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    _scan_local.state = ss
+    try:
+        t0 = time.perf_counter()
+        summary = _run_scan_actions(
+            pods=pods,
+            reasons=reasons,
+            namespace=namespace,
+            execute=execute,
+            max_per_cycle=max_per_cycle,
+            cooldown_sec=cooldown_sec,
+            verify_sec=verify_sec,
+            alert_cooldown_sec=alert_cooldown_sec,
+            deny_ns=deny_ns,
+            only_reasons=only_reasons,
+        )
+        timings["act_ms"] = (time.perf_counter() - t0) * 1000.0
+    finally:
+        _scan_local.state = None
+        t0 = time.perf_counter()
+        persisted = ss.persist()
+        timings["persist_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    return {
+        "ok": True,
+        "checked": checked,
+        **summary,
+        "max_per_cycle": max_per_cycle,
+        "cooldown_sec": cooldown_sec,
+        "verify_sec": verify_sec,
+        "alert_cooldown_sec": alert_cooldown_sec,
+        "deny_ns": sorted(list(deny_ns)),
+        "only_reasons": sorted(list(only_reasons)),
+        "state_loaded": loaded,
+        "state_persisted": persisted,
+        "timings_ms": {k: round(v, 2) for k, v in timings.items()},
+    }
+
+
+def _run_scan_actions(
+    *,
+    pods: List[Dict[str, Any]],
+    reasons: List[str],
+    namespace: Optional[str],
+    execute: bool,
+    max_per_cycle: int,
+    cooldown_sec: int,
+    verify_sec: int,
+    alert_cooldown_sec: int,
+    deny_ns: Set[str],
+    only_reasons: Set[str],
+) -> Dict[str, Any]:
     dry_run = (not execute)
     healed = 0
     skipped = 0
@@ -911,7 +1299,7 @@ def run_heal_scan_once(namespace: Optional[str] = None) -> Dict[str, Any]:
     if pending_report["processed"] > 0:
         details.append({"stage": "process_pending", **pending_report})
 
-    for p in pods:
+    for p, reason in zip(pods, reasons):
         ns = p.get("namespace", "default")
         name = p.get("name", "")
         pod_uid = p.get("pod_uid") or "unknown"
@@ -932,7 +1320,6 @@ def run_heal_scan_once(namespace: Optional[str] = None) -> Dict[str, Any]:
             details.append({"namespace": ns, "pod": name, "skipped": True, "reason": "namespace_denied"})
             continue
 
-        reason = _classify_reason(p)
         if not reason:
             skipped += 1
             details.append({"namespace": ns, "pod": name, "skipped": True, "reason": "no_reason_found"})
@@ -1088,17 +1475,9 @@ def run_heal_scan_once(namespace: Optional[str] = None) -> Dict[str, Any]:
             break
 
     return {
-        "ok": True,
-        "checked": checked,
         "healed": healed,
         "dry_run": dry_run,
         "attempted": attempted,
         "skipped": skipped,
-        "max_per_cycle": max_per_cycle,
-        "cooldown_sec": cooldown_sec,
-        "verify_sec": verify_sec,
-        "alert_cooldown_sec": alert_cooldown_sec,
-        "deny_ns": sorted(list(deny_ns)),
-        "only_reasons": sorted(list(only_reasons)),
         "details": details,
     }
@@ -1,10 +1,13 @@
 # services/ops/k8s_api.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from services.k8s.kubectl_runner import run_kubectl
 from services.k8s.kube_client import get_core_v1, get_apps_v1
+from services.k8s.informer import cached_list
 
 
 def _safe_k8s_client_enabled() -> bool:
@@ -36,14 +39,153 @@ def _get_deployment_uid_from_rs(namespace: str, rs_name: str) -> str:
         return "unknown"
 
 
+# ---------------------------
+# ReplicaSet -> Deployment owner index
+# ---------------------------
+# ✅ 一次 LIST ReplicaSet 建索引：(ns, rs_name) -> (rs_uid, deployment_name, deployment_uid)
+# - TTL 内直接复用
+# - pod 的 ownerRef.uid 与索引里的 rs_uid 不一致（同名 RS 被重建）或查不到：触发一次重新 LIST（限频）
+# - 重新 LIST 带上次的 resourceVersion（NotOlderThan），apiserver 可直接走 watch cache
+
+RS_OWNER_TTL_SEC = 60
+RS_OWNER_MIN_RELIST_SEC = 5
+
+_rs_owner_lock = threading.Lock()
+_rs_owner_index: Dict[Tuple[str, str], Tuple[str, str, str]] = {}
+_rs_owner_scopes: Dict[str, Dict[str, Any]] = {}  # scope("" = all namespaces) -> {"loaded_at", "rv"}
+_rs_owner_stats: Dict[str, int] = {"hits": 0, "misses": 0, "relists": 0, "fallback_reads": 0}
+_rs_owner_client: Any = None  # 切换集群后 kube_client 会重建 AppsV1Api -> 索引作废
+
+
+def _rs_scope_fresh(scope: str, now: float) -> bool:
+    for sc in (scope, ""):
+        info = _rs_owner_scopes.get(sc)
+        if info and (now - float(info.get("loaded_at") or 0)) < RS_OWNER_TTL_SEC:
+            return True
+    return False
+
+
+def _list_replica_sets(namespace: Optional[str], rv: str):
+    apps = get_apps_v1()
+    kwargs: Dict[str, Any] = {}
+    if rv:
+        kwargs = {"resource_version": rv, "resource_version_match": "NotOlderThan"}
+    try:
+        if namespace:
+            return apps.list_namespaced_replica_set(namespace=namespace, **kwargs)
+        return apps.list_replica_set_for_all_namespaces(**kwargs)
+    except TypeError:
+        # 老版本 client 不支持 resource_version_match
+        if namespace:
+            return apps.list_namespaced_replica_set(namespace=namespace)
+        return apps.list_replica_set_for_all_namespaces()
+
+
+def _relist_rs_owners(namespace: Optional[str]) -> None:
+    """调用方需持有 _rs_owner_lock"""
+    scope = namespace or ""
+    prev_rv = str((_rs_owner_scopes.get(scope) or {}).get("rv") or "")
+    rs_list = _list_replica_sets(namespace, prev_rv)
+    _rs_owner_stats["relists"] += 1
+
+    if namespace:
+        for k in [k for k in _rs_owner_index if k[0] == namespace]:
+            del _rs_owner_index[k]
+    else:
+        _rs_owner_index.clear()
+
+    for rs in rs_list.items or []:
+        md = rs.metadata
+        # ✅ 没有 Deployment owner（独立 RS / Argo Rollout 等）：名字按原来的切分规则，uid 记 unknown（与回退路径一致）
+        dep_name = _parse_deployment_from_replicaset(str(md.name or ""))
+        dep_uid = "unknown"
+        for o in md.owner_references or []:
+            if getattr(o, "kind", None) == "Deployment" and getattr(o, "uid", None):
+                dep_name = str(o.name or "unknown")
+                dep_uid = str(o.uid)
+                break
+        _rs_owner_index[(str(md.namespace), str(md.name))] = (str(md.uid or ""), dep_name, dep_uid)
+
+    _rs_owner_scopes[scope] = {
+        "loaded_at": time.monotonic(),
+        "rv": str(getattr(rs_list.metadata, "resource_version", "") or ""),
+    }
+
+
+def _ensure_rs_owner_index(namespace: Optional[str]) -> None:
+    global _rs_owner_client
+    apps = get_apps_v1()
+    with _rs_owner_lock:
+        if apps is not _rs_owner_client:
+            _rs_owner_index.clear()
+            _rs_owner_scopes.clear()
+            _rs_owner_client = apps
+        if _rs_scope_fresh(namespace or "", time.monotonic()):
+            return
+        try:
+            _relist_rs_owners(namespace)
+        except Exception:
+            pass
+
+
+def resolve_rs_owner(namespace: str, rs_name: str, rs_uid: Optional[str] = None) -> Tuple[str, str]:
+    """
+    ReplicaSet -> (deployment_name, deployment_uid)
+    - 先查索引；未命中/uid 不一致时限频重新 LIST 一次
+    - 仍拿不到：回退单个 read_namespaced_replica_set + 名字切分
+    """
+    key = (namespace, rs_name)
+    with _rs_owner_lock:
+        hit = _rs_owner_index.get(key)
+        valid = hit is not None and (not rs_uid or not hit[0] or hit[0] == str(rs_uid))
+        if valid:
+            _rs_owner_stats["hits"] += 1
+            return hit[1], hit[2]
+
+        _rs_owner_stats["misses"] += 1
+        info = _rs_owner_scopes.get(namespace) or _rs_owner_scopes.get("") or {}
+        if (time.monotonic() - float(info.get("loaded_at") or 0)) >= RS_OWNER_MIN_RELIST_SEC:
+            try:
+                _relist_rs_owners(namespace)
+            except Exception:
+                pass
+            hit = _rs_owner_index.get(key)
+            if hit is not None and (not rs_uid or not hit[0] or hit[0] == str(rs_uid)):
+                return hit[1], hit[2]
+
+        _rs_owner_stats["fallback_reads"] += 1
+
+    dep_uid = _get_deployment_uid_from_rs(namespace, rs_name)
+    return _parse_deployment_from_replicaset(rs_name), dep_uid
+
+
+def rs_owner_cache_stats() -> Dict[str, Any]:
+    with _rs_owner_lock:
+        now = time.monotonic()
+        return {
+            **_rs_owner_stats,
+            "entries": len(_rs_owner_index),
+            "scopes": {
+                (sc or "*"): {"age_sec": round(now - float(v.get("loaded_at") or 0), 1), "rv": v.get("rv")}
+                for sc, v in _rs_owner_scopes.items()
+            },
+        }
+
+
 def list_pods(namespace: Optional[str] = None) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
 
     if _safe_k8s_client_enabled():
-        v1 = get_core_v1()
-        pods = v1.list_namespaced_pod(namespace=namespace) if namespace else v1.list_pod_for_all_namespaces()
-
-        for p in pods.items:
+        # ✅ informer 快照可用就不再全量 LIST pods
+        items = cached_list("pods", namespace)
+        if items is None:
+            v1 = get_core_v1()
+            pods = v1.list_namespaced_pod(namespace=namespace) if namespace else v1.list_pod_for_all_namespaces()
+            items = pods.items
+        # ✅ 每次扫描最多一次 LIST ReplicaSet（TTL 内复用），替代逐 pod read_namespaced_replica_set
+        _ensure_rs_owner_index(namespace)
+
+        for p in items:
             controller_kind = None
             controller_name = None
             deployment_name = "unknown"
@@ -55,8 +197,9 @@ def list_pods(namespace: Optional[str] = None) -> List[Dict[str, Any]]:
                 controller_name = owners[0].name
 
                 if controller_kind == "ReplicaSet" and controller_name:
-                    deployment_name = _parse_deployment_from_replicaset(controller_name)
-                    deployment_uid = _get_deployment_uid_from_rs(p.metadata.namespace, controller_name)
+                    deployment_name, deployment_uid = resolve_rs_owner(
+                        p.metadata.namespace, controller_name, getattr(owners[0], "uid", None)
+                    )
 
             pod_uid = p.metadata.uid or "unknown"
 
@@ -1,6 +1,7 @@
 # services/ops/runtime_config.py
 from __future__ import annotations
 
+import threading
 import time
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple, Literal
@@ -42,6 +43,7 @@ def _set_config(k: str, v: str) -> None:
         conn.commit()
     finally:
         conn.close()
+    bump_config_version()
 
 
 def _del_config(k: str) -> None:
@@ -51,6 +53,7 @@ def _del_config(k: str) -> None:
         conn.commit()
     finally:
         conn.close()
+    bump_config_version()
 
 
 def _list_configs() -> Dict[str, str]:
@@ -66,6 +69,104 @@ def _list_configs() -> Dict[str, str]:
         conn.close()
 
 
+def _probe_configs() -> Tuple[int, int]:
+    """
+    轻量探测：行数 + 最大 updated_ts
+    - 用于发现其他进程 / 直接写表（如 activate_cluster）带来的变化
+    """
+    conn = get_conn()
+    try:
+        cur = q(conn, "SELECT COUNT(*) AS n, COALESCE(MAX(updated_ts), 0) AS ts FROM ops_config", ())
+        row = cur.fetchone()
+        return int(row["n"] or 0), int(row["ts"] or 0)
+    finally:
+        conn.close()
+
+
+# ---------------------------
+# effective-config cache
+# ---------------------------
+# ✅ 进程内快照：ops_config 整表 -> dict，读配置退化为一次 dict 查找
+# - 本进程写入（set_overrides/delete_override/activate_cluster）会 bump 版本号 -> 下次读取重载
+# - 跨进程写入：最多每 CONFIG_CACHE_PROBE_MS 做一次 COUNT/MAX(updated_ts) 探测
+
+CONFIG_CACHE_PROBE_MS = 1000
+
+_cache_lock = threading.Lock()
+_cache_version = 0
+_cache_loaded_version = -1
+_cache_probe_sig: Optional[Tuple[int, int]] = None
+_cache_probe_at = 0.0
+_cache_raw: Dict[str, str] = {}
+_cache_effective: Dict[str, Tuple[Any, str]] = {}
+_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "reloads": 0, "probes": 0}
+
+
+def bump_config_version() -> int:
+    """
+    标记 ops_config 已变化：下一次 get_value 会重新加载快照
+    """
+    global _cache_version
+    with _cache_lock:
+        _cache_version += 1
+        return _cache_version
+
+
+def _probe_interval_sec() -> float:
+    try:
+        ms = int(getattr(settings, "OPS_CONFIG_CACHE_PROBE_MS", CONFIG_CACHE_PROBE_MS))
+    except Exception:
+        ms = CONFIG_CACHE_PROBE_MS
+    return max(ms, 0) / 1000.0
+
+
+def _ensure_snapshot() -> None:
+    """
+    保证快照是新的；调用方需持有 _cache_lock
+    """
+    global _cache_loaded_version, _cache_probe_sig, _cache_probe_at, _cache_raw, _cache_effective
+
+    now = time.monotonic()
+    stale = _cache_loaded_version != _cache_version
+
+    if not stale and (now - _cache_probe_at) >= _probe_interval_sec():
+        _cache_probe_at = now
+        _cache_stats["probes"] += 1
+        sig = _probe_configs()
+        stale = sig != _cache_probe_sig
+
+    if not stale:
+        _cache_stats["hits"] += 1
+        return
+
+    _cache_stats["misses"] += 1
+    _cache_stats["reloads"] += 1
+    _cache_raw = _list_configs()
+    _cache_effective = {}
+    _cache_probe_sig = _probe_configs()
+    _cache_probe_at = now
+    _cache_loaded_version = _cache_version
+
+
+def _snapshot_raw() -> Dict[str, str]:
+    with _cache_lock:
+        _ensure_snapshot()
+        return dict(_cache_raw)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    with _cache_lock:
+        total = _cache_stats["hits"] + _cache_stats["misses"]
+        return {
+            **_cache_stats,
+            "hit_ratio": (float(_cache_stats["hits"]) / total) if total else 0.0,
+            "version": _cache_version,
+            "loaded_version": _cache_loaded_version,
+            "keys": len(_cache_raw),
+            "probe_interval_ms": int(_probe_interval_sec() * 1000),
+        }
+
+
 # ---------------------------
 # parse helpers
 # ---------------------------
@@ -403,6 +504,31 @@ SPECS: Dict[str, ConfigSpec] = {
         desc="巡检是否启用 Prometheus 检查（关闭后 Prometheus 不可用也不影响巡检）",
         example="1",
     ),
+    # ---- k8s informer ----
+    "INFORMER_PODS_ENABLED": ConfigSpec(
+        key="INFORMER_PODS_ENABLED",
+        typ="bool",
+        desc="Pod 走 watch informer 内存快照（关闭则每次直接 LIST）",
+        example="1",
+    ),
+    "INFORMER_NODES_ENABLED": ConfigSpec(
+        key="INFORMER_NODES_ENABLED",
+        typ="bool",
+        desc="Node 走 watch informer 内存快照（关闭则每次直接 LIST）",
+        example="1",
+    ),
+    "INFORMER_DEPLOYMENTS_ENABLED": ConfigSpec(
+        key="INFORMER_DEPLOYMENTS_ENABLED",
+        typ="bool",
+        desc="Deployment 走 watch informer 内存快照（关闭则每次直接 LIST）",
+        example="1",
+    ),
+    "INFORMER_EVENTS_ENABLED": ConfigSpec(
+        key="INFORMER_EVENTS_ENABLED",
+        typ="bool",
+        desc="Event 走 watch informer 内存快照（关闭则每次直接 LIST）",
+        example="1",
+    ),
 }
 
 
@@ -421,11 +547,20 @@ def get_value(k: str) -> Tuple[Any, str]:
         # 未加入白名单的不允许被 UI 管控（但内部如果想用也可以自己加到 SPECS）
         return _settings_default(k), "env"
 
-    raw = _get_config(k)
-    default = _settings_default(k)
-    if raw is None:
-        return spec.parse(None, default), "env"
-    return spec.parse(raw, default), "db"
+    with _cache_lock:
+        _ensure_snapshot()
+        hit = _cache_effective.get(k)
+        if hit is not None:
+            return hit
+
+        raw = _cache_raw.get(k)
+        default = _settings_default(k)
+        if raw is None:
+            out = (spec.parse(None, default), "env")
+        else:
+            out = (spec.parse(raw, default), "db")
+        _cache_effective[k] = out
+        return out
 
 
 def get_public_items() -> List[Dict[str, Any]]:
@@ -436,7 +571,7 @@ def get_public_items() -> List[Dict[str, Any]]:
     - has_value：告诉前端该值是否真实“已设置”
     - choices：给前端做下拉（可选）
     """
-    db_all = _list_configs()
+    db_all = _snapshot_raw()
     items: List[Dict[str, Any]] = []
 
     for k, spec in SPECS.items():
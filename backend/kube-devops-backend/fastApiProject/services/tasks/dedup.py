@@ -0,0 +1,107 @@
+# services/tasks/dedup.py
+"""
+异步 AI 任务去重 / 结果复用
+
+- idem_key = build_cache_key("task:<type>", **规范化后的 input)：去掉 None / 空串，字符串 strip，
+  cache_ttl 不参与（只影响能否复用结果，不影响结果本身）
+- 相同 key 的任务还在 PENDING / RUNNING → 直接挂到这个任务上（不再插新行、不再重算）
+- 相同 key 的任务 TASK_DEDUP_RESULT_TTL_SEC 内 SUCCESS 过 → 直接返回它的 result_json
+  （input 里带 cache_ttl 的取两者较小值；cache_ttl=0 表示调用方不要缓存结果）
+"""
+from __future__ import annotations
+
+import threading
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from db.tasks.repo import create_or_attach_task, create_task
+from services.ai.forecast_core import build_cache_key
+
+TASK_DEDUP_RESULT_TTL_SEC = 120
+TASK_DEDUP_ATTACH_MAX_AGE_SEC = 600
+_KEY_IGNORE = {"cache_ttl"}
+
+_lock = threading.Lock()
+_stats: Dict[str, int] = {"created": 0, "attached": 0, "cached": 0, "disabled": 0}
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def dedup_enabled() -> bool:
+    return bool(_setting("TASK_DEDUP_ENABLED", True))
+
+
+def _normalize(payload: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in (payload or {}).items():
+        if k in _KEY_IGNORE:
+            continue
+        if isinstance(v, str):
+            v = v.strip()
+        if v is None or v == "":
+            continue
+        out[str(k)] = v
+    return out
+
+
+def task_idem_key(task_type: str, payload: Dict[str, Any]) -> str:
+    return build_cache_key(f"task:{task_type}", **_normalize(payload))
+
+
+def _result_ttl_sec(payload: Dict[str, Any]) -> int:
+    ttl = max(0, int(_setting("TASK_DEDUP_RESULT_TTL_SEC", TASK_DEDUP_RESULT_TTL_SEC)))
+    cache_ttl = (payload or {}).get("cache_ttl")
+    if cache_ttl is not None:
+        try:
+            ttl = min(ttl, max(0, int(cache_ttl)))
+        except (TypeError, ValueError):
+            pass
+    return ttl
+
+
+def submit_task(
+    task_type: str,
+    payload: Dict[str, Any],
+    *,
+    task_id: Optional[str] = None,
+    attach_max_age_sec: int = TASK_DEDUP_ATTACH_MAX_AGE_SEC,
+) -> Tuple[Dict[str, Any], str]:
+    """
+    提交异步任务（带去重）；返回 (任务, mode)，mode = created / attached / cached
+    任务 dict 与 db.tasks.repo.get_task 一致（created 且去重关闭时为 create_task 的返回）
+    """
+    task_id = task_id or uuid.uuid4().hex
+    if not dedup_enabled():
+        task = create_task(task_id=task_id, type=task_type, input_json=payload)
+        with _lock:
+            _stats["disabled"] += 1
+        return task, "created"
+
+    task, mode = create_or_attach_task(
+        task_id=task_id,
+        type=task_type,
+        input_json=payload,
+        idem_key=task_idem_key(task_type, payload),
+        attach_max_age_sec=attach_max_age_sec,
+        result_ttl_sec=_result_ttl_sec(payload),
+    )
+    with _lock:
+        _stats[mode] = _stats.get(mode, 0) + 1
+    return task, mode
+
+
+def dedup_stats() -> Dict[str, Any]:
+    with _lock:
+        out: Dict[str, Any] = dict(_stats)
+    submits = out["created"] + out["attached"] + out["cached"]
+    out["reuse_ratio"] = round((out["attached"] + out["cached"]) / submits, 4) if submits else 0.0
+    out["enabled"] = dedup_enabled()
+    out["result_ttl_sec"] = max(0, int(_setting("TASK_DEDUP_RESULT_TTL_SEC", TASK_DEDUP_RESULT_TTL_SEC)))
+    return out
@@ -0,0 +1,254 @@
+# services/tasks/events.py
+"""
+任务进度事件总线 + SSE 流（替代客户端轮询 /api/ai/tasks/{id}、/api/tasks/{id}）
+
+- 发布：db.tasks.repo 的 create_task / claim / update_task_status / set_task_control 写入生效后回调
+  → 每次状态变化只有一次 DB 写，N 个订阅者不再各自每秒读 DB
+- 每个事件一个全局递增 id；最近 TASK_EVENTS_BUFFER 个事件留在环形缓冲里，
+  断线重连带 Last-Event-ID 时从缓冲补发；缓冲已覆盖不到（或首次连接）时读一次 DB 发快照
+- 每个订阅者一个有界 asyncio.Queue（TASK_EVENTS_SUB_QUEUE）；满了丢事件并标记 lagged，
+  下次循环读一次 DB 快照重新对齐，慢客户端不会拖住写线程
+- 心跳：TASK_EVENTS_HEARTBEAT_SEC 没有事件就发一行注释（: ping），防代理断开空闲连接
+- 订阅的任务全部进入终态后关闭流
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from db.tasks.repo import add_task_status_listener, get_task
+
+TASK_EVENTS_BUFFER = 4096
+TASK_EVENTS_SUB_QUEUE = 256
+TASK_EVENTS_HEARTBEAT_SEC = 15
+TASK_EVENTS_MAX_IDS = 100
+TASK_EVENTS_RETRY_MS = 3000
+
+TERMINAL_STATUSES = {"SUCCESS", "FAILED", "RESTRICTED", "CANCELLED", "UNKNOWN"}
+
+
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+class _Subscriber:
+    def __init__(self, ids: Optional[Set[str]], loop: asyncio.AbstractEventLoop, maxsize: int) -> None:
+        self.ids = ids
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max(1, int(maxsize)))
+        self.lagged = False
+        self.dropped = 0
+
+    def wants(self, task_id: str) -> bool:
+        return self.ids is None or task_id in self.ids
+
+    def _put(self, ev: Dict[str, Any]) -> None:
+        # 只在订阅者自己的事件循环线程里执行
+        try:
+            self.queue.put_nowait(ev)
+        except asyncio.QueueFull:
+            self.lagged = True
+            self.dropped += 1
+
+    def push(self, ev: Dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, ev)
+        except RuntimeError:
+            # 事件循环已关闭：连接已断，等 unsubscribe
+            pass
+
+
+class TaskEventBus:
+    def __init__(self, buffer_size: Optional[int] = None, sub_queue: Optional[int] = None) -> None:
+        size = int(buffer_size if buffer_size is not None else _setting("TASK_EVENTS_BUFFER", TASK_EVENTS_BUFFER))
+        self.sub_queue = int(
+            sub_queue if sub_queue is not None else _setting("TASK_EVENTS_SUB_QUEUE", TASK_EVENTS_SUB_QUEUE)
+        )
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._buf: Deque[Dict[str, Any]] = deque(maxlen=max(1, size))
+        self._subs: Set[_Subscriber] = set()
+        self._stats: Dict[str, int] = {"published": 0, "delivered": 0, "replayed": 0, "snapshots": 0}
+
+    # ---------- 发布 ----------
+    def publish(self, task_id: str, change: Dict[str, Any]) -> int:
+        with self._lock:
+            self._seq += 1
+            ev = {"id": self._seq, "task_id": str(task_id), "data": dict(change, task_id=str(task_id))}
+            self._buf.append(ev)
+            subs = [s for s in self._subs if s.wants(ev["task_id"])]
+            self._stats["published"] += 1
+            self._stats["delivered"] += len(subs)
+        for s in subs:
+            s.push(ev)
+        return ev["id"]
+
+    # ---------- 订阅 ----------
+    def subscribe(self, ids: Optional[Iterable[str]], loop: asyncio.AbstractEventLoop) -> _Subscriber:
+        sub = _Subscriber(set(ids) if ids is not None else None, loop, self.sub_queue)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def last_id(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def replay(self, ids: Set[str], after_id: int) -> Optional[List[Dict[str, Any]]]:
+        """after_id 之后的缓冲事件；缓冲已经覆盖不到 after_id（有缺口）返回 None"""
+        with self._lock:
+            if after_id > self._seq:
+                return None
+            oldest = self._buf[0]["id"] if self._buf else self._seq + 1
+            if after_id + 1 < oldest:
+                return None
+            out = [ev for ev in self._buf if ev["id"] > after_id and ev["task_id"] in ids]
+            self._stats["replayed"] += len(out)
+        return out
+
+    def count_snapshot(self) -> None:
+        with self._lock:
+            self._stats["snapshots"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(
+                {
+                    "last_id": self._seq,
+                    "buffered": len(self._buf),
+                    "buffer_size": self._buf.maxlen,
+                    "subscribers": len(self._subs),
+                    "lagged_subscribers": sum(1 for s in self._subs if s.lagged),
+                    "dropped": sum(s.dropped for s in self._subs),
+                }
+            )
+        return out
+
+
+task_event_bus = TaskEventBus()
+add_task_status_listener(task_event_bus.publish)
+
+
+# ---------- SSE ----------
+def _sse(event_id: Optional[int], event: str, data: Dict[str, Any]) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _snapshot(task_id: str) -> Dict[str, Any]:
+    row = get_task(task_id)
+    if not row:
+        return {"task_id": task_id, "status": "NOT_FOUND"}
+    return {
+        "task_id": task_id,
+        "type": row.get("type"),
+        "status": row.get("status"),
+        "progress": row.get("progress"),
+        "error": row.get("error"),
+        "result": row.get("result"),
+        "updated_at": row.get("updated_at"),
+        "snapshot": True,
+    }
+
+
+def parse_last_event_id(raw: Optional[str]) -> Optional[int]:
+    try:
+        v = int(str(raw or "").strip())
+    except ValueError:
+        return None
+    return v if v >= 0 else None
+
+
+async def task_event_stream(
+    ids: List[str],
+    *,
+    last_event_id: Optional[int] = None,
+    is_disconnected=None,
+    heartbeat_sec: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """
+    SSE 文本流：event: task（状态变化 / 快照）、: ping（心跳）、event: end（全部终态）
+    is_disconnected：可选的 async callable（Request.is_disconnected），心跳时检查
+    """
+    watch = set(ids)
+    hb = float(heartbeat_sec if heartbeat_sec is not None else _setting("TASK_EVENTS_HEARTBEAT_SEC", TASK_EVENTS_HEARTBEAT_SEC))
+    loop = asyncio.get_running_loop()
+    sub = task_event_bus.subscribe(watch, loop)
+    status: Dict[str, str] = {}
+
+    async def _snapshots() -> Tuple[int, List[str]]:
+        base = task_event_bus.last_id()
+        task_event_bus.count_snapshot()
+        out = []
+        for tid in ids:
+            snap = await asyncio.to_thread(_snapshot, tid)
+            status[tid] = str(snap.get("status") or "")
+            out.append(_sse(base, "task", snap))
+        return base, out
+
+    def _done() -> bool:
+        return all(status.get(t) in TERMINAL_STATUSES or status.get(t) == "NOT_FOUND" for t in watch)
+
+    try:
+        yield f"retry: {TASK_EVENTS_RETRY_MS}\n\n"
+        sent = 0
+        replay = task_event_bus.replay(watch, last_event_id) if last_event_id is not None else None
+        if replay is None:
+            sent, chunks = await _snapshots()
+            for c in chunks:
+                yield c
+        else:
+            # 断线续传：缓冲还在，只补发缺的；是否已全部终态仍以 DB 当前状态为准
+            sent = last_event_id
+            for ev in replay:
+                sent = ev["id"]
+                yield _sse(ev["id"], "task", ev["data"])
+            for tid in ids:
+                snap = await asyncio.to_thread(_snapshot, tid)
+                status[tid] = str(snap.get("status") or "")
+
+        # 已全部终态时，队列里若还有事件（例如带 result 的完成事件）也先发完
+        while not (_done() and sub.queue.empty()):
+            if sub.lagged:
+                # 队列溢出丢过事件：清空后读一次 DB 重新对齐
+                sub.lagged = False
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sent, chunks = await _snapshots()
+                for c in chunks:
+                    yield c
+                continue
+            try:
+                ev = await asyncio.wait_for(sub.queue.get(), timeout=hb)
+            except asyncio.TimeoutError:
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            if ev["id"] <= sent:
+                continue
+            sent = ev["id"]
+            st = ev["data"].get("status")
+            if st:
+                status[ev["task_id"]] = str(st)
+            yield _sse(ev["id"], "task", ev["data"])
+        yield _sse(sent, "end", {"task_ids": ids})
+    finally:
+        task_event_bus.unsubscribe(sub)
+
+
+def task_events_stats() -> Dict[str, Any]:
+    return task_event_bus.stats()
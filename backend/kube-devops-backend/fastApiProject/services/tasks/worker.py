@@ -2,17 +2,48 @@ from __future__ import annotations
 
 import json
 import threading
-import time
 import uuid
-from typing import Any, Dict, Optional
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
 
-from db.tasks.repo import claim_next_task, reset_running_tasks, update_task_status
+from db.tasks.repo import add_task_created_listener, claim_tasks, reset_running_tasks, update_task_status
 from fastapi import HTTPException
 
+# ✅ 任务 worker 池：
+# - N 个线程共享一个 Condition；create_task 插入后同进程内立即唤醒（不再 0.8s 轮询）
+# - 轮询只作为兜底（其他进程写进来的任务），间隔 TASK_POLL_FALLBACK_SEC
+# - 一次事务批量认领，最多认领“空闲 worker 数”个，避免认领了没人跑
+# - 按类型限并发（TASK_TYPE_LIMITS），一堆 ai_forecast 不会把 ai_execute 饿死
+TASK_WORKERS = 4
+TASK_CLAIM_BATCH = 4
+TASK_POLL_FALLBACK_SEC = 5.0
+
 _worker_started = False
 _worker_lock = threading.Lock()
 
 
+def _setting(name: str, default: Any) -> Any:
+    try:
+        from config import settings  # type: ignore
+
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _parse_type_limits(raw: str) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for part in str(raw or "").split(","):
+        k, sep, v = part.partition("=")
+        if not sep or not k.strip():
+            continue
+        try:
+            out[k.strip()] = max(1, int(v.strip()))
+        except ValueError:
+            continue
+    return out
+
+
 def _parse_payload(input_json: str) -> Dict[str, Any]:
     if not input_json:
         return {}
@@ -28,6 +59,10 @@ def _dispatch_task(task_type: str, payload: Dict[str, Any]) -> Any:
         from routers.ai import run_forecast_task
 
         return run_forecast_task(payload)
+    if task_type == "ai_forecast_batch":
+        from routers.ai import run_forecast_batch_task
+
+        return run_forecast_batch_task(payload)
     if task_type == "ai_suggestions":
         from routers.ai import run_suggestions_task
 
@@ -39,49 +74,218 @@ def _dispatch_task(task_type: str, payload: Dict[str, Any]) -> Any:
     raise ValueError(f"unsupported task type: {task_type}")
 
 
-def _worker_loop(worker_id: str) -> None:
-    reclaimed = reset_running_tasks()
-    if reclaimed:
-        print(f"tasks_worker reclaimed={reclaimed}")
+def _run_task(task: Dict[str, Any]) -> None:
+    task_id = str(task.get("task_id") or "")
+    task_type = str(task.get("type") or "")
+    payload = _parse_payload(str(task.get("input_json") or ""))
+    print(f"tasks_worker claimed task_id={task_id} type={task_type}")
+    try:
+        result = _dispatch_task(task_type, payload)
+        if isinstance(result, dict) and result.get("forbid"):
+            reason = result.get("forbid_reason") or result.get("detail") or "操作被禁止"
+            update_task_status(task_id=task_id, status="RESTRICTED", progress=1.0, result=result, error=str(reason))
+            print(f"tasks_worker done task_id={task_id} status=RESTRICTED error={reason}")
+        else:
+            update_task_status(task_id=task_id, status="SUCCESS", progress=1.0, result=result, error=None)
+            print(f"tasks_worker done task_id={task_id} status=SUCCESS")
+    except HTTPException as e:
+        update_task_status(
+            task_id=task_id,
+            status="FAILED",
+            progress=1.0,
+            result=None,
+            error=str(getattr(e, "detail", "") or e),
+        )
+        print(f"tasks_worker done task_id={task_id} status=FAILED error={e}")
+    except Exception as e:
+        update_task_status(task_id=task_id, status="FAILED", progress=1.0, result=None, error=str(e))
+        print(f"tasks_worker done task_id={task_id} status=FAILED error={e}")
 
-    while True:
-        task = claim_next_task(worker_id)
-        if not task:
-            time.sleep(0.8)
-            continue
-        task_id = str(task.get("task_id") or "")
-        task_type = str(task.get("type") or "")
-        payload = _parse_payload(str(task.get("input_json") or ""))
-        print(f"tasks_worker claimed task_id={task_id} type={task_type}")
+
+class TaskWorkerPool:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        claim_batch: Optional[int] = None,
+        poll_sec: Optional[float] = None,
+        type_limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.workers = max(1, int(workers if workers is not None else _setting("TASK_WORKERS", TASK_WORKERS)))
+        self.claim_batch = max(
+            1, int(claim_batch if claim_batch is not None else _setting("TASK_CLAIM_BATCH", TASK_CLAIM_BATCH))
+        )
+        self.poll_sec = max(
+            0.2, float(poll_sec if poll_sec is not None else _setting("TASK_POLL_FALLBACK_SEC", TASK_POLL_FALLBACK_SEC))
+        )
+        self.type_limits = (
+            dict(type_limits)
+            if type_limits is not None
+            else _parse_type_limits(str(_setting("TASK_TYPE_LIMITS", "") or ""))
+        )
+        # 没单独配置的类型：至少给其他类型留一个 worker
+        self.default_limit = max(1, self.workers - 1)
+        self.pool_id = uuid.uuid4().hex[:8]
+
+        self._cond = threading.Condition()
+        self._ready: Deque[Dict[str, Any]] = deque()
+        self._running: Dict[str, int] = {}  # 已认领（含 _ready 里还没开始跑的）按类型计数
+        self._dirty = True  # 有新任务 / 名额释放，值得去 DB 认领一次
+        self._claiming = False
+        self._stop = False
+        self._threads: List[threading.Thread] = []
+        self._stats: Dict[str, int] = {
+            "claims": 0,
+            "claimed": 0,
+            "empty_claims": 0,
+            "notified": 0,
+            "poll_wakeups": 0,
+            "done": 0,
+        }
+
+    # ---------- 唤醒 ----------
+    def notify(self, _task: Optional[Dict[str, Any]] = None) -> None:
+        with self._cond:
+            self._dirty = True
+            self._stats["notified"] += 1
+            self._cond.notify()
+
+    # ---------- 认领 ----------
+    def _limit_for(self, task_type: str) -> int:
+        return int(self.type_limits.get(task_type, self.default_limit))
+
+    def _busy_locked(self) -> int:
+        return sum(self._running.values())
+
+    def _slots_locked(self) -> Dict[str, int]:
+        types = set(self.type_limits) | set(self._running)
+        return {t: self._limit_for(t) - self._running.get(t, 0) for t in types}
+
+    def _next_task(self) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            if not self._ready and not (self._dirty and not self._claiming):
+                if not self._cond.wait(timeout=self.poll_sec):
+                    # 兜底轮询：其他进程 create_task 不会通知到这里
+                    self._dirty = True
+                    self._stats["poll_wakeups"] += 1
+            if self._stop:
+                return None
+            if self._ready:
+                return self._ready.popleft()
+            if not self._dirty or self._claiming:
+                return None
+            idle = self.workers - self._busy_locked()
+            if idle <= 0:
+                self._dirty = False
+                return None
+            self._dirty = False
+            self._claiming = True
+            limit = min(idle, self.claim_batch)
+            slots = self._slots_locked()
+
+        tasks: List[Dict[str, Any]] = []
         try:
-            result = _dispatch_task(task_type, payload)
-            if isinstance(result, dict) and result.get("forbid"):
-                reason = result.get("forbid_reason") or result.get("detail") or "操作被禁止"
-                update_task_status(task_id=task_id, status="RESTRICTED", progress=1.0, result=result, error=str(reason))
-                print(f"tasks_worker done task_id={task_id} status=RESTRICTED error={reason}")
+            tasks = claim_tasks(self.pool_id, limit=limit, type_slots=slots, default_slots=self.default_limit)
+        except Exception as e:
+            print(f"tasks_worker claim error={e}")
+        finally:
+            with self._cond:
+                self._claiming = False
+                self._stats["claims"] += 1
+                self._stats["claimed"] += len(tasks)
+                if not tasks:
+                    self._stats["empty_claims"] += 1
+                for t in tasks:
+                    tt = str(t.get("type") or "")
+                    self._running[tt] = self._running.get(tt, 0) + 1
+                    self._ready.append(t)
+                if len(tasks) >= limit:
+                    # 认满了：可能还有，让下一个空闲 worker 接着认领
+                    self._dirty = True
+                self._cond.notify_all()
+        return None
+
+    def _release(self, task: Dict[str, Any]) -> None:
+        tt = str(task.get("type") or "")
+        with self._cond:
+            n = self._running.get(tt, 0) - 1
+            if n > 0:
+                self._running[tt] = n
             else:
-                update_task_status(task_id=task_id, status="SUCCESS", progress=1.0, result=result, error=None)
-                print(f"tasks_worker done task_id={task_id} status=SUCCESS")
-        except HTTPException as e:
-            update_task_status(
-                task_id=task_id,
-                status="FAILED",
-                progress=1.0,
-                result=None,
-                error=str(getattr(e, "detail", "") or e),
+                self._running.pop(tt, None)
+            self._stats["done"] += 1
+            # 名额释放后，之前因类型限额没认领的任务可能能跑了
+            self._dirty = True
+            self._cond.notify()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+            task = self._next_task()
+            if task is None:
+                continue
+            try:
+                _run_task(task)
+            finally:
+                self._release(task)
+
+    # ---------- 生命周期 ----------
+    def start(self) -> None:
+        reclaimed = reset_running_tasks()
+        if reclaimed:
+            print(f"tasks_worker reclaimed={reclaimed}")
+        add_task_created_listener(self.notify)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"tasks-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(
+                {
+                    "pool_id": self.pool_id,
+                    "workers": self.workers,
+                    "busy": self._busy_locked(),
+                    "ready": len(self._ready),
+                    "running_by_type": dict(self._running),
+                    "type_limits": dict(self.type_limits),
+                    "default_type_limit": self.default_limit,
+                    "claim_batch": self.claim_batch,
+                    "poll_fallback_sec": self.poll_sec,
+                }
             )
-            print(f"tasks_worker done task_id={task_id} status=FAILED error={e}")
-        except Exception as e:
-            update_task_status(task_id=task_id, status="FAILED", progress=1.0, result=None, error=str(e))
-            print(f"tasks_worker done task_id={task_id} status=FAILED error={e}")
+        return out
+
+
+_pool: Optional[TaskWorkerPool] = None
 
 
 def start_task_worker() -> None:
-    global _worker_started
+    global _worker_started, _pool
     with _worker_lock:
         if _worker_started:
             return
         _worker_started = True
-    worker_id = uuid.uuid4().hex[:8]
-    t = threading.Thread(target=_worker_loop, args=(worker_id,), name="tasks-worker", daemon=True)
-    t.start()
+        _pool = TaskWorkerPool()
+    _pool.start()
+
+
+def stop_task_worker() -> None:
+    if _pool is not None:
+        _pool.stop()
+
+
+def task_worker_stats() -> Dict[str, Any]:
+    if _pool is None:
+        return {"started": False}
+    out = _pool.stats()
+    out["started"] = True
+    return out
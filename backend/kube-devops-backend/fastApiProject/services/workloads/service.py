@@ -9,6 +9,7 @@ from kubernetes.client import ApiClient
 import yaml as pyyaml
 
 from services.k8s.kube_client import get_core_v1, get_apps_v1  # ✅ 改这里：用 getter
+from services.k8s.informer import cached_list
 from kubernetes.client import V1DeleteOptions
 
 Kind = Literal["deployment", "statefulset", "pod"]
@@ -111,10 +112,12 @@ def _images_from_pod_template(spec) -> str:
 def list_deployments(namespace: Optional[str], status: Optional[RowStatus], keyword: Optional[str]):
     apps = get_apps_v1()
 
-    if namespace:
-        items = apps.list_namespaced_deployment(namespace=namespace).items
-    else:
-        items = apps.list_deployment_for_all_namespaces().items
+    items = cached_list("deployments", namespace)
+    if items is None:
+        if namespace:
+            items = apps.list_namespaced_deployment(namespace=namespace).items
+        else:
+            items = apps.list_deployment_for_all_namespaces().items
 
     out = []
     for d in items:
@@ -199,10 +202,12 @@ def list_statefulsets(namespace: Optional[str], status: Optional[RowStatus], key
 def list_pods(namespace: Optional[str], status: Optional[RowStatus], keyword: Optional[str]):
     api = get_core_v1()
 
-    if namespace:
-        items = api.list_namespaced_pod(namespace=namespace).items
-    else:
-        items = api.list_pod_for_all_namespaces().items
+    items = cached_list("pods", namespace)
+    if items is None:
+        if namespace:
+            items = api.list_namespaced_pod(namespace=namespace).items
+        else:
+            items = api.list_pod_for_all_namespaces().items
 
     out = []
     for p in items: